@@ -5,11 +5,18 @@
 
 
 # app.py - Multi-page launcher + original styling (keeps your CSS/HTML)
+# Import-time profiling: BARCODE_PROFILE_STARTUP=1 or `streamlit run app.py -- --profile-startup`
+import startup_profile
+startup_profile.install()
+
 import streamlit as st
 import base64
 import os
+import time
 from pathlib import Path
 
+_script_start = time.perf_counter()
+
 # ---------- Page config ----------
 st.set_page_config(page_title="Warehouse Management System", layout="wide", initial_sidebar_state="collapsed")
 
@@ -28,11 +35,16 @@ def get_base64_image(image_path):
     except Exception:
         return ""
 
-image_base64 = ""
-for p in REL_IMAGE_PATHS:
-    if os.path.exists(p):
-        image_base64 = get_base64_image(p)
-        break
+@st.cache_resource(show_spinner=False)
+def load_background_base64() -> str:
+    # encoded once per server process instead of on every rerun
+    for p in REL_IMAGE_PATHS:
+        if os.path.exists(p):
+            return get_base64_image(p)
+    return ""
+
+with startup_profile.stage("background image"):
+    image_base64 = load_background_base64()
 
 # ---------- Helper: open a page in new tab ----------
 def open_page_in_new_tab(page_slug: str, label: str = "Open"):
@@ -290,6 +302,22 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
+# ---------- Startup profile (only with BARCODE_PROFILE_STARTUP=1 / --profile-startup) ----------
+if startup_profile.profiling_enabled():
+    startup_profile.record("launcher render (this run)", time.perf_counter() - _script_start)
+
+    @st.cache_resource(show_spinner=False)
+    def _print_startup_report_once():
+        startup_profile.print_report()
+        return True
+
+    _print_startup_report_once()
+    with st.expander("⏱️ Startup profile"):
+        st.markdown("**Stages (ms)**")
+        st.table([{"Stage": n, "ms": ms} for n, ms in startup_profile.stage_report()])
+        st.markdown("**Slowest imports**")
+        st.table([{"Module": m, "Cumulative ms": c, "Self ms": o} for m, c, o in startup_profile.import_report()])
+
 
 # In[ ]:
 
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# barcode_cache.py
+"""
+Rendered barcodes, kept as ready-to-paste 1-bit bitmaps.
+
+The same SKU barcode used to be generated again for every copy, every rerun
+of a job, and every preview and print. BarcodeCache keeps the result under
+(value, symbology, width, height, dpi, native, backend). The target size is
+in dots, so it also pins the resolution; dpi is kept in the key anyway so
+entries are self-describing. Backend covers the bitmap differing between
+BWIPP and python-barcode.
+
+  memory  LRU bounded by bitmap bytes (BARCODE_CACHE_MB, default 16)
+  disk    optional, shared by render processes and server restarts: set
+          BARCODE_CACHE_DIR to a folder; one 1-bit PNG per key
+
+Bitmaps are mode "1" (thresholded at mid-grey, not dithered). They are 8x
+smaller than RGB and paste straight onto a label canvas. Failed renders
+(None) are not cached. stats() is registered with instrumentation as cache
+"barcodes".
+"""
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from PIL import Image
+
+import instrumentation
+
+CACHE_DIR_ENV = "BARCODE_CACHE_DIR"
+MAX_BYTES = int(float(os.environ.get("BARCODE_CACHE_MB", "16")) * 1024 * 1024)
+
+
+def to_bitmap(img: Image.Image) -> Image.Image:
+    """1-bit copy of a rendered barcode: black below mid-grey, no dithering."""
+    if img.mode == "1":
+        return img
+    return img.convert("L").point(lambda v: 255 if v >= 128 else 0, mode="1")
+
+
+class BarcodeCache:
+    def __init__(self, max_bytes: int = MAX_BYTES, cache_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._items = OrderedDict()  # key -> (bitmap, nbytes)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.disk_hits = self.disk_writes = self.evictions = 0
+
+    def _path(self, key: tuple) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.png")
+
+    def _remember(self, key: tuple, bitmap: Image.Image):
+        nbytes = (bitmap.width + 7) // 8 * bitmap.height
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = (bitmap, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, dropped) = self._items.popitem(last=False)
+                self.bytes -= dropped
+                self.evictions += 1
+
+    def _from_disk(self, key: tuple) -> Optional[Image.Image]:
+        if not self.cache_dir:
+            return None
+        try:
+            with Image.open(self._path(key)) as im:
+                return im.convert("1")
+        except Exception:
+            return None
+
+    def _to_disk(self, key: tuple, bitmap: Image.Image):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        tmp = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # unique per write: threads of one process may store the same key at once
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                bitmap.save(fh, format="PNG")
+            os.replace(tmp, path)  # atomic, so other processes never read half a file
+            self.disk_writes += 1
+        except OSError:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def get(self, key: tuple, render: Callable[[], Optional[Image.Image]]) -> Optional[Image.Image]:
+        """Cached bitmap for key, rendering (and storing) it on a miss. Do not modify the result."""
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+        bitmap = self._from_disk(key)
+        if bitmap is not None:
+            self.hits += 1
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            img = render()
+            if img is None:
+                return None
+            bitmap = to_bitmap(img)
+            self._to_disk(key, bitmap)
+        self._remember(key, bitmap)
+        return bitmap
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "disk_hits": self.disk_hits,
+                "disk_writes": self.disk_writes, "evictions": self.evictions,
+                "entries": len(self._items), "bytes": self.bytes}
+
+
+_cache = BarcodeCache(cache_dir=os.environ.get(CACHE_DIR_ENV) or None)
+instrumentation.register_cache("barcodes", _cache.stats)
+
+
+def get_cache() -> BarcodeCache:
+    return _cache
+
+
+def stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# bwipp_pool.py
+"""
+Long-lived Ghostscript workers running BWIPP (the barcode library treepoem
+ships), fed barcode requests over pipes.
+
+treepoem.generate_barcode starts Ghostscript twice per barcode (bounding box,
+then raster), and process start-up and loading BWIPP's ~1 MB of PostScript
+dominate the cost. Here each worker starts once, loads BWIPP once, and then
+answers requests on stdin/stdout. A request calls the BWIPP encoder with
+"dontdraw" and prints the symbol's modules instead of rasterizing it:
+  linear codes (code128, gs1-128, ean13, ...)   space/bar widths (sbs)
+  matrix codes (datamatrix, qrcode, ...)        the module grid (pixs)
+modules() turns those into a one-pixel-per-module image (1 row for linear
+codes), which label_generator scales by whole printer dots.
+
+    img = get_pool().modules("datamatrix", "HYT-6K-MNG")
+    img = get_pool().modules("gs1-128", "(01)09501101530003")
+
+A request that takes longer than `timeout` kills and restarts its worker and
+raises BarcodeTimeout. A worker that dies (EOF on stdout) is restarted and
+the request retried once. BWIPP errors (bad data for the symbology) raise
+BarcodeError and leave the worker running. stats() counts them as errors;
+label_generator then falls back to python-barcode for linear codes.
+
+The pool size is BARCODE_GS_WORKERS (default 2). Each render process gets
+its own pool. The BWIPP source is treepoem's copy, or the barcode.ps named
+by BARCODE_BWIPP_PATH.
+
+available() does not trust the protocol blindly: the first time it is asked
+it encodes a known code128 and a known datamatrix through the pool and
+through treepoem.generate_barcode, and only reports the pool as available
+if the modules are identical. Otherwise label_generator keeps calling
+treepoem directly. Setting BARCODE_BWIPP_PATH opts in without that check.
+"""
+import os
+import re
+import queue
+import atexit
+import shutil
+import threading
+import subprocess
+from binascii import hexlify
+from collections import deque
+from itertools import count
+from typing import Optional
+
+from PIL import Image
+
+from instrumentation import timed
+
+WORKERS_ENV = "BARCODE_GS_WORKERS"
+BWIPP_ENV = "BARCODE_BWIPP_PATH"
+DEFAULT_WORKERS = 2
+REQUEST_TIMEOUT = 10.0
+START_TIMEOUT = 30.0
+# (symbology, data) encoded by verify(); one linear and one matrix code
+VERIFY_CODES = (("code128", "HYT-6K-MNG-20MG"), ("datamatrix", "HYT-6K-MNG-20MG"))
+
+_ENCODER_RE = re.compile(r"^[a-z0-9-]+$")
+
+# one request: encode with dontdraw, print the modules, always end with the marker
+REQUEST_PS = """\
+{{
+  {data} {options} {encoder} cvn /uk.co.terryburton.bwipp findresource exec
+  dup /pixs known {{
+    (M ) print dup /pixx get =only ( ) print dup /pixy get =only ( ) print
+    /pixs get {{ =only }} forall
+  }} {{
+    (L ) print /sbs get {{ =only ( ) print }} forall
+  }} ifelse
+  (\\n) print
+}} stopped {{
+  (E ) print $error /errorname get =only ( ) print $error /errorinfo get =only (\\n) print
+  $error /newerror false put
+}} if
+clear
+(@@{rid}\\n) print flush
+"""
+
+
+class BarcodeError(RuntimeError):
+    """BWIPP rejected the request (e.g. data not valid for the symbology)."""
+
+
+class BarcodeTimeout(BarcodeError):
+    pass
+
+
+class WorkerDied(RuntimeError):
+    pass
+
+
+def ghostscript_binary() -> Optional[str]:
+    for name in ("gs", "gswin64c", "gswin32c"):
+        if shutil.which(name):
+            return name
+    return None
+
+
+def bwipp_source() -> str:
+    path = os.environ.get(BWIPP_ENV)
+    if path:
+        with open(path) as fh:
+            return fh.read()
+    import treepoem  # type: ignore
+
+    return treepoem.load_bwipp()
+
+
+_verified = None
+
+
+def available() -> bool:
+    """Ghostscript is installed and the pool matches treepoem (or BARCODE_BWIPP_PATH opts in)."""
+    global _verified
+    if not ghostscript_binary():
+        return False
+    if os.environ.get(BWIPP_ENV):
+        return os.path.exists(os.environ[BWIPP_ENV])
+    if _verified is None:
+        try:
+            _verified = verify()
+        except Exception:
+            _verified = False
+        if not _verified and _pool is not None:
+            _pool.close()
+    return _verified
+
+
+def _hex(text) -> str:
+    data = text.encode("utf-8") if isinstance(text, str) else bytes(text)
+    return f"<{hexlify(data).decode('ascii')}>"
+
+
+def _options(options: Optional[dict]) -> str:
+    items = ["dontdraw"]
+    for name, value in (options or {}).items():
+        if value is True:
+            items.append(name)
+        elif value not in (None, False):
+            items.append(f"{name}={value}")
+    return " ".join(items)
+
+
+def _image(reply: str) -> Image.Image:
+    kind, _, rest = reply.partition(" ")
+    if kind == "L":
+        # alternating bar/space widths, starting with a bar
+        row = bytearray()
+        for i, w in enumerate(rest.split()):
+            row += bytes([0 if i % 2 == 0 else 255]) * int(round(float(w)))
+        return Image.frombytes("L", (len(row), 1), bytes(row))
+    pixx, pixy, bits = rest.split(" ", 2)
+    pixx, pixy = int(pixx), int(pixy)
+    grid = bytes(0 if b == "1" else 255 for b in bits.strip())
+    return Image.frombytes("L", (pixx, pixy), grid)
+
+
+class GhostscriptWorker:
+    """One Ghostscript interpreter with BWIPP loaded, answering one request at a time."""
+
+    def __init__(self, bwipp: str):
+        self._bwipp = bwipp
+        self._ids = count(1)
+        self.proc = None
+        self.requests = 0
+        self.stderr = deque(maxlen=20)
+
+    def start(self):
+        gs = ghostscript_binary()
+        if not gs:
+            raise BarcodeError("Ghostscript (gs) is not installed")
+        self.proc = subprocess.Popen(
+            [gs, "-dSAFER", "-dQUIET", "-dNOPAUSE", "-dNODISPLAY", "-"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, bufsize=1, creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+        self._lines = queue.Queue()
+        for stream, sink in ((self.proc.stdout, self._lines.put), (self.proc.stderr, self.stderr.append)):
+            threading.Thread(target=self._pump, args=(stream, sink), daemon=True).start()
+        self._send(self._bwipp + "\n(@@ready\\n) print flush\n")
+        self._wait("ready", START_TIMEOUT)
+
+    @staticmethod
+    def _pump(stream, sink):
+        for line in stream:
+            sink(line.rstrip("\n"))
+        sink(None)
+
+    def _send(self, ps: str):
+        try:
+            self.proc.stdin.write(ps)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError):
+            self.stop()
+            raise WorkerDied("Ghostscript stdin closed")
+
+    def _wait(self, rid: str, timeout: float) -> list:
+        lines = []
+        while True:
+            try:
+                line = self._lines.get(timeout=timeout)
+            except queue.Empty:
+                self.stop()
+                raise BarcodeTimeout(f"Ghostscript did not answer within {timeout:.0f}s")
+            if line is None:
+                self.stop()
+                raise WorkerDied("Ghostscript exited: " + " | ".join(s for s in self.stderr if s))
+            if line == f"@@{rid}":
+                return lines
+            lines.append(line)
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def request(self, encoder: str, data, options: Optional[dict], timeout: float) -> str:
+        if not self.alive():
+            self.start()
+        rid = str(next(self._ids))
+        self._send(REQUEST_PS.format(data=_hex(data), options=_hex(_options(options)), encoder=_hex(encoder), rid=rid))
+        lines = self._wait(rid, timeout)
+        self.requests += 1
+        reply = next((l for l in lines if l[:2] in ("L ", "M ", "E ")), "")
+        if not reply or reply.startswith("E "):
+            raise BarcodeError(reply[2:] or "no output from BWIPP")
+        return reply
+
+    def stop(self):
+        if self.proc is not None:
+            try:
+                self.proc.kill()
+                self.proc.wait(timeout=5)
+            except Exception:
+                pass
+            for stream in (self.proc.stdin, self.proc.stdout, self.proc.stderr):
+                try:
+                    stream.close()
+                except Exception:
+                    pass
+        self.proc = None
+
+
+class GhostscriptPool:
+    """A fixed set of workers; callers borrow an idle one per request."""
+
+    def __init__(self, size: Optional[int] = None, timeout: float = REQUEST_TIMEOUT):
+        size = size or int(os.environ.get(WORKERS_ENV, DEFAULT_WORKERS))
+        self.timeout = timeout
+        bwipp = bwipp_source()
+        self._workers = [GhostscriptWorker(bwipp) for _ in range(max(1, size))]
+        self._idle = queue.Queue()
+        for w in self._workers:
+            self._idle.put(w)
+        self.restarts = self.errors = 0
+
+    @timed("barcode.bwipp")
+    def modules(self, symbology: str, data, options: Optional[dict] = None,
+                timeout: Optional[float] = None) -> Image.Image:
+        """One pixel per module: a 1-row image for linear codes, the grid for matrix codes."""
+        if not _ENCODER_RE.match(symbology):
+            raise BarcodeError(f"not a BWIPP encoder name: {symbology!r}")
+        worker = self._idle.get()
+        try:
+            for attempt in (1, 2):
+                try:
+                    return _image(worker.request(symbology, data, options, timeout or self.timeout))
+                except WorkerDied:
+                    self.restarts += 1
+                    if attempt == 2:
+                        raise BarcodeError("Ghostscript worker keeps dying")
+                except BarcodeTimeout:
+                    self.restarts += 1
+                    raise
+        except BarcodeError:
+            self.errors += 1
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def warm(self):
+        """Start every worker now instead of on first use."""
+        for w in self._workers:
+            if not w.alive():
+                w.start()
+
+    def stats(self) -> dict:
+        return {"workers": len(self._workers), "alive": sum(w.alive() for w in self._workers),
+                "requests": sum(w.requests for w in self._workers), "restarts": self.restarts,
+                "errors": self.errors}
+
+    def close(self):
+        for w in self._workers:
+            w.stop()
+
+
+def _same_modules(modules: Image.Image, reference: Image.Image) -> bool:
+    """modules (one pixel per module) scaled by a whole factor equals the rendered reference."""
+    ref = reference.convert("L")
+    if modules.height == 1:
+        mid = ref.height // 2
+        ref = ref.crop((0, mid, ref.width, mid + 1))  # one scanline across the bars
+    fx, fy = divmod(ref.width, modules.width), divmod(ref.height, modules.height)
+    if fx[1] or fy[1] or not fx[0] or not fy[0]:
+        return False
+    ref = ref.point(lambda v: 0 if v < 128 else 255)
+    return modules.resize(ref.size, Image.Resampling.NEAREST).tobytes() == ref.tobytes()
+
+
+def verify() -> bool:
+    """Encode VERIFY_CODES through the pool and through treepoem; True if every one matches."""
+    import treepoem  # type: ignore
+
+    pool = get_pool()
+    for symbology, data in VERIFY_CODES:
+        reference = treepoem.generate_barcode(barcode_type=symbology, data=data, scale=1)
+        if not _same_modules(pool.modules(symbology, data), reference):
+            return False
+    return True
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> GhostscriptPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = GhostscriptPool()
+            atexit.register(_pool.close)
+    return _pool
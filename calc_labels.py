@@ -7,6 +7,7 @@
 # calc_labels.py
 import math
 import pandas as pd
+from instrumentation import timed
 
 def apply_default_case_size(df, default_case_size):
     if "Case_Size" not in df.columns:
@@ -16,6 +17,7 @@ def apply_default_case_size(df, default_case_size):
         df["Case_Size"] = df["Case_Size"].fillna(default_case_size)
     return df
 
+@timed("calc.final_labels")
 def compute_final_labels(df):
     """
     For every row, compute Final_Labels = ceil(Outstanding / Case_Size)
@@ -7,6 +7,7 @@
 # calculation.py
 import pandas as pd
 import math
+from instrumentation import timed
 
 def detect_quantity_column(df):
     for cand in ["Receiving", "Outstanding", "Count"]:
@@ -14,6 +15,7 @@ def detect_quantity_column(df):
             return cand
     return None
 
+@timed("calc.final_labels")
 def calculate_final_labels(df):
     df = df.copy()
     qty_col = detect_quantity_column(df)
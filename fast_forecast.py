@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# fast_forecast.py
+"""
+Lightweight NumPy forecasting engine used by the AI Forecast page's fast mode.
+
+All products are fitted at once as a 2-D array (products x days): the only Python
+loop is over time steps, every model update is vectorized across products and
+across each model's parameter grid. Models:
+
+  - snaive : seasonal naive, weekly (value from the same weekday last week)
+  - ses    : simple exponential smoothing, alpha picked per product
+  - hw     : additive Holt-Winters with weekly seasonality, params picked per product
+
+"auto" picks the model per product by MAE on a trailing holdout week.
+"""
+import warnings
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+SEASON = 7
+HORIZON = 7
+MODELS = ("snaive", "ses", "hw")
+MIN_OBS = {"snaive": SEASON, "ses": 2, "hw": 2 * SEASON}
+
+SES_ALPHAS = np.array([0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+HW_GRID = np.array([(a, b, g) for a in (0.2, 0.5, 0.8) for b in (0.05, 0.2) for g in (0.1, 0.3)])
+
+
+# ---------------------------
+# Data shaping
+# ---------------------------
+def sales_matrix(daily_sales: pd.DataFrame):
+    """
+    Pivot Date/Product/Sales_Units into (products, dates, Y). Y is float with
+    NaN before each product's first sale; days missing inside a product's
+    history count as zero sales.
+    """
+    pv = daily_sales.pivot_table(index="Product", columns="Date", values="Sales_Units", aggfunc="sum")
+    dates = pd.date_range(pv.columns.min(), pv.columns.max(), freq="D")
+    pv = pv.reindex(columns=dates)
+    Y = pv.to_numpy(dtype="float64")
+    started = np.cumsum(~np.isnan(Y), axis=1) > 0
+    Y = np.where(started & np.isnan(Y), 0.0, Y)
+    return pv.index.to_numpy(), dates, Y
+
+
+def _start_index(Y: np.ndarray) -> np.ndarray:
+    """Column of each row's first observation (Y.shape[1] if the row is empty)."""
+    obs = ~np.isnan(Y)
+    return np.where(obs.any(axis=1), obs.argmax(axis=1), Y.shape[1])
+
+
+# ---------------------------
+# Models: each returns (fitted (P, T), forecast (P, H))
+# ---------------------------
+def seasonal_naive(Y: np.ndarray, horizon: int = HORIZON):
+    P, T = Y.shape
+    fitted = np.full((P, T), np.nan)
+    if T > SEASON:
+        fitted[:, SEASON:] = Y[:, :-SEASON]
+    if T >= SEASON:
+        cols = T - SEASON + (np.arange(horizon) % SEASON)
+        forecast = Y[:, cols]
+    else:
+        forecast = np.full((P, horizon), np.nan)
+    # rows without a full week fall back to naive (last value)
+    forecast = np.where(np.isnan(forecast), Y[:, -1:], forecast)
+    return fitted, forecast
+
+
+def _ses_pass(Y: np.ndarray, alpha: np.ndarray, keep_fitted: bool):
+    """alpha broadcasts against (G, P). Returns (sse, fitted or None, final level)."""
+    T = Y.shape[1]
+    shape = np.broadcast_shapes(alpha.shape, (1, Y.shape[0]))
+    level = np.full(shape, np.nan)
+    sse = np.zeros(shape)
+    fitted = np.full(shape + (T,), np.nan) if keep_fitted else None
+    for t in range(T):
+        y = Y[:, t]
+        if keep_fitted:
+            fitted[..., t] = level
+        err = y - level
+        sse += np.where(np.isnan(err), 0.0, err * err)
+        level = np.where(np.isnan(y), level, np.where(np.isnan(level), y, level + alpha * err))
+    return sse, fitted, level
+
+
+def ses(Y: np.ndarray, horizon: int = HORIZON):
+    sse, _, _ = _ses_pass(Y, SES_ALPHAS[:, None], keep_fitted=False)
+    best_alpha = SES_ALPHAS[sse.argmin(axis=0)][None, :]
+    _, fitted, level = _ses_pass(Y, best_alpha, keep_fitted=True)
+    return fitted[0], np.repeat(level[0][:, None], horizon, axis=1)
+
+
+def _hw_pass(Y: np.ndarray, alpha, beta, gamma, keep_fitted: bool):
+    """
+    Additive Holt-Winters, weekly season. Params broadcast against (G, P).
+    The first week of each row initialises level and season (trend from the
+    second week), updates start on day 8 of each row's history.
+    """
+    P, T = Y.shape
+    shape = np.broadcast_shapes(np.shape(alpha), (1, P))
+    start = _start_index(Y)
+    rows = np.arange(P)[:, None]
+    idx = np.minimum(start[:, None] + np.arange(2 * SEASON), T - 1)
+    first = Y[rows, idx]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows (empty history)
+        w1 = np.nanmean(first[:, :SEASON], axis=1)
+        w2 = np.nanmean(first[:, SEASON:], axis=1)
+    n_obs = T - start
+    trend0 = np.where(n_obs >= 2 * SEASON, (w2 - w1) / SEASON, 0.0)
+
+    level = np.broadcast_to(w1, shape).copy()
+    trend = np.broadcast_to(trend0, shape).copy()
+    # season[k] for absolute weekday k = first-week value on that weekday minus level
+    k = (start[:, None] + np.arange(SEASON)) % SEASON
+    s0 = np.zeros((P, SEASON))
+    s0[rows, k] = first[:, :SEASON] - w1[:, None]
+    season = np.broadcast_to(s0, shape + (SEASON,)).copy()
+
+    sse = np.zeros(shape)
+    fitted = np.full(shape + (T,), np.nan) if keep_fitted else None
+    for t in range(T):
+        active = t >= start + SEASON
+        if not active.any():
+            continue
+        y = Y[:, t]
+        k = t % SEASON
+        s = season[..., k]
+        pred = level + trend + s
+        if keep_fitted:
+            fitted[..., t] = np.where(active, pred, np.nan)
+        err = np.where(active, y - pred, 0.0)
+        sse += err * err
+        new_level = alpha * (y - s) + (1 - alpha) * (level + trend)
+        new_trend = beta * (new_level - level) + (1 - beta) * trend
+        new_s = gamma * (y - new_level) + (1 - gamma) * s
+        level = np.where(active, new_level, level)
+        trend = np.where(active, new_trend, trend)
+        season[..., k] = np.where(active, new_s, s)
+    return sse, fitted, (level, trend, season)
+
+
+def holt_winters(Y: np.ndarray, horizon: int = HORIZON):
+    a, b, g = (HW_GRID[:, i][:, None] for i in range(3))
+    sse, _, _ = _hw_pass(Y, a, b, g, keep_fitted=False)
+    best = HW_GRID[sse.argmin(axis=0)]
+    a, b, g = (best[:, i][None, :] for i in range(3))
+    _, fitted, (level, trend, season) = _hw_pass(Y, a, b, g, keep_fitted=True)
+    T = Y.shape[1]
+    h = np.arange(1, horizon + 1)
+    forecast = level[0][:, None] + h * trend[0][:, None] + season[0][:, (T - 1 + h) % SEASON]
+    fitted = fitted[0]
+    # not enough history for two seasons: leave the model unusable for that row
+    too_short = (T - _start_index(Y)) < MIN_OBS["hw"]
+    forecast[too_short] = np.nan
+    fitted[too_short] = np.nan
+    return fitted, forecast
+
+
+_FITTERS = {"snaive": seasonal_naive, "ses": ses, "hw": holt_winters}
+
+
+def _rolling_mean(X: np.ndarray, window: int) -> np.ndarray:
+    """Row-wise trailing mean ignoring NaN (pandas rolling(window, min_periods=1).mean())."""
+    valid = ~np.isnan(X)
+    csum = np.cumsum(np.where(valid, X, 0.0), axis=1)
+    ccnt = np.cumsum(valid, axis=1)
+    csum[:, window:] = csum[:, window:] - csum[:, :-window].copy()
+    ccnt[:, window:] = ccnt[:, window:] - ccnt[:, :-window].copy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(ccnt > 0, csum / ccnt, np.nan)
+
+
+def _fill_edges(X: np.ndarray) -> np.ndarray:
+    """Row-wise bfill then ffill."""
+    T = X.shape[1]
+    valid = ~np.isnan(X)
+    rows = np.arange(X.shape[0])[:, None]
+    # bfill: index of the next valid value at or after t
+    nxt = np.where(valid, np.arange(T), T)
+    nxt = np.minimum.accumulate(nxt[:, ::-1], axis=1)[:, ::-1]
+    X = np.where(nxt < T, X[rows, np.minimum(nxt, T - 1)], np.nan)
+    # ffill: index of the last valid value at or before t
+    valid = ~np.isnan(X)
+    prev = np.maximum.accumulate(np.where(valid, np.arange(T), -1), axis=1)
+    return np.where(prev >= 0, X[rows, np.maximum(prev, 0)], np.nan)
+
+
+# ---------------------------
+# Selection + public API
+# ---------------------------
+def select_models(Y: np.ndarray, holdout: int = HORIZON) -> np.ndarray:
+    """Per-row model name with the lowest MAE on the last `holdout` days."""
+    P, T = Y.shape
+    n_obs = T - _start_index(Y)
+    scores = np.full((len(MODELS), P), np.inf)
+    if T > holdout + 1:
+        train, test = Y[:, :-holdout], Y[:, -holdout:]
+        for i, name in enumerate(MODELS):
+            _, fc = _FITTERS[name](train, holdout)
+            abs_err = np.abs(fc - test)
+            n = (~np.isnan(abs_err)).sum(axis=1)
+            mae = np.where(n > 0, np.nansum(abs_err, axis=1) / np.maximum(n, 1), np.nan)
+            eligible = (n_obs - holdout >= MIN_OBS[name]) & ~np.isnan(mae)
+            scores[i] = np.where(eligible, mae, np.inf)
+    choice = np.array(MODELS)[scores.argmin(axis=0)]
+    # nothing scored (too little history): fall back to exponential smoothing
+    return np.where(np.isinf(scores.min(axis=0)), "ses", choice)
+
+
+def forecast_all(daily_sales: pd.DataFrame, horizon: int = HORIZON, model: str = "auto") -> dict:
+    """
+    Forecast every product in daily_sales. Returns a dict of aligned arrays:
+    products, dates, future_dates, actual (P, T), fitted (P, T), forecast (P, H),
+    adjusted (P, T + H, the page's 0.7/0.3 rolling-mean blend) and model (P,).
+    """
+    products, dates, Y = sales_matrix(daily_sales)
+    P, T = Y.shape
+    chosen = select_models(Y, holdout=horizon) if model == "auto" else np.full(P, model)
+
+    fitted = np.full((P, T), np.nan)
+    forecast = np.full((P, horizon), np.nan)
+    for name in MODELS:
+        rows = chosen == name
+        if not rows.any():
+            continue
+        f, fc = _FITTERS[name](Y, horizon)
+        fitted[rows], forecast[rows] = f[rows], fc[rows]
+
+    yhat = np.concatenate([np.where(np.isnan(fitted), Y, fitted), forecast], axis=1)
+    actual_ext = np.concatenate([Y, np.full((P, horizon), np.nan)], axis=1)
+    roll = _fill_edges(_rolling_mean(actual_ext, 3))
+    adjusted = 0.7 * yhat + 0.3 * roll
+
+    return {
+        "products": products,
+        "dates": dates,
+        "future_dates": pd.date_range(dates[-1] + pd.Timedelta(days=1), periods=horizon, freq="D"),
+        "actual": Y,
+        "fitted": fitted,
+        "forecast": forecast,
+        "yhat": yhat,
+        "adjusted": adjusted,
+        "model": chosen,
+    }
+
+
+def product_frame(result: dict, product: str) -> Optional[pd.DataFrame]:
+    """ds / y / yhat / Adj_Forecast for one product, shaped like the batch forecasts."""
+    hits = np.flatnonzero(result["products"] == product)
+    if hits.size == 0:
+        return None
+    i = hits[0]
+    T = result["actual"].shape[1]
+    ds = result["dates"].append(result["future_dates"])
+    y = np.concatenate([result["actual"][i], np.full(len(ds) - T, np.nan)])
+    return pd.DataFrame({"ds": ds, "yhat": result["yhat"][i], "y": y, "Adj_Forecast": result["adjusted"][i]})
+
+
+def trend_table(result: dict) -> pd.DataFrame:
+    """Per-product movement classification (same thresholds as the Prophet batch)."""
+    Y = result["actual"]
+    P, T = Y.shape
+    last_idx = T - 1 - np.argmax(~np.isnan(Y[:, ::-1]), axis=1)
+    last_actual = Y[np.arange(P), last_idx]
+    next_forecast = result["adjusted"][:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(last_actual != 0, (next_forecast / last_actual - 1.0) * 100, 0.0)
+    trend = np.select(
+        [next_forecast > last_actual * 1.1, next_forecast < last_actual * 0.9],
+        ["⚡ Fast Moving", "🐢 Slow Moving"],
+        default="➖ Stable",
+    )
+    df = pd.DataFrame({
+        "Product": result["products"],
+        "Avg_Sales": np.nanmean(Y, axis=1),
+        "Last_Actual": last_actual,
+        "Next_Forecast": next_forecast,
+        "Change_Pct": change,
+        "Trend": trend,
+        "Model": result["model"],
+    })
+    return df.sort_values("Change_Pct", ascending=False).reset_index(drop=True)
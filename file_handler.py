@@ -8,32 +8,40 @@
 import os
 import pandas as pd
 from pdf_converter import convert_pdf_to_csv
+from instrumentation import timed
 
 UPLOAD_DIR = os.path.join(os.getcwd(), "data", "po_uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+@timed("po.read_file")
 def read_po_file(uploaded_file):
     """
     Accepts a Streamlit UploadedFile object.
     Returns (DataFrame, saved_path) or (None, path) on failure.
     """
     fname = uploaded_file.name
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
     save_path = os.path.join(UPLOAD_DIR, fname)
     with open(save_path, "wb") as f:
         f.write(uploaded_file.getbuffer())
+    return read_po_path(save_path)
 
-    if fname.lower().endswith(".csv"):
-        df = pd.read_csv(save_path)
-    elif fname.lower().endswith(".pdf"):
-        csv_path = convert_pdf_to_csv(save_path)
+@timed("po.parse")
+def read_po_path(path):
+    """
+    Same as read_po_file for a PO already on disk (CLI, hot folder).
+    Returns (DataFrame, path_read) or (None, path) on failure.
+    """
+    if path.lower().endswith(".csv"):
+        df = pd.read_csv(path)
+    elif path.lower().endswith(".pdf"):
+        csv_path = convert_pdf_to_csv(path)
         if not csv_path or not os.path.exists(csv_path):
-            return None, save_path
+            return None, path
         df = pd.read_csv(csv_path)
-        save_path = csv_path
+        path = csv_path
     else:
-        df = pd.read_excel(save_path)
+        df = pd.read_excel(path)
 
     # normalize column names (keep original names where possible)
     df.columns = [c.strip() for c in df.columns]
-    return df, save_path
-
+    return df, path
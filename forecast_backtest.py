@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# forecast_backtest.py
+"""
+Rolling-origin backtest and benchmark for the forecasting models.
+
+For each cutoff the models are trained on history up to the cutoff and scored on
+the following `horizon` days, for every product. Each (model, cutoff) pair runs
+as one task in a process pool and is timed (fit / predict wall time, peak traced
+memory). Reported per model:
+
+  - MAPE (days with zero sales excluded) and MASE (scaled by the in-sample
+    weekly seasonal-naive error, lag 1 for short histories)
+  - trend accuracy: how often the Fast/Stable/Slow call (+-10% of the last
+    actual) matches what actually happened at the end of the horizon
+  - fit/predict seconds and peak memory
+
+The JSON report is written with sorted keys and rounded numbers so two versions
+can be compared with diff, or with --compare:
+
+    python forecast_backtest.py --out data/backtests/new.json --compare data/backtests/old.json
+"""
+import os
+import json
+import time
+import argparse
+import warnings
+import tracemalloc
+import traceback
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+import fast_forecast as ff
+from forecast_batch import PROPHET_CONFIG, load_daily_sales
+from sales_ingest import sales_data_dir
+
+BACKTEST_DIR = os.path.join("data", "backtests")
+DEFAULT_MODELS = ("snaive", "ses", "hw", "fast_auto", "fast_auto_blend", "prophet", "prophet_blend")
+BLEND_WEIGHT = 0.7
+
+
+# ---------------------------
+# Models (train matrix in, forecast matrix out)
+# ---------------------------
+def _blend(forecast: np.ndarray, train: np.ndarray) -> np.ndarray:
+    """The page's adjustment over the horizon: 0.7 * yhat + 0.3 * last 3-day mean."""
+    last3 = ff._fill_edges(ff._rolling_mean(train, 3))[:, -1:]
+    return BLEND_WEIGHT * forecast + (1 - BLEND_WEIGHT) * last3
+
+
+def _prophet_forecast(train: np.ndarray, dates: pd.DatetimeIndex, horizon: int):
+    """Fit one Prophet model per row; returns (forecast, fit_seconds, predict_seconds)."""
+    import logging
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    from prophet import Prophet
+
+    out = np.full((train.shape[0], horizon), np.nan)
+    fit_s = predict_s = 0.0
+    for i, row in enumerate(train):
+        ok = ~np.isnan(row)
+        if ok.sum() < 5:
+            continue
+        df = pd.DataFrame({"ds": dates[ok], "y": row[ok]})
+        t0 = time.perf_counter()
+        m = Prophet(**PROPHET_CONFIG)
+        m.fit(df)
+        t1 = time.perf_counter()
+        fc = m.predict(m.make_future_dataframe(periods=horizon, include_history=False))
+        t2 = time.perf_counter()
+        out[i] = fc["yhat"].to_numpy()
+        fit_s += t1 - t0
+        predict_s += t2 - t1
+    return out, fit_s, predict_s
+
+
+def run_model(model: str, train: np.ndarray, dates: pd.DatetimeIndex, horizon: int):
+    """Returns (forecast (P, horizon), fit_seconds, predict_seconds)."""
+    if model.startswith("prophet"):
+        fc, fit_s, predict_s = _prophet_forecast(train, dates, horizon)
+    else:
+        # the NumPy models produce their forecast as part of the fitting pass
+        t0 = time.perf_counter()
+        if model.startswith("fast_auto"):
+            chosen = ff.select_models(train, holdout=horizon)
+            fc = np.full((train.shape[0], horizon), np.nan)
+            for name in ff.MODELS:
+                rows = chosen == name
+                if rows.any():
+                    fc[rows] = ff._FITTERS[name](train, horizon)[1][rows]
+        else:
+            fc = ff._FITTERS[model](train, horizon)[1]
+        fit_s, predict_s = time.perf_counter() - t0, 0.0
+    if model.endswith("_blend"):
+        fc = _blend(fc, train)
+    return fc, fit_s, predict_s
+
+
+def _task(model: str, cutoff: int, train: np.ndarray, dates: pd.DatetimeIndex, horizon: int) -> dict:
+    """One (model, cutoff) backtest step, run in a worker process."""
+    tracemalloc.start()
+    try:
+        fc, fit_s, predict_s = run_model(model, train, dates, horizon)
+        error = ""
+    except Exception as e:
+        fc, fit_s, predict_s = None, 0.0, 0.0
+        error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"model": model, "cutoff": cutoff, "forecast": fc, "fit_s": fit_s,
+            "predict_s": predict_s, "peak_kb": peak / 1024, "error": error}
+
+
+# ---------------------------
+# Metrics
+# ---------------------------
+def _mase_scale(train: np.ndarray) -> np.ndarray:
+    """Per-row in-sample MAE of the seasonal-naive (lag 7, or lag 1 if short) forecast."""
+    scale = np.full(train.shape[0], np.nan)
+    for lag in (ff.SEASON, 1):
+        if train.shape[1] <= lag:
+            continue
+        d = np.abs(train[:, lag:] - train[:, :-lag])
+        n = (~np.isnan(d)).sum(axis=1)
+        s = np.where(n > 0, np.nansum(d, axis=1) / np.maximum(n, 1), np.nan)
+        scale = np.where(np.isnan(scale) & (n >= 3), s, scale)
+    return np.where(scale > 0, scale, np.nan)
+
+
+def _movement(last: np.ndarray, value: np.ndarray) -> np.ndarray:
+    return np.select([value > last * 1.1, value < last * 0.9], [1, -1], default=0)
+
+
+def score(forecast: np.ndarray, actual: np.ndarray, train: np.ndarray) -> dict:
+    """Per-row MAPE / MASE / trend hit for one cutoff."""
+    err = np.abs(forecast - actual)
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # rows with no scorable days
+        ape = np.where(actual != 0, err / np.abs(actual), np.nan)
+        mape = np.nanmean(ape, axis=1) * 100
+        mase = np.nanmean(err, axis=1) / _mase_scale(train)
+    last = ff._fill_edges(train)[:, -1]
+    trend_hit = (_movement(last, forecast[:, -1]) == _movement(last, actual[:, -1])).astype(float)
+    trend_hit[np.isnan(forecast[:, -1]) | np.isnan(actual[:, -1])] = np.nan
+    return {"mape": mape, "mase": mase, "trend_hit": trend_hit}
+
+
+# ---------------------------
+# Harness
+# ---------------------------
+def rolling_cutoffs(n_days: int, horizon: int, n_cutoffs: int, step: int, min_train: int) -> list:
+    """Column indices of the last training day for each origin, oldest first."""
+    last = n_days - horizon - 1
+    cutoffs = [last - i * step for i in range(n_cutoffs)]
+    return sorted(c for c in cutoffs if c + 1 >= min_train)
+
+
+def backtest(
+    daily_sales: pd.DataFrame,
+    models=DEFAULT_MODELS,
+    horizon: int = ff.HORIZON,
+    n_cutoffs: int = 3,
+    step: int = ff.HORIZON,
+    min_train: int = 14,
+    workers: Optional[int] = None,
+) -> dict:
+    products, dates, Y = ff.sales_matrix(daily_sales)
+    cutoffs = rolling_cutoffs(Y.shape[1], horizon, n_cutoffs, step, min_train)
+    if not cutoffs:
+        raise ValueError(f"not enough history for a {horizon}-day backtest with {min_train} training days")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_task, m, c, Y[:, :c + 1], dates[:c + 1], horizon)
+                   for m in models for c in cutoffs]
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - started
+
+    per_model, per_product = {}, []
+    for model in models:
+        runs = [r for r in results if r["model"] == model]
+        mape, mase, hits = [], [], []
+        for r in runs:
+            if r["forecast"] is None:
+                continue
+            c = r["cutoff"]
+            s = score(r["forecast"], Y[:, c + 1:c + 1 + horizon], Y[:, :c + 1])
+            mape.append(s["mape"]); mase.append(s["mase"]); hits.append(s["trend_hit"])
+            for i, p in enumerate(products):
+                per_product.append({"model": model, "cutoff": str(dates[c].date()), "product": p,
+                                    "mape": s["mape"][i], "mase": s["mase"][i], "trend_hit": s["trend_hit"][i]})
+        cat = (lambda xs: np.concatenate(xs) if xs else np.array([np.nan]))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            per_model[model] = {
+                "mape": _r(np.nanmean(cat(mape))),
+                "mase": _r(np.nanmean(cat(mase))),
+                "trend_accuracy": _r(np.nanmean(cat(hits))),
+                "fit_seconds": _r(sum(r["fit_s"] for r in runs)),
+                "predict_seconds": _r(sum(r["predict_s"] for r in runs)),
+                "peak_memory_kb": _r(max((r["peak_kb"] for r in runs), default=0.0)),
+                "forecasts": int(sum(np.isfinite(r["forecast"][:, -1]).sum() for r in runs if r["forecast"] is not None)),
+                "failures": [r["error"].splitlines()[0] for r in runs if r["error"]],
+            }
+
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {"horizon": horizon, "n_cutoffs": len(cutoffs), "step": step, "min_train": min_train,
+                   "cutoffs": [str(dates[c].date()) for c in cutoffs], "products": int(len(products)),
+                   "days": int(Y.shape[1])},
+        "wall_seconds": _r(wall),
+        "models": per_model,
+        "per_product": pd.DataFrame(per_product),
+    }
+
+
+def _r(x, nd: int = 4):
+    x = float(x)
+    return None if np.isnan(x) else round(x, nd)
+
+
+def write_report(report: dict, out_path: str) -> str:
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    payload = {k: v for k, v in report.items() if k != "per_product"}
+    with open(out_path, "w") as fh:
+        json.dump(payload, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+    csv_path = os.path.splitext(out_path)[0] + "_per_product.csv"
+    report["per_product"].round(4).sort_values(["model", "cutoff", "product"]).to_csv(csv_path, index=False)
+    return out_path
+
+
+def summary_table(report: dict) -> pd.DataFrame:
+    return pd.DataFrame(report["models"]).T.drop(columns=["failures"])
+
+
+def compare(new: dict, old: dict) -> pd.DataFrame:
+    """new - old for every metric of models present in both reports."""
+    cols = ["mape", "mase", "trend_accuracy", "fit_seconds", "predict_seconds", "peak_memory_kb"]
+    rows = {}
+    for model in sorted(set(new["models"]) & set(old["models"])):
+        rows[model] = {c: (None if new["models"][model][c] is None or old["models"][model][c] is None
+                           else round(new["models"][model][c] - old["models"][model][c], 4)) for c in cols}
+    return pd.DataFrame(rows).T
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Rolling-origin backtest of the forecasting models.")
+    ap.add_argument("--data-dir", default=sales_data_dir())
+    ap.add_argument("--models", default=",".join(DEFAULT_MODELS), help="comma separated, from: " + ", ".join(DEFAULT_MODELS))
+    ap.add_argument("--horizon", type=int, default=ff.HORIZON)
+    ap.add_argument("--cutoffs", type=int, default=3, help="number of rolling origins")
+    ap.add_argument("--step", type=int, default=ff.HORIZON, help="days between origins")
+    ap.add_argument("--min-train", type=int, default=14)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", default=os.path.join(BACKTEST_DIR, "backtest_report.json"))
+    ap.add_argument("--compare", default=None, help="previous report to diff against")
+    args = ap.parse_args(argv)
+
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    unknown = [m for m in models if m not in DEFAULT_MODELS]
+    if unknown:
+        ap.error(f"unknown model(s): {', '.join(unknown)}")
+
+    daily_sales = load_daily_sales(args.data_dir)
+    if daily_sales.empty:
+        print(f"No sales data found in {args.data_dir}")
+        return 1
+
+    report = backtest(daily_sales, models=models, horizon=args.horizon, n_cutoffs=args.cutoffs,
+                      step=args.step, min_train=args.min_train, workers=args.workers)
+    write_report(report, args.out)
+    cfg = report["config"]
+    print(f"{cfg['products']} products, cutoffs {', '.join(cfg['cutoffs'])}, horizon {cfg['horizon']}d, "
+          f"wall {report['wall_seconds']}s")
+    print(summary_table(report).to_string())
+    for model, m in report["models"].items():
+        for f in m["failures"]:
+            print(f"FAILED {model}: {f}")
+    if args.compare:
+        with open(args.compare) as fh:
+            old = json.load(fh)
+        print(f"\nChange vs {args.compare} (new - old):")
+        print(compare(report, old).to_string())
+    print(f"\nReport written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# forecast_batch.py
+"""
+Batch forecasting job for the AI Forecast page.
+
+Fits one Prophet model per product across a process pool and persists the
+forecasts, trend classifications and a per-product run report under
+data/forecasts/. The page then only looks results up instead of fitting on
+every rerun.
+
+Run from the repo root:
+    python forecast_batch.py --workers 4
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import traceback
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import pandas as pd
+
+from forecast_model_store import MODEL_STORE_DIR, ModelStore
+from sales_ingest import SalesIngestor, sales_data_dir
+
+FORECAST_DIR = os.path.join("data", "forecasts")
+FORECAST_PERIODS = 7
+MIN_POINTS = 5
+PROPHET_CONFIG = {"weekly_seasonality": True, "daily_seasonality": False, "seasonality_mode": "additive"}
+
+FORECASTS_FILE = "forecasts.csv"
+TRENDS_FILE = "trends.csv"
+REPORT_FILE = "report.csv"
+META_FILE = "meta.json"
+
+
+def load_daily_sales(data_dir: Optional[str] = None) -> pd.DataFrame:
+    """Date/Product/Sales_Units per day and product, via the incremental sales store."""
+    return SalesIngestor(data_dir).refresh()
+
+
+def daily_sales_hash(daily_sales: pd.DataFrame) -> str:
+    """Stable fingerprint of the sales history a batch was computed from."""
+    d = daily_sales[["Date", "Product", "Sales_Units"]].sort_values(["Product", "Date"])
+    buf = d.to_csv(index=False).encode("utf-8")
+    return hashlib.md5(buf).hexdigest()
+
+
+def classify_trend(last_actual: float, next_forecast: float) -> str:
+    if next_forecast > last_actual * 1.1:
+        return "⚡ Fast Moving"
+    if next_forecast < last_actual * 0.9:
+        return "🐢 Slow Moving"
+    return "➖ Stable"
+
+
+def blend_forecast(forecast: pd.DataFrame, prod_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    0.7 * yhat + 0.3 * 3-day rolling mean of actuals. Future rows have no actuals,
+    so the last rolling mean is carried forward over the horizon.
+    """
+    out = forecast[["ds", "yhat"]].merge(prod_data, on="ds", how="left")
+    rolling = out["y"].rolling(window=3, min_periods=1).mean().bfill().ffill()
+    out["Adj_Forecast"] = 0.7 * out["yhat"] + 0.3 * rolling
+    return out
+
+
+def forecast_product(product: str, prod_data: pd.DataFrame, periods: int = FORECAST_PERIODS,
+                     store_dir: Optional[str] = MODEL_STORE_DIR, warm_start: bool = True) -> dict:
+    """
+    Fit (or load from the model store) and forecast a single product. Runs inside
+    a worker process, so it never raises: failures come back as status="failed"
+    with the traceback attached. Model is "hit", "warm", "miss" or "" without a store.
+    """
+    started = time.perf_counter()
+    result = {"Product": product, "Points": int(len(prod_data)), "Status": "ok", "Model": "",
+              "Seconds": 0.0, "Error": "", "forecast": None}
+    try:
+        if len(prod_data) < MIN_POINTS:
+            result["Status"] = "skipped"
+            result["Error"] = f"only {len(prod_data)} data points (need {MIN_POINTS})"
+            return result
+
+        import logging
+        logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+        from prophet import Prophet
+
+        if store_dir:
+            m, result["Model"] = ModelStore(store_dir).fit_or_load(
+                product, prod_data, PROPHET_CONFIG, warm_start=warm_start)
+        else:
+            m = Prophet(**PROPHET_CONFIG)
+            m.fit(prod_data)
+        future = m.make_future_dataframe(periods=periods)
+        result["forecast"] = blend_forecast(m.predict(future), prod_data)
+    except Exception as e:
+        result["Status"] = "failed"
+        result["Error"] = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+    finally:
+        result["Seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def _series_by_product(daily_sales: pd.DataFrame) -> dict:
+    series = {}
+    for product, grp in daily_sales.groupby("Product"):
+        series[product] = (
+            grp[["Date", "Sales_Units"]]
+            .rename(columns={"Date": "ds", "Sales_Units": "y"})
+            .sort_values("ds")
+            .reset_index(drop=True)
+        )
+    return series
+
+
+def run_batch(
+    daily_sales: pd.DataFrame,
+    out_dir: str = FORECAST_DIR,
+    workers: Optional[int] = None,
+    periods: int = FORECAST_PERIODS,
+    progress=None,
+    store_dir: Optional[str] = MODEL_STORE_DIR,
+    warm_start: bool = True,
+) -> pd.DataFrame:
+    """
+    Forecast every product in daily_sales across a process pool and persist the
+    results to out_dir. Returns the per-product report (Status, Model, Seconds, Error).
+
+    Fitted models are reused from the model store in store_dir (None disables it).
+
+    progress, if given, is called as progress(done, total, product) after each product.
+    """
+    started = time.perf_counter()
+    series = _series_by_product(daily_sales)
+    total = len(series)
+    results = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(forecast_product, p, s, periods, store_dir, warm_start): p
+                   for p, s in series.items()}
+        for fut in as_completed(futures):
+            product = futures[fut]
+            try:
+                res = fut.result()
+            except BrokenProcessPool as e:
+                res = {"Product": product, "Points": int(len(series[product])), "Status": "failed",
+                       "Model": "", "Seconds": 0.0, "Error": f"worker crashed: {e}", "forecast": None}
+            results.append(res)
+            if progress:
+                progress(len(results), total, product)
+
+    forecasts, trends = [], []
+    for res in results:
+        fc = res.pop("forecast")
+        if fc is None:
+            continue
+        fc.insert(0, "Product", res["Product"])
+        forecasts.append(fc)
+        actuals = fc["y"].dropna()
+        last_actual = float(actuals.iloc[-1]) if not actuals.empty else 0.0
+        next_forecast = float(fc["Adj_Forecast"].iloc[-1])
+        trends.append({
+            "Product": res["Product"],
+            "Avg_Sales": float(actuals.mean()) if not actuals.empty else 0.0,
+            "Last_Actual": last_actual,
+            "Next_Forecast": next_forecast,
+            "Change_Pct": (next_forecast / last_actual - 1.0) * 100 if last_actual else 0.0,
+            "Trend": classify_trend(last_actual, next_forecast),
+        })
+
+    report = pd.DataFrame(results, columns=["Product", "Points", "Status", "Model", "Seconds", "Error"])
+    report = report.sort_values("Product").reset_index(drop=True)
+    forecasts_df = (pd.concat(forecasts, ignore_index=True) if forecasts
+                    else pd.DataFrame(columns=["Product", "ds", "yhat", "y", "Adj_Forecast"]))
+    trends_df = pd.DataFrame(trends, columns=["Product", "Avg_Sales", "Last_Actual", "Next_Forecast",
+                                              "Change_Pct", "Trend"])
+    trends_df = trends_df.sort_values("Change_Pct", ascending=False).reset_index(drop=True)
+
+    meta = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "data_hash": daily_sales_hash(daily_sales),
+        "periods": periods,
+        "products": total,
+        "ok": int((report["Status"] == "ok").sum()),
+        "failed": int((report["Status"] == "failed").sum()),
+        "skipped": int((report["Status"] == "skipped").sum()),
+        "wall_seconds": round(time.perf_counter() - started, 3),
+    }
+    if store_dir:
+        # workers each hold their own ModelStore, so aggregate outcomes from the report
+        store = ModelStore(store_dir)
+        store.stats["hits"] = int((report["Model"] == "hit").sum())
+        store.stats["misses"] = int(report["Model"].isin(["warm", "miss"]).sum())
+        store.stats["warm_starts"] = int((report["Model"] == "warm").sum())
+        store.evict()
+        meta["model_store"] = store.summary()
+    save_batch_results(out_dir, forecasts_df, trends_df, report, meta)
+    return report
+
+
+def save_batch_results(out_dir, forecasts, trends, report, meta):
+    # write to temp names first so a reader never sees a half-written batch
+    os.makedirs(out_dir, exist_ok=True)
+    items = [(FORECASTS_FILE, forecasts), (TRENDS_FILE, trends), (REPORT_FILE, report)]
+    for name, df in items:
+        tmp = os.path.join(out_dir, f".{name}.tmp")
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, os.path.join(out_dir, name))
+    tmp = os.path.join(out_dir, f".{META_FILE}.tmp")
+    with open(tmp, "w") as fh:
+        json.dump(meta, fh, indent=2)
+    os.replace(tmp, os.path.join(out_dir, META_FILE))
+
+
+def load_batch_results(out_dir: str = FORECAST_DIR):
+    """
+    Returns dict with forecasts, trends, report (DataFrames) and meta (dict),
+    or None if no batch has been run yet.
+    """
+    meta_path = os.path.join(out_dir, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as fh:
+        meta = json.load(fh)
+    forecasts = pd.read_csv(os.path.join(out_dir, FORECASTS_FILE), parse_dates=["ds"])
+    trends = pd.read_csv(os.path.join(out_dir, TRENDS_FILE))
+    report = pd.read_csv(os.path.join(out_dir, REPORT_FILE)).fillna({"Error": "", "Model": ""})
+    return {"forecasts": forecasts, "trends": trends, "report": report, "meta": meta}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Forecast all products and persist results for the AI Forecast page.")
+    ap.add_argument("--data-dir", default=sales_data_dir(), help="sales reports folder (default: $SALES_DATA_DIR or data/sales_reports)")
+    ap.add_argument("--out-dir", default=FORECAST_DIR)
+    ap.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    ap.add_argument("--periods", type=int, default=FORECAST_PERIODS)
+    ap.add_argument("--store-dir", default=MODEL_STORE_DIR, help="fitted model store ('' to disable)")
+    ap.add_argument("--no-warm-start", action="store_true", help="cold-fit changed products")
+    args = ap.parse_args(argv)
+
+    daily_sales = load_daily_sales(args.data_dir)
+    if daily_sales.empty:
+        print(f"No sales data found in {args.data_dir}")
+        return 1
+
+    def _progress(done, total, product):
+        print(f"[{done}/{total}] {product}")
+
+    report = run_batch(daily_sales, out_dir=args.out_dir, workers=args.workers,
+                       periods=args.periods, progress=_progress,
+                       store_dir=args.store_dir or None, warm_start=not args.no_warm_start)
+    print(report[["Product", "Points", "Status", "Model", "Seconds"]].to_string(index=False))
+    meta = load_batch_results(args.out_dir)["meta"]
+    if "model_store" in meta:
+        ms = meta["model_store"]
+        print(f"\nModel store: {ms['hits']} hits, {ms['misses']} misses ({ms['warm_starts']} warm), "
+              f"hit rate {ms['hit_rate']:.0%}, {ms['entries']} entries, {ms['evicted']} evicted")
+    failed = report[report["Status"] == "failed"]
+    for _, r in failed.iterrows():
+        print(f"\nFAILED {r['Product']}:\n{r['Error']}")
+    return 0 if failed.empty else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# forecast_model_store.py
+"""
+On-disk store of fitted Prophet models.
+
+Models are keyed by product + a hash of that product's (ds, y) history + the
+model config, so an unchanged product loads its fitted model instead of
+refitting. Changed products are refit, optionally warm-started from the
+product's previous parameters.
+
+Layout: <root>/<product_id>/<key>.json, one directory per product. Files are
+only ever written via temp+rename and last use is tracked with the file mtime,
+so batch worker processes can share the store without a lock or index file.
+"""
+import os
+import json
+import glob
+import time
+import hashlib
+from typing import Optional, Tuple
+
+import pandas as pd
+
+MODEL_STORE_DIR = os.path.join("data", "model_store")
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def product_id(product: str) -> str:
+    return hashlib.md5(str(product).encode("utf-8")).hexdigest()[:12]
+
+
+def model_key(product: str, prod_data: pd.DataFrame, config: dict) -> str:
+    """sha1 over product, the (ds, y) history and the model config."""
+    h = hashlib.sha1()
+    h.update(str(product).encode("utf-8"))
+    d = prod_data[["ds", "y"]].sort_values("ds")
+    h.update(pd.to_datetime(d["ds"]).astype("int64").to_numpy().tobytes())
+    h.update(pd.to_numeric(d["y"], errors="coerce").astype("float64").to_numpy().tobytes())
+    h.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _stan_init(m) -> dict:
+    """Previous fit's parameters in the shape Prophet.fit(init=...) expects."""
+    res = {}
+    for pname in ["k", "m", "sigma_obs"]:
+        res[pname] = float(m.params[pname][0][0])
+    for pname in ["delta", "beta"]:
+        res[pname] = m.params[pname][0]
+    return res
+
+
+class ModelStore:
+    def __init__(self, root: str = MODEL_STORE_DIR, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_age_days: Optional[float] = DEFAULT_MAX_AGE_DAYS):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.stats = {"hits": 0, "misses": 0, "warm_starts": 0, "evicted": 0}
+
+    # ---- paths ----
+    def _path(self, product: str, key: str) -> str:
+        return os.path.join(self.root, product_id(product), f"{key}.json")
+
+    def _latest_for_product(self, product: str) -> Optional[str]:
+        files = glob.glob(os.path.join(self.root, product_id(product), "*.json"))
+        return max(files, key=os.path.getmtime) if files else None
+
+    # ---- load / save ----
+    def load(self, product: str, key: str):
+        from prophet.serialize import model_from_json
+
+        path = self._path(product, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as fh:
+                m = model_from_json(fh.read())
+        except Exception:
+            # corrupt or written by an incompatible prophet version: drop it and refit
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        os.utime(path, None)  # mark as recently used for eviction
+        return m
+
+    def save(self, product: str, key: str, m) -> str:
+        from prophet.serialize import model_to_json
+
+        path = self._path(product, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fh:
+            fh.write(model_to_json(m))
+        os.replace(tmp, path)
+        return path
+
+    def previous_params(self, product: str) -> Optional[dict]:
+        """Parameters of the most recently used model for product, for warm starts."""
+        from prophet.serialize import model_from_json
+
+        path = self._latest_for_product(product)
+        if not path:
+            return None
+        try:
+            with open(path) as fh:
+                return _stan_init(model_from_json(fh.read()))
+        except Exception:
+            return None
+
+    # ---- main entry point ----
+    def fit_or_load(self, product: str, prod_data: pd.DataFrame, config: dict,
+                    warm_start: bool = True) -> Tuple[object, str]:
+        """
+        Return (fitted model, outcome). outcome is "hit" when the model was loaded
+        from the store, "warm" when refit from the previous parameters and "miss"
+        for a cold fit.
+        """
+        from prophet import Prophet
+
+        key = model_key(product, prod_data, config)
+        m = self.load(product, key)
+        if m is not None:
+            self.stats["hits"] += 1
+            return m, "hit"
+
+        self.stats["misses"] += 1
+        init = self.previous_params(product) if warm_start else None
+        outcome = "miss"
+        m = None
+        if init is not None:
+            try:
+                m = Prophet(**config)
+                m.fit(prod_data, init=init)
+                outcome = "warm"
+                self.stats["warm_starts"] += 1
+            except Exception:
+                # parameter shapes change with the number of changepoints; fall back to a cold fit
+                m = None
+        if m is None:
+            m = Prophet(**config)
+            m.fit(prod_data)
+        self.save(product, key, m)
+        return m, outcome
+
+    # ---- housekeeping ----
+    def evict(self) -> int:
+        """
+        Drop models older than max_age_days, then the least recently used ones
+        beyond max_entries. Returns the number of files removed.
+        """
+        files = glob.glob(os.path.join(self.root, "*", "*.json"))
+        entries = sorted(((os.path.getmtime(f), f) for f in files), reverse=True)
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days else None
+        removed = 0
+        for i, (mtime, f) in enumerate(entries):
+            if i >= self.max_entries or (cutoff is not None and mtime < cutoff):
+                try:
+                    os.remove(f)
+                    removed += 1
+                except OSError:
+                    pass
+        for d in glob.glob(os.path.join(self.root, "*")):
+            if os.path.isdir(d) and not os.listdir(d):
+                os.rmdir(d)
+        self.stats["evicted"] += removed
+        return removed
+
+    def summary(self) -> dict:
+        files = glob.glob(os.path.join(self.root, "*", "*.json"))
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(files),
+            "bytes": sum(os.path.getsize(f) for f in files),
+        }
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# glyph_cache.py
+"""
+Rasterized text runs, kept and reused across labels.
+
+The labels of one PO repeat the same product line, flavour, strength and
+SKU font runs many times. ImageDraw.text rasterizes every run through
+FreeType again; draw_text() keeps the mask FreeType produced, keyed by
+(text, font file, size, sub-pixel start, mode), and paints the mask with
+the same draw_bitmap call ImageDraw.text ends in, so the pixels are
+identical.
+
+The cache is an LRU bounded by mask bytes (MAX_BYTES, or the
+BARCODE_GLYPH_CACHE_MB env var; 0 turns it off). stats() reports hits,
+misses, evictions, entries and bytes, and is registered with
+instrumentation as cache "glyphs".
+
+Fonts without a file path (Pillow's built-in fallback) are drawn with
+ImageDraw.text as before.
+"""
+import os
+import math
+import threading
+from collections import OrderedDict
+
+from PIL import ImageFont
+
+import instrumentation
+
+MAX_BYTES = int(float(os.environ.get("BARCODE_GLYPH_CACHE_MB", "32")) * 1024 * 1024)
+
+
+class GlyphRunCache:
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._runs = OrderedDict()  # key -> (mask, offset, nbytes)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def mask(self, text: str, font: ImageFont.FreeTypeFont, start, mode: str):
+        key = (text, font.path, font.index, font.size, start, mode)
+        with self._lock:
+            hit = self._runs.get(key)
+            if hit is not None:
+                self._runs.move_to_end(key)
+                self.hits += 1
+                return hit[0], hit[1]
+            self.misses += 1
+        mask, offset = font.getmask2(text, mode, anchor="la", start=start)
+        nbytes = mask.size[0] * mask.size[1]
+        if nbytes > self.max_bytes:
+            return mask, offset
+        with self._lock:
+            if key not in self._runs:
+                self._runs[key] = (mask, offset, nbytes)
+                self.bytes += nbytes
+                while self.bytes > self.max_bytes:
+                    _, (_, _, dropped) = self._runs.popitem(last=False)
+                    self.bytes -= dropped
+                    self.evictions += 1
+        return mask, offset
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._runs), "bytes": self.bytes}
+
+
+_cache = GlyphRunCache()
+instrumentation.register_cache("glyphs", _cache.stats)
+
+
+def draw_text(draw, xy, text: str, font, fill="black"):
+    """draw.text(xy, text, fill=fill, font=font) for one line, from cached masks."""
+    if (not _cache.max_bytes or not isinstance(font, ImageFont.FreeTypeFont)
+            or not isinstance(font.path, str) or "\n" in text or draw.fontmode not in ("L", "1")):
+        draw.text(xy, text, fill=fill, font=font)
+        return
+    ink, fill_ink = draw._getink(fill)
+    ink = fill_ink if ink is None else ink
+    start = (math.modf(xy[0])[0], math.modf(xy[1])[0])
+    mask, offset = _cache.mask(text, font, start, draw.fontmode)
+    draw.draw.draw_bitmap((int(xy[0]) + offset[0], int(xy[1]) + offset[1]), mask, ink)
+
+
+def stats() -> dict:
+    return _cache.stats()
+
+
+def clear():
+    _cache.clear()
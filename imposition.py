@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# imposition.py
+"""
+N-up imposition of labels onto A4/Letter sheet stock for office lasers.
+
+A layout is a plain dict (sheet_layout()) with the sheet size, rows x columns,
+margins and gutters in mm. Labels are placed cell by cell, left to right and
+top to bottom, straight onto the PDF page canvas. Nothing is re-read from
+disk, and a label printed many times is embedded in the PDF once (reportlab
+stores images by content hash). Optional crop marks are drawn as vector
+lines outside each cell; between cells they stop at the middle of the
+gutter, so they never reach into a neighbouring label.
+
+    layout = sheet_layout("a4", rows=6, cols=4)              # 24 per page
+    run_pipeline(label_specs(df), [SheetSink("po_sheets.pdf", layout)])
+
+400 labels on that layout are 17 pages and one print job.
+"""
+from typing import Iterable, Optional, Tuple, Union
+
+from PIL import Image
+
+from instrumentation import timed, timer
+from render_pipeline import Sink
+
+MM = 72.0 / 25.4  # points per mm
+
+SHEETS = {
+    "a4": (210.0, 297.0),
+    "letter": (215.9, 279.4),
+}
+
+CROP_MARK_MM = 3.0
+CROP_OFFSET_MM = 1.0
+
+
+def _pair(value, n: int = 2) -> tuple:
+    if isinstance(value, (int, float)):
+        return (float(value),) * n
+    return tuple(float(v) for v in value)
+
+
+def sheet_layout(
+    sheet: Union[str, Tuple[float, float]] = "a4",
+    rows: int = 6,
+    cols: int = 4,
+    margins_mm=8.0,
+    gutter_mm=3.0,
+    crop_marks: bool = True,
+    label_mm: Optional[Tuple[float, float]] = None,
+) -> dict:
+    """
+    Layout for `rows` x `cols` labels per sheet. margins_mm is one value or
+    (top, right, bottom, left); gutter_mm is one value or (horizontal,
+    vertical). label_mm fixes the label size inside each cell (centred);
+    by default labels are scaled to fit the cell, keeping their aspect ratio.
+    """
+    width, height = SHEETS[sheet.lower()] if isinstance(sheet, str) else _pair(sheet)
+    margins = _pair(margins_mm, 4) if isinstance(margins_mm, (int, float)) else _pair(margins_mm)
+    if len(margins) != 4:
+        raise ValueError("margins_mm must be one value or (top, right, bottom, left)")
+    gutter_x, gutter_y = _pair(gutter_mm)
+    rows, cols = int(rows), int(cols)
+    if rows < 1 or cols < 1:
+        raise ValueError("rows and cols must be >= 1")
+    top, right, bottom, left = margins
+    cell_w = (width - left - right - gutter_x * (cols - 1)) / cols
+    cell_h = (height - top - bottom - gutter_y * (rows - 1)) / rows
+    if cell_w <= 0 or cell_h <= 0:
+        raise ValueError("margins and gutters leave no room for labels")
+    if label_mm and (label_mm[0] > cell_w + 1e-6 or label_mm[1] > cell_h + 1e-6):
+        raise ValueError(f"label {label_mm[0]}x{label_mm[1]} mm does not fit a {cell_w:.1f}x{cell_h:.1f} mm cell")
+    return {
+        "sheet_mm": (width, height),
+        "rows": rows,
+        "cols": cols,
+        "margins_mm": margins,
+        "gutter_mm": (gutter_x, gutter_y),
+        "cell_mm": (cell_w, cell_h),
+        "label_mm": tuple(label_mm) if label_mm else None,
+        "crop_marks": bool(crop_marks),
+    }
+
+
+def per_sheet(layout: dict) -> int:
+    return layout["rows"] * layout["cols"]
+
+
+def sheets_needed(labels: int, layout: dict) -> int:
+    return -(-int(labels) // per_sheet(layout))
+
+
+def parse_grid(text: str) -> Tuple[int, int]:
+    """"4x6" (columns x rows) -> (rows, cols)."""
+    cols, rows = (int(v) for v in str(text).lower().split("x"))
+    return rows, cols
+
+
+def cell_origin(layout: dict, slot: int) -> Tuple[float, float]:
+    """Bottom-left corner of cell `slot` in PDF points (origin bottom-left of the sheet)."""
+    row, col = divmod(slot, layout["cols"])
+    top, _right, _bottom, left = layout["margins_mm"]
+    gutter_x, gutter_y = layout["gutter_mm"]
+    cell_w, cell_h = layout["cell_mm"]
+    x_mm = left + col * (cell_w + gutter_x)
+    y_mm = layout["sheet_mm"][1] - top - (row + 1) * cell_h - row * gutter_y
+    return x_mm * MM, y_mm * MM
+
+
+class SheetWriter:
+    """Places images into consecutive cells of a multi-page PDF."""
+
+    def __init__(self, pdf_path, layout: dict):
+        from reportlab.pdfgen import canvas
+
+        self.pdf_path = pdf_path
+        self.layout = layout
+        self.labels = 0
+        self.pages = 0
+        self._slot = 0
+        self._canvas = canvas.Canvas(pdf_path, pagesize=tuple(v * MM for v in layout["sheet_mm"]))
+
+    def _placement(self, img: Image.Image) -> Tuple[float, float, float, float]:
+        cell_w, cell_h = (v * MM for v in self.layout["cell_mm"])
+        if self.layout["label_mm"]:
+            w, h = (v * MM for v in self.layout["label_mm"])
+        else:
+            scale = min(cell_w / img.width, cell_h / img.height)
+            w, h = img.width * scale, img.height * scale
+        return (cell_w - w) / 2, (cell_h - h) / 2, w, h
+
+    def _mark_span(self, margin: Optional[float], axis: int) -> Tuple[float, float]:
+        """
+        (start, end) of a crop mark in points from the cell edge. margin is the
+        sheet margin on that side for an outer cell, None between two cells.
+        """
+        if margin is not None:
+            return CROP_OFFSET_MM * MM, min(CROP_OFFSET_MM + CROP_MARK_MM, margin) * MM
+        # between two cells: stop at the middle of the gutter so marks never reach the next label
+        half = self.layout["gutter_mm"][axis] / 2
+        return min(CROP_OFFSET_MM, half / 3) * MM, min(CROP_OFFSET_MM + CROP_MARK_MM, half) * MM
+
+    def _crop_marks(self, x: float, y: float, slot: int):
+        c = self._canvas
+        rows, cols = self.layout["rows"], self.layout["cols"]
+        row, col = divmod(slot, cols)
+        top, right, bottom, left = self.layout["margins_mm"]
+        cell_w, cell_h = (v * MM for v in self.layout["cell_mm"])
+        below = self._mark_span(bottom if row == rows - 1 else None, 1)
+        above = self._mark_span(top if row == 0 else None, 1)
+        before = self._mark_span(left if col == 0 else None, 0)
+        after = self._mark_span(right if col == cols - 1 else None, 0)
+        c.setLineWidth(0.25)
+        for cx in (x, x + cell_w):
+            for cy, sign, (start, end) in ((y, -1, below), (y + cell_h, 1, above)):
+                if end > start:
+                    c.line(cx, cy + sign * start, cx, cy + sign * end)  # vertical, beyond the edge
+        for cy in (y, y + cell_h):
+            for cx, sign, (start, end) in ((x, -1, before), (x + cell_w, 1, after)):
+                if end > start:
+                    c.line(cx + sign * start, cy, cx + sign * end, cy)  # horizontal
+
+    def add(self, img: Image.Image, copies: int = 1):
+        from reportlab.lib.utils import ImageReader
+
+        reader = ImageReader(img)
+        dx, dy, w, h = self._placement(img)
+        for _ in range(max(1, int(copies))):
+            x, y = cell_origin(self.layout, self._slot)
+            self._canvas.drawImage(reader, x + dx, y + dy, width=w, height=h)
+            if self.layout["crop_marks"]:
+                self._crop_marks(x, y, self._slot)
+            self.labels += 1
+            self._slot += 1
+            if self._slot == per_sheet(self.layout):
+                self._canvas.showPage()
+                self.pages += 1
+                self._slot = 0
+
+    def close(self) -> Optional[str]:
+        if self.labels == 0:
+            return None
+        if self._slot:
+            self._canvas.showPage()
+            self.pages += 1
+        self._canvas.save()
+        return self.pdf_path
+
+
+class SheetSink(Sink):
+    """render_pipeline sink: labels (with their copies) imposed onto sheets."""
+
+    name = "sheets"
+    supports_copies = True
+
+    def __init__(self, pdf_path, layout: Optional[dict] = None):
+        self.writer = SheetWriter(pdf_path, layout or sheet_layout())
+
+    def write(self, spec, img):
+        with timer("encode.sheets"):
+            self.writer.add(img, spec.get("copies", 1))
+
+    def close(self):
+        return self.writer.close()
+
+
+@timed("encode.sheets")
+def impose(items: Iterable, pdf_path, layout: Optional[dict] = None) -> Optional[str]:
+    """
+    Impose already-rendered labels: items are PIL images, paths, or
+    (image or path, copies) pairs. Returns pdf_path, or None when empty.
+    """
+    writer = SheetWriter(pdf_path, layout or sheet_layout())
+    for item in items:
+        item, copies = item if isinstance(item, tuple) else (item, 1)
+        img = Image.open(item) if isinstance(item, str) else item
+        writer.add(img, copies)
+    return writer.close()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# instrumentation.py
+"""
+Per-stage timing for the label pipeline.
+
+    from instrumentation import timed, timer
+
+    @timed("pdf.extract_tables")
+    def read_pdf_with_plumber(path): ...
+
+    with timer("label.barcode"):
+        ...
+
+Every stage feeds an in-process histogram (count, sum, min, max and fixed
+buckets). snapshot() returns them for the Metrics page and prometheus_text()
+renders the Prometheus text exposition format. Histograms live in one
+process; a worker process can wrap its work in recording() and return the
+observations, which the parent adds to its own histograms with merge().
+
+Caches register a stats callback with register_cache(name, fn); fn returns
+counters such as hits, misses, evictions, entries and bytes. cache_stats()
+lists them with a hit rate, and they are exported next to the timings.
+
+Set BARCODE_METRICS=0 to turn it off. When off, timer() hands back a shared
+no-op context manager and @timed functions make one flag check before
+calling through, so nothing is measured or stored.
+"""
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+METRICS_ENV = "BARCODE_METRICS"
+METRIC_NAME = "barcode_stage_seconds"
+CACHE_METRIC = "barcode_cache"
+
+# upper bounds in seconds; +Inf is implicit
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = os.environ.get(METRICS_ENV, "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(on: bool):
+    global _enabled
+    _enabled = bool(on)
+
+
+class Histogram:
+    __slots__ = ("count", "total", "min", "max", "buckets", "_lock")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        i = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.buckets[i] += 1
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimate from the buckets (linear within a bucket), like histogram_quantile()."""
+        with self._lock:
+            counts = list(self.buckets)
+            n = self.count
+        if not n:
+            return 0.0
+        rank = q * n
+        seen = 0
+        for i, c in enumerate(counts):
+            if seen + c >= rank and c:
+                lo = BUCKETS[i - 1] if i > 0 else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return max(self.min, min(self.max, lo + (hi - lo) * (rank - seen) / c))
+            seen += c
+        return self.max
+
+
+_histograms: Dict[str, Histogram] = {}
+_registry_lock = threading.Lock()
+
+
+def _histogram(name: str) -> Histogram:
+    h = _histograms.get(name)
+    if h is None:
+        with _registry_lock:
+            h = _histograms.setdefault(name, Histogram())
+    return h
+
+
+_local = threading.local()
+
+
+def _observe(name: str, seconds: float):
+    _histogram(name).observe(seconds)
+    recorded = getattr(_local, "recorded", None)
+    if recorded is not None:
+        recorded.append((name, seconds))
+
+
+def observe(name: str, seconds: float):
+    """Record a duration measured by the caller."""
+    if _enabled:
+        _observe(name, seconds)
+
+
+@contextmanager
+def recording():
+    """
+    Also collect this thread's observations as a list of (stage, seconds),
+    e.g. to send a worker process's timings back with its result (merge()).
+    """
+    outer = getattr(_local, "recorded", None)
+    _local.recorded = []
+    try:
+        yield _local.recorded
+    finally:
+        _local.recorded = outer
+
+
+def merge(observations):
+    """Record (stage, seconds) pairs measured elsewhere (another process)."""
+    for name, seconds in observations or ():
+        observe(name, seconds)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def timer(name: str):
+    """Context manager timing one stage (errors are timed too)."""
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Decorator form of timer(); the stage defaults to module.function."""
+    def deco(fn):
+        stage = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _observe(stage, time.perf_counter() - start)
+        return wrapper
+    return deco
+
+
+# ---------------------------
+# Caches
+# ---------------------------
+_caches: Dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], dict]):
+    """stats() -> {"hits", "misses", ...}; called whenever metrics are read."""
+    _caches[name] = stats
+
+
+def cache_stats() -> List[dict]:
+    """One row per registered cache, with hit_rate (0-1) when it counts hits and misses."""
+    rows = []
+    for name, fn in sorted(_caches.items()):
+        row = {"cache": name, **fn()}
+        lookups = row.get("hits", 0) + row.get("misses", 0)
+        row["hit_rate"] = round(row.get("hits", 0) / lookups, 4) if lookups else 0.0
+        rows.append(row)
+    return rows
+
+
+# ---------------------------
+# Read side
+# ---------------------------
+def snapshot() -> List[dict]:
+    """One row per stage: count, total/mean/min/max and p50/p95 estimates (milliseconds)."""
+    with _registry_lock:
+        items = sorted(_histograms.items())
+    rows = []
+    for name, h in items:
+        if not h.count:
+            continue
+        rows.append({
+            "stage": name,
+            "count": h.count,
+            "total_ms": round(h.total * 1000, 2),
+            "mean_ms": round(h.total / h.count * 1000, 3),
+            "p50_ms": round(h.quantile(0.50) * 1000, 3),
+            "p95_ms": round(h.quantile(0.95) * 1000, 3),
+            "min_ms": round(h.min * 1000, 3),
+            "max_ms": round(h.max * 1000, 3),
+        })
+    return rows
+
+
+def reset():
+    with _registry_lock:
+        _histograms.clear()
+
+
+def _fmt(v: float) -> str:
+    return "+Inf" if v == float("inf") else repr(float(v))
+
+
+def prometheus_text() -> str:
+    """All stages as one histogram family, labelled by stage."""
+    lines = [
+        f"# HELP {METRIC_NAME} Time spent in each label pipeline stage.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    with _registry_lock:
+        items = sorted(_histograms.items())
+    for name, h in items:
+        with h._lock:
+            counts, count, total = list(h.buckets), h.count, h.total
+        cumulative = 0
+        for bound, c in zip(BUCKETS + (float("inf"),), counts):
+            cumulative += c
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{name}",le="{_fmt(bound)}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_sum{{stage="{name}"}} {total!r}')
+        lines.append(f'{METRIC_NAME}_count{{stage="{name}"}} {count}')
+    caches = cache_stats()
+    for stat in sorted({k for row in caches for k in row if k != "cache"}):
+        lines.append(f"# TYPE {CACHE_METRIC}_{stat} gauge")
+        for row in caches:
+            if isinstance(row.get(stat), (int, float)):
+                lines.append(f'{CACHE_METRIC}_{stat}{{cache="{row["cache"]}"}} {row[stat]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# job_dirs.py
+"""
+Per-job label output directories.
+
+Each generation job writes into its own staging directory,
+labels/jobs/.<job_id>.partial, and nothing else reads it while it is being
+written. When the job finishes, publish() renames it to labels/jobs/<job_id>
+(atomic on one filesystem) and swaps the labels/current symlink to it
+(os.replace of a fresh symlink, also atomic). A reader sees either the
+previous job or the new one, never a half-written directory, and nothing is
+deleted on the generation path.
+
+gc() applies the retention policy (the newest KEEP_JOBS jobs, and nothing
+older than MAX_AGE_DAYS, never the current one). It runs in a background
+thread: doomed directories are first renamed to .trash-* (instant) and then
+removed. Staging directories abandoned by a crashed job are cleaned up by
+the same pass.
+
+On filesystems without symlinks, the current job is recorded in
+labels/CURRENT instead.
+"""
+import os
+import time
+import shutil
+import threading
+from typing import Callable, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LABELS_ROOT = os.path.join(BASE_DIR, "labels")
+JOBS_DIR = os.path.join(LABELS_ROOT, "jobs")
+CURRENT_LINK = os.path.join(LABELS_ROOT, "current")
+CURRENT_FILE = os.path.join(LABELS_ROOT, "CURRENT")
+
+KEEP_JOBS = 20
+MAX_AGE_DAYS = 14
+STALE_STAGING_SECONDS = 24 * 3600
+PARTIAL_SUFFIX = ".partial"
+TRASH_PREFIX = ".trash-"
+
+_gc_lock = threading.Lock()
+
+
+def _link(jobs_dir: str, current_link: Optional[str]) -> str:
+    # labels/jobs -> labels/current unless given
+    return current_link or os.path.join(os.path.dirname(os.path.abspath(jobs_dir)), "current")
+
+
+def staging_dir(job_id: str, jobs_dir: str = JOBS_DIR) -> str:
+    path = os.path.join(jobs_dir, f".{job_id}{PARTIAL_SUFFIX}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def job_dir(job_id: str, jobs_dir: str = JOBS_DIR) -> str:
+    return os.path.join(jobs_dir, job_id)
+
+
+def publish(job_id: str, make_current: bool = True, jobs_dir: str = JOBS_DIR,
+            current_link: Optional[str] = None) -> str:
+    """Move the job's staging directory into place; optionally point `current` at it."""
+    src = os.path.join(jobs_dir, f".{job_id}{PARTIAL_SUFFIX}")
+    dest = job_dir(job_id, jobs_dir)
+    os.replace(src, dest)
+    if make_current:
+        set_current(job_id, jobs_dir, current_link)
+    return dest
+
+
+def set_current(job_id: str, jobs_dir: str = JOBS_DIR, current_link: Optional[str] = None):
+    current_link = _link(jobs_dir, current_link)
+    target = os.path.relpath(job_dir(job_id, jobs_dir), os.path.dirname(current_link))
+    tmp = f"{current_link}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        os.symlink(target, tmp)
+        os.replace(tmp, current_link)
+    except (OSError, NotImplementedError):
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        pointer = os.path.join(os.path.dirname(current_link), os.path.basename(CURRENT_FILE))
+        with open(pointer + ".tmp", "w") as fh:
+            fh.write(job_id)
+        os.replace(pointer + ".tmp", pointer)
+
+
+def current_job(jobs_dir: str = JOBS_DIR, current_link: Optional[str] = None) -> Optional[str]:
+    current_link = _link(jobs_dir, current_link)
+    if os.path.islink(current_link):
+        return os.path.basename(os.readlink(current_link).rstrip("/\\"))
+    pointer = os.path.join(os.path.dirname(current_link), os.path.basename(CURRENT_FILE))
+    try:
+        with open(pointer) as fh:
+            return fh.read().strip() or None
+    except OSError:
+        return None
+
+
+def current_dir(jobs_dir: str = JOBS_DIR, current_link: Optional[str] = None) -> Optional[str]:
+    job_id = current_job(jobs_dir, current_link)
+    path = job_dir(job_id, jobs_dir) if job_id else None
+    return path if path and os.path.isdir(path) else None
+
+
+def list_jobs(jobs_dir: str = JOBS_DIR) -> List[str]:
+    """Published job ids, newest first."""
+    if not os.path.isdir(jobs_dir):
+        return []
+    entries = [e for e in os.scandir(jobs_dir) if e.is_dir(follow_symlinks=False) and not e.name.startswith(".")]
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    return [e.name for e in entries]
+
+
+def expired_jobs(keep: int = KEEP_JOBS, max_age_days: float = MAX_AGE_DAYS, jobs_dir: str = JOBS_DIR,
+                 current_link: Optional[str] = None, protect=()) -> List[str]:
+    keep_ids = set(protect)
+    cur = current_job(jobs_dir, current_link)
+    if cur:
+        keep_ids.add(cur)
+    cutoff = time.time() - max_age_days * 86400
+    doomed = []
+    for i, job_id in enumerate(list_jobs(jobs_dir)):
+        if job_id in keep_ids:
+            continue
+        if i >= keep or os.path.getmtime(job_dir(job_id, jobs_dir)) < cutoff:
+            doomed.append(job_id)
+    return doomed
+
+
+def gc(keep: int = KEEP_JOBS, max_age_days: float = MAX_AGE_DAYS, jobs_dir: str = JOBS_DIR,
+       current_link: Optional[str] = None, protect=(), on_removed: Optional[Callable[[str], None]] = None) -> List[str]:
+    """
+    Remove jobs outside the retention policy plus stale staging/trash dirs.
+    on_removed(job_dir) is called for each job before its files go (to drop
+    catalog rows). Returns the removed job ids.
+    """
+    if not os.path.isdir(jobs_dir):
+        return []
+    with _gc_lock:
+        removed = []
+        for job_id in expired_jobs(keep, max_age_days, jobs_dir, current_link, protect):
+            path = job_dir(job_id, jobs_dir)
+            if on_removed is not None:
+                on_removed(path)
+            trash = os.path.join(jobs_dir, f"{TRASH_PREFIX}{job_id}")
+            try:
+                os.replace(path, trash)
+            except OSError:
+                continue
+            removed.append(job_id)
+        now = time.time()
+        for entry in os.scandir(jobs_dir):
+            stale_partial = entry.name.endswith(PARTIAL_SUFFIX) and now - entry.stat().st_mtime > STALE_STAGING_SECONDS
+            if entry.name.startswith(TRASH_PREFIX) or stale_partial:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        return removed
+
+
+def gc_in_background(**kwargs) -> threading.Thread:
+    t = threading.Thread(target=gc, kwargs=kwargs, name="label-gc", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# job_runner.py
+"""
+Background jobs for long-running work (label generation) so it does not run
+inside a Streamlit button callback.
+
+The runner is owned by the server process, not by a session: get_job_runner()
+returns one shared instance, jobs keep their progress and results on the Job
+object, and pages only store job ids in session_state. Navigating away or
+rerunning does not stop a job, and several operators can queue jobs at once.
+
+A job function receives its Job as the first argument and should call
+job.set_progress(...) and check job.cancelled (or job.raise_if_cancelled())
+between units of work.
+"""
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+DEFAULT_WORKERS = 2
+KEEP_FINISHED_SECONDS = 6 * 3600
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, name: str, owner: Optional[str] = None, total: Optional[int] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.owner = owner
+        self.status = QUEUED
+        self.done = 0
+        self.total = total
+        self.message = ""
+        self.result = None
+        self.error = ""
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    # ---- called from the job function ----
+    def set_progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None):
+        with self._lock:
+            self.done = done
+            if total is not None:
+                self.total = total
+            if message is not None:
+                self.message = message
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def raise_if_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    # ---- read side ----
+    @property
+    def fraction(self) -> float:
+        if self.status == DONE:
+            return 1.0
+        if not self.total:
+            return 0.0
+        return min(1.0, self.done / self.total)
+
+    @property
+    def elapsed(self) -> float:
+        if not self.started_at:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id, "name": self.name, "owner": self.owner, "status": self.status,
+                "done": self.done, "total": self.total, "message": self.message,
+                "elapsed_s": round(self.elapsed, 2), "error": self.error.splitlines()[0] if self.error else "",
+            }
+
+
+class JobRunner:
+    def __init__(self, max_workers: int = DEFAULT_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, name: str = "job", owner: Optional[str] = None,
+               total: Optional[int] = None, **kwargs) -> Job:
+        """Queue fn(job, *args, **kwargs). Returns the Job immediately."""
+        job = Job(name, owner=owner, total=total)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn, args, kwargs):
+        if job.cancelled:
+            job.status, job.finished_at = CANCELLED, time.time()
+            return
+        job.status, job.started_at = RUNNING, time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = CANCELLED if job.cancelled else DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        job._cancel.set()
+        return True
+
+    def jobs(self, owner: Optional[str] = None) -> list:
+        """All known jobs, newest first (optionally only one owner's)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if owner is not None:
+            jobs = [j for j in jobs if j.owner == owner]
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+    def _prune(self):
+        cutoff = time.time() - KEEP_FINISHED_SECONDS
+        for jid in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[jid]
+
+    def shutdown(self, wait: bool = False):
+        for job in self.jobs():
+            job._cancel.set()
+        self._pool.shutdown(wait=wait)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner(max_workers: int = DEFAULT_WORKERS) -> JobRunner:
+    """The server-wide runner (modules are imported once per Streamlit server process)."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(max_workers=max_workers)
+        return _runner
@@ -13,11 +13,12 @@ import os
 import math
 import hashlib
 import uuid
-import re
 
 from file_handler import read_po_file                 # your existing parser
 from label_generator import create_label_image        # your label rendering function
 from calc_labels import clean_rows                    # optional reuse
+from product_fields import apply_product_fields
+from sku_index import index_for
 
 # --- Constants / folders ---
 FINAL_LABEL_DIR = "labels/final_labels"
@@ -35,37 +36,8 @@ def parse_product_fields(df: pd.DataFrame) -> pd.DataFrame:
         if col not in df.columns:
             df[col] = pd.NA
 
-    def extract(p):
-        p = str(p or "")
-        flavour = ""
-        strength = ""
-        m = re.search(r"\[(.*?)\]\s*$", p)
-        if m:
-            inside = m.group(1)
-            # remove bracketed part from product
-            p_clean = p[:m.start()].strip()
-            parts = re.split(r"[/\-\|;]", inside)
-            if len(parts) >= 1:
-                flavour = parts[0].strip()
-            if len(parts) >= 2:
-                strength = parts[1].strip()
-            return p_clean, flavour, strength
-        return p, "", ""
-    parsed = df.apply(lambda row: extract(row.get("Product","")), axis=1, result_type="expand")
-    parsed.columns = ["_prod_clean", "_flavour_ex", "_strength_ex"]
-    df["_prod_clean"] = parsed["_prod_clean"]
-    df["_flavour_ex"] = parsed["_flavour_ex"]
-    df["_strength_ex"] = parsed["_strength_ex"]
-
-    # Fill final columns using fallback order: bracketed extract -> explicit column -> existing
-    df["Product"] = df["_prod_clean"].where(df["_prod_clean"].notna() & (df["_prod_clean"] != ""), df["Product"])
-    df["Flavour"] = df["_flavour_ex"].where(df["_flavour_ex"].notna() & (df["_flavour_ex"] != ""),
-                                           df["Flavour"])
-    df["Strength"] = df["_strength_ex"].where(df["_strength_ex"].notna() & (df["_strength_ex"] != ""),
-                                             df["Strength"])
-    # Clean up temp columns
-    df = df.drop(columns=["_prod_clean","_flavour_ex","_strength_ex"])
-    return df
+    # vectorized over distinct products, bracketed values win over the explicit columns
+    return apply_product_fields(df, prefer="product")
 
 def to_numeric_safe(s):
     try:
@@ -179,6 +151,8 @@ if edited_hash != st.session_state.get("table_hash"):
 
 # stable view
 final_table = st.session_state["print_table"]
+# Sku -> canonical row, rebuilt only when table_hash changes (i.e. after an edit)
+sku_rows = index_for(final_table, st.session_state["table_hash"], st.session_state)
 st.markdown("**Final printable table:**")
 st.dataframe(final_table, use_container_width=True)
 
@@ -210,45 +184,46 @@ gen_df["Planned_Labels"] = pd.to_numeric(gen_df.get("Planned_Labels",0), errors=
 # Generate labels button
 if st.button("🎨 Generate & Preview Labels from table selection"):
     all_paths = []
+    copies = {}
     with st.spinner("Generating label images from selection..."):
         for ridx, r in gen_df.iterrows():
             # find original row data to pass other fields (SKU etc)
             sku = str(r.get("Sku",""))
             # get matching row from final_table to preserve original Product/Flavour/Strength/Case_Size/Outstanding
-            row_match = final_table[final_table["Sku"].astype(str)==sku]
-            if row_match.shape[0] >= 1:
-                row = row_match.iloc[0].to_dict()
-            else:
-                row = r.to_dict()
+            row = sku_rows.get(sku) or r.to_dict()
             n = int(r.get("Planned_Labels", 0) or 0)
-            for i in range(n):
-                try:
-                    # call external label generator (your module)
-                    path = create_label_image(row, idx=f"{sku}_{i}", label_cm=10.0, dpi=300)
-                    all_paths.append(path)
-                except Exception as e:
-                    st.error(f"Failed to create label for SKU={sku}: {e}")
+            if n <= 0:
+                continue
+            try:
+                # the copies of one row are identical: render once, print it n times
+                path = create_label_image(row, idx=f"{sku}_{ridx}", label_cm=10.0, dpi=300)
+                all_paths.append(path)
+                copies[path] = n
+            except Exception as e:
+                st.error(f"Failed to create label for SKU={sku}: {e}")
     if not all_paths:
         st.warning("No labels created.")
     else:
-        st.success(f"Created {len(all_paths)} label images.")
+        st.success(f"Created {len(all_paths)} label images ({sum(copies.values())} labels to print).")
         # Save into session_state and show previews
         st.session_state["generated_labels"] = all_paths
+        st.session_state["generated_copies"] = copies
         # Show first 12 previews
         preview = all_paths[:12]
         st.markdown("### Previews")
         cols = st.columns(min(4,len(preview)))
         for c,p in zip(cols, preview):
             try:
-                c.image(p, use_container_width=True, caption=os.path.basename(p))
+                c.image(p, use_container_width=True, caption=f"{os.path.basename(p)} x{copies[p]}")
             except Exception:
                 c.write(os.path.basename(p))
 
 # If generated labels exist show list and option to open externally
 if st.session_state.get("generated_labels"):
     st.markdown("### Generated labels (recent)")
+    gen_copies = st.session_state.get("generated_copies", {})
     for p in st.session_state["generated_labels"][:50]:
-        st.write(p)
+        st.write(f"{p}  (x{gen_copies.get(p, 1)})")
 
     if st.button("Open first generated label externally"):
         try:
@@ -265,7 +240,7 @@ if st.session_state.get("generated_labels"):
             st.error(f"Cannot open preview: {e}")
 
 st.write("----")
-st.write("After you confirm labels, use your printing UI (or the print_file helper) to send images to the label printer.")
+st.write("After you confirm labels, use your printing UI (or the print_file helper, with copies=) to send images to the label printer.")
 
 
 # In[ ]:
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# label_batch.py
+"""
+Render label images for a whole final-labels table.
+
+generate_label_images() is what the "Generate Label Images" button used to do
+inline; it can run as a background job (job_runner) and reports progress and
+per-label failures instead of writing to the Streamlit page. When given a
+label_catalog.LabelCatalog, every label written is recorded there under the
+job's id.
+
+By default each job writes into its own staging directory and publishes it
+with job_dirs.publish() when it finishes, so nobody previewing or printing
+the previous job sees files disappear or half-written output.
+
+Labels are streamed through render_pipeline, so rendering overlaps with PNG
+encoding and memory stays at a few labels whatever the job size. Each PO
+line is rendered once; its Final_Labels count is kept as the image's copies
+(catalog, lp -n) instead of writing N identical files.
+"""
+import os
+import uuid
+from typing import Optional
+
+import pandas as pd
+
+from label_catalog import record_for
+import job_dirs
+from render_pipeline import PngDirSink, count_labels, label_specs, run_pipeline
+
+
+def generate_label_images(
+    job,
+    final_df: pd.DataFrame,
+    out_dir: Optional[str] = None,
+    label_cm: float = 10.0,
+    dpi: int = 300,
+    catalog=None,
+    jobs_dir: str = job_dirs.JOBS_DIR,
+    extra_sinks=(),
+    profile: Optional[dict] = None,
+    template: Optional[str] = None,
+) -> dict:
+    """
+    Create Final_Labels images for every row of final_df.
+    job may be None (run inline) or a job_runner.Job for progress/cancellation.
+    out_dir=None writes a per-job directory under jobs_dir and publishes it
+    (a cancelled job is published but does not become current).
+    extra_sinks (render_pipeline sinks, e.g. a PdfSink) receive the same labels
+    in the same pass. profile (printer_profiles) renders at that printer's dots
+    instead of label_cm/dpi; template names the label layout (label_templates).
+    Returns {"paths": [...], "copies": [...], "labels", "failures": [...], "out_dir": ...,
+    "outputs": {...}}; paths (one per PO line) and copies are in table order.
+    """
+    job_id = job.id if job is not None else uuid.uuid4().hex[:12]
+    staged = out_dir is None
+    write_dir = job_dirs.staging_dir(job_id, jobs_dir) if staged else out_dir
+    total = count_labels(final_df)
+    if job is not None:
+        job.set_progress(0, total, "Generating label images...")
+
+    def progress(done, total):
+        if job is not None:
+            job.set_progress(done, total, f"{done}/{total} labels")
+
+    if profile:
+        dpi = profile["dpi"]
+    png = PngDirSink(write_dir, dpi=dpi)
+    res = run_pipeline(
+        label_specs(final_df, label_cm=label_cm, dpi=dpi, profile=profile, template=template), [png, *extra_sinks], total=total,
+        progress=progress, cancelled=(lambda: job.cancelled) if job is not None else None,
+    )
+    cancelled = res["cancelled"]
+    paths = [p for _, p in png.written]
+    copies = [spec["copies"] for spec, _ in png.written]
+    records = []
+    if catalog is not None:
+        records = [record_for(spec["row"], p, job=job_id, label_no=spec["label_no"], copies=spec["copies"])
+                   for spec, p in png.written]
+
+    if staged:
+        final_dir = job_dirs.publish(job_id, make_current=not cancelled, jobs_dir=jobs_dir)
+        paths = [os.path.join(final_dir, os.path.basename(p)) for p in paths]
+        for rec, p in zip(records, paths):
+            rec["path"] = p
+        write_dir = final_dir
+    if catalog is not None:
+        catalog.add_labels(records)
+    if staged:
+        job_dirs.gc_in_background(jobs_dir=jobs_dir, protect={job_id},
+                                  on_removed=catalog.remove_dir if catalog is not None else None)
+    return {"paths": paths, "copies": copies, "labels": res["labels"], "failures": res["failures"],
+            "out_dir": write_dir, "outputs": res["outputs"]}
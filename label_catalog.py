@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# label_catalog.py
+"""
+SQLite catalog of generated label images, so the print manager does not
+rescan labels/final_labels and filter filenames in Python on every rerun.
+
+One row per label image: sku, product, flavour, strength, job, label_no,
+copies, path, content hash, status and created_at. A generation job writes
+one image per PO line and records how many copies it stands for, so
+printing it is one `lp -n <copies>` call. Search uses an FTS5 index over
+sku/product/flavour when SQLite has it (it does in the standard Python
+builds) and falls back to LIKE otherwise. Status and job filters use plain
+indexes. Pages come from LIMIT/OFFSET queries, so a rerun touches one page
+of rows instead of every file.
+
+Statuses live in the catalog too (Ready / Printed / Dialog shown / Failed /
+Missing), so they are shared across sessions and survive restarts.
+"""
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from instrumentation import timed
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CATALOG_DB = os.path.join(BASE_DIR, "db", "label_catalog.db")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+STATUSES = ("Ready", "Printed", "Dialog shown", "Failed", "Missing")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS label_catalog (
+    id           INTEGER PRIMARY KEY,
+    path         TEXT NOT NULL UNIQUE,
+    sku          TEXT NOT NULL DEFAULT '',
+    product      TEXT NOT NULL DEFAULT '',
+    flavour      TEXT NOT NULL DEFAULT '',
+    strength     TEXT NOT NULL DEFAULT '',
+    job          TEXT NOT NULL DEFAULT '',
+    label_no     INTEGER,
+    copies       INTEGER NOT NULL DEFAULT 1,
+    content_hash TEXT,
+    status       TEXT NOT NULL DEFAULT 'Ready',
+    created_at   TEXT NOT NULL,
+    updated_at   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_label_catalog_status ON label_catalog(status, id);
+CREATE INDEX IF NOT EXISTS idx_label_catalog_job ON label_catalog(job, status, id);
+CREATE INDEX IF NOT EXISTS idx_label_catalog_sku ON label_catalog(sku COLLATE NOCASE);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS label_catalog_fts USING fts5(
+    sku, product, flavour, strength, name,
+    content='', tokenize="unicode61 tokenchars '-_.'", prefix='1 2 3'
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def file_hash(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as fh:
+            return hashlib.sha1(fh.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def display_name(rec: dict) -> str:
+    parts = [p for p in (rec.get("sku"), rec.get("product"), rec.get("flavour")) if p]
+    name = " · ".join(parts) or os.path.basename(rec.get("path", ""))
+    if int(rec.get("copies") or 1) > 1:
+        name += f"  ×{int(rec['copies'])}"
+    elif rec.get("label_no") is not None:
+        name += f"  #{int(rec['label_no']) + 1}"
+    return name
+
+
+def record_for(row, path: str, job: str = "", label_no: Optional[int] = None, copies: int = 1) -> dict:
+    """Catalog record for one rendered label of a final-labels table row."""
+    from label_generator import extract_from_product_field
+
+    def val(key):
+        v = row.get(key, "") if hasattr(row, "get") else ""
+        return "" if v is None or (isinstance(v, float) and v != v) else str(v).strip()
+
+    product, ext_flavour, ext_strength = extract_from_product_field(val("Product"))
+    return {
+        "path": path,
+        "sku": val("Sku"),
+        "product": product,
+        "flavour": val("Flavour") or ext_flavour or "",
+        "strength": val("Strength") or ext_strength or "",
+        "job": job,
+        "label_no": label_no,
+        "copies": int(copies),
+        "content_hash": file_hash(path),
+    }
+
+
+def _fts_query(text: str) -> str:
+    """User text -> FTS5 query: every word must match as a prefix."""
+    words = re.findall(r"[\w\-.]+", text.lower())
+    return " AND ".join('"' + w.replace('"', '""') + '"*' for w in words)
+
+
+class LabelCatalog:
+    def __init__(self, db_path: str = CATALOG_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(label_catalog)")}
+        if "copies" not in columns:  # catalogs created before copies were tracked
+            conn.execute("ALTER TABLE label_catalog ADD COLUMN copies INTEGER NOT NULL DEFAULT 1")
+        try:
+            conn.executescript(_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:  # SQLite built without FTS5
+            self.has_fts = False
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread (Streamlit runs each session in its own thread)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    @timed("catalog.add")
+    def add_labels(self, records: Iterable[dict]) -> int:
+        """Insert or replace records keyed by path. Returns the number written."""
+        records = list(records)
+        if not records:
+            return 0
+        now = _now()
+        conn = self._conn()
+        with self._write_lock, conn:
+            for rec in records:
+                if self.has_fts:
+                    self._fts_delete(conn, rec["path"])
+                cur = conn.execute(
+                    """INSERT INTO label_catalog
+                           (path, sku, product, flavour, strength, job, label_no, copies, content_hash, status,
+                            created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(path) DO UPDATE SET
+                           sku=excluded.sku, product=excluded.product, flavour=excluded.flavour,
+                           strength=excluded.strength, job=excluded.job, label_no=excluded.label_no,
+                           copies=excluded.copies, content_hash=excluded.content_hash, status=excluded.status,
+                           created_at=excluded.created_at, updated_at=NULL
+                       RETURNING id""",
+                    (rec["path"], rec.get("sku", ""), rec.get("product", ""), rec.get("flavour", ""),
+                     rec.get("strength", ""), rec.get("job", ""), rec.get("label_no"), int(rec.get("copies") or 1),
+                     rec.get("content_hash"), rec.get("status", "Ready"), rec.get("created_at", now)),
+                )
+                row_id = cur.fetchone()[0]
+                if self.has_fts:
+                    conn.execute(
+                        "INSERT INTO label_catalog_fts(rowid, sku, product, flavour, strength, name) VALUES (?, ?, ?, ?, ?, ?)",
+                        (row_id, rec.get("sku", ""), rec.get("product", ""), rec.get("flavour", ""),
+                         rec.get("strength", ""), os.path.basename(rec["path"])),
+                    )
+        return len(records)
+
+    def _fts_delete(self, conn, path: str):
+        # contentless FTS tables need the old values to delete a row
+        old = conn.execute(
+            "SELECT id, sku, product, flavour, strength, path FROM label_catalog WHERE path = ?", (path,)
+        ).fetchone()
+        if old is not None:
+            conn.execute(
+                "INSERT INTO label_catalog_fts(label_catalog_fts, rowid, sku, product, flavour, strength, name) "
+                "VALUES ('delete', ?, ?, ?, ?, ?, ?)",
+                (old["id"], old["sku"], old["product"], old["flavour"], old["strength"], os.path.basename(old["path"])),
+            )
+
+    def set_status(self, paths: Iterable[str], status: str):
+        paths = list(paths)
+        if not paths:
+            return
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.executemany(
+                "UPDATE label_catalog SET status = ?, updated_at = ? WHERE path = ?",
+                [(status, _now(), p) for p in paths],
+            )
+
+    def remove(self, paths: Iterable[str]):
+        conn = self._conn()
+        with self._write_lock, conn:
+            for p in paths:
+                if self.has_fts:
+                    self._fts_delete(conn, p)
+                conn.execute("DELETE FROM label_catalog WHERE path = ?", (p,))
+
+    def remove_dir(self, directory: str):
+        """Forget every label under directory (it was wiped)."""
+        prefix = os.path.join(directory, "")
+        self.remove([r[0] for r in self._conn().execute(
+            "SELECT path FROM label_catalog WHERE path LIKE ?", (prefix + "%",))])
+
+    @timed("catalog.import_dir")
+    def import_dir(self, directory: str, job: str = "") -> int:
+        """
+        Catalog image files in `directory` that are not known yet (labels made
+        before the catalog existed, or by the CLI). Filenames carry no product
+        data, so those rows are searchable by filename only.
+        """
+        if not os.path.isdir(directory):
+            return 0
+        known = {r[0] for r in self._conn().execute("SELECT path FROM label_catalog WHERE path LIKE ?",
+                                                     (os.path.join(directory, "") + "%",))}
+        new = []
+        for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.path not in known:
+                created = datetime.fromtimestamp(entry.stat().st_mtime).isoformat(timespec="seconds")
+                new.append({"path": entry.path, "job": job or "imported", "created_at": created,
+                            "content_hash": file_hash(entry.path)})
+        return self.add_labels(new)
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def _where(self, q: str = "", status: Optional[str] = None, job: Optional[str] = None) -> Tuple[str, list]:
+        clauses, params = [], []
+        q = (q or "").strip()
+        if q:
+            if self.has_fts and _fts_query(q):
+                clauses.append("c.id IN (SELECT rowid FROM label_catalog_fts WHERE label_catalog_fts MATCH ?)")
+                params.append(_fts_query(q))
+            else:
+                like = f"%{q.lower()}%"
+                clauses.append("(lower(c.sku) LIKE ? OR lower(c.product) LIKE ? OR lower(c.flavour) LIKE ? "
+                               "OR lower(c.path) LIKE ?)")
+                params += [like] * 4
+        if status:
+            clauses.append("c.status = ?")
+            params.append(status)
+        if job:
+            clauses.append("c.job = ?")
+            params.append(job)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    @timed("catalog.query")
+    def query(self, q: str = "", status: Optional[str] = None, job: Optional[str] = None,
+              limit: int = 10, offset: int = 0) -> List[dict]:
+        """One page of labels in generation order."""
+        where, params = self._where(q, status, job)
+        rows = self._conn().execute(
+            f"SELECT c.* FROM label_catalog c{where} ORDER BY c.id LIMIT ? OFFSET ?",
+            params + [int(limit), int(offset)],
+        ).fetchall()
+        out = []
+        for r in rows:
+            rec = dict(r)
+            rec["name"] = display_name(rec)
+            out.append(rec)
+        return out
+
+    def count(self, q: str = "", status: Optional[str] = None, job: Optional[str] = None) -> int:
+        where, params = self._where(q, status, job)
+        return self._conn().execute(f"SELECT COUNT(*) FROM label_catalog c{where}", params).fetchone()[0]
+
+    def copies_for(self, paths: Iterable[str]) -> dict:
+        """path -> copies for the given paths (1 for paths not in the catalog)."""
+        paths = list(paths)
+        out = dict.fromkeys(paths, 1)
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            rows = self._conn().execute(
+                f"SELECT path, copies FROM label_catalog WHERE path IN ({','.join('?' * len(chunk))})", chunk)
+            out.update({r[0]: int(r[1] or 1) for r in rows})
+        return out
+
+    def paths(self, job: Optional[str] = None) -> List[str]:
+        where, params = self._where(job=job)
+        return [r[0] for r in self._conn().execute(f"SELECT c.path FROM label_catalog c{where} ORDER BY c.id", params)]
+
+    def jobs(self, limit: int = 20) -> List[dict]:
+        """Most recent jobs with their label counts."""
+        rows = self._conn().execute(
+            """SELECT job, SUM(copies) AS labels, COUNT(*) AS files, MIN(created_at) AS created_at
+               FROM label_catalog GROUP BY job ORDER BY MAX(id) DESC LIMIT ?""",
+            (limit,),
+        ).fetchall()
+        return [dict(r) for r in rows]
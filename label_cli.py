@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# label_cli.py
+"""
+Headless label pipeline: PO file -> final labels -> label images -> PNG/PDF/ZPL -> printer.
+
+    python -m label_cli "data/po_uploads/Stock Control Portal _ Vape Supplier.pdf" \\
+        --case-size 60 --format pdf --jobs 4 --printer Zebra_GK420d
+
+    python -m label_cli po.csv --profile zebra-203-60mm --format zpl --printer
+
+--profile renders at a printer profile's own dots (printer_profiles) instead
+of --label-cm/--dpi; a bare --printer then uses the profile's queue.
+
+--format sheets imposes the labels N-up onto A4/Letter stock (imposition):
+
+    python -m label_cli po.csv --format sheets --sheet a4 --grid 4x6 --printer
+
+Prints per-stage timings. Exit codes:
+    0  success
+    2  bad arguments
+    3  PO file missing or unreadable
+    4  no labels to produce (no Final_Labels > 0)
+    5  some labels failed to render (the rest were written)
+    6  printing failed
+"""
+import os
+import sys
+import time
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+
+EXIT_OK = 0
+EXIT_USAGE = 2
+EXIT_READ = 3
+EXIT_NO_LABELS = 4
+EXIT_RENDER = 5
+EXIT_PRINT = 6
+
+DEFAULT_OUT_DIR = os.path.join("labels", "cli")
+
+
+class StageTimer:
+    def __init__(self, quiet: bool = False):
+        self.stages = []
+        self.quiet = quiet
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages.append((name, elapsed))
+            if not self.quiet:
+                print(f"[{name:<8}] {elapsed * 1000:9.1f} ms", file=sys.stderr)
+
+    def summary(self) -> str:
+        total = sum(s for _, s in self.stages)
+        lines = [f"  {n:<8} {s * 1000:9.1f} ms  {100 * s / total if total else 0:5.1f}%" for n, s in self.stages]
+        return "\n".join(lines + [f"  {'total':<8} {total * 1000:9.1f} ms"])
+
+
+def prepare_table(df: pd.DataFrame, default_case_size: int) -> pd.DataFrame:
+    """Normalize PO columns, fill Case_Size and compute Final_Labels."""
+    from calc_labels import apply_default_case_size, clean_rows
+    from calculation import calculate_final_labels
+    from pdf_converter import standardize_columns
+
+    if not {"Sku", "Product"} <= set(df.columns):
+        df = standardize_columns(df)
+    df = clean_rows(df)
+    df = apply_default_case_size(df, default_case_size)
+    df = calculate_final_labels(df)
+    if "Final_Labels" not in df.columns:
+        df["Final_Labels"] = 0
+    df["Final_Labels"] = pd.to_numeric(df["Final_Labels"], errors="coerce").fillna(0).astype(int)
+    return df
+
+
+def render_labels(df: pd.DataFrame, out_dir: str, label_cm: float, dpi: int, jobs: int,
+                  fmt: str = "png", stem: str = "labels", profile: Optional[dict] = None,
+                  sheet: Optional[dict] = None, template: Optional[str] = None):
+    """
+    Render one image per row into out_dir, encoding the PDF/ZPL/sheets in the
+    same streaming pass; Final_Labels become copies (PDF page reuse, ZPL ^PQ,
+    repeated cells on sheets, lp -n for PNG). Returns (paths in table order,
+    copies per path, errors, outputs).
+    """
+    from render_pipeline import MAX_IN_FLIGHT, PdfSink, PngDirSink, ZplSink, label_specs, run_pipeline
+
+    if profile:
+        dpi = profile["dpi"]
+    png = PngDirSink(out_dir, dpi=dpi)
+    sinks = [png]
+    if fmt == "pdf":
+        sinks.append(PdfSink(os.path.join(out_dir, f"{stem}.pdf"), dpi=dpi))
+    elif fmt == "zpl":
+        sinks.append(ZplSink(os.path.join(out_dir, f"{stem}.zpl"), darkness=(profile or {}).get("darkness")))
+    elif fmt == "sheets":
+        from imposition import SheetSink
+
+        sinks.append(SheetSink(os.path.join(out_dir, f"{stem}_sheets.pdf"), sheet))
+    res = run_pipeline(label_specs(df, label_cm=label_cm, dpi=dpi, profile=profile, template=template), sinks, workers=jobs, processes=jobs > 1,
+                       max_in_flight=max(MAX_IN_FLIGHT, 2 * jobs))
+    paths = [p for _, p in png.written]
+    copies = [spec["copies"] for spec, _ in png.written]
+    outputs = paths if fmt == "png" else [o for o in [res["outputs"].get(fmt)] if o]
+    return paths, copies, res["failures"], outputs
+
+
+def process_po(
+    po_path: str,
+    out_root: str = DEFAULT_OUT_DIR,
+    case_size: int = 60,
+    fmt: str = "png",
+    jobs: int = 1,
+    printer: Optional[str] = None,
+    label_cm: float = 10.0,
+    dpi: int = 300,
+    timer: Optional[StageTimer] = None,
+    log=None,
+    profile: Optional[dict] = None,
+    sheet: Optional[dict] = None,
+    template: Optional[str] = None,
+) -> dict:
+    """
+    Run the whole pipeline for one PO file. printer=None skips printing,
+    "" prints to the default queue (the profile's queue when it names one).
+    sheet is the imposition layout for fmt="sheets"; template names the label
+    layout (label_templates). Never raises for pipeline errors; returns
+    {"exit_code", "error", "rows", "labels", "out_dir", "paths", "copies",
+    "outputs", "render_errors", "stages"}; paths holds one image per PO line and
+    copies how many labels each stands for.
+    """
+    from file_handler import read_po_path
+    from label_output import print_file
+
+    timer = timer or StageTimer(quiet=True)
+    log = log or (lambda msg: print(msg, file=sys.stderr))
+    result = {"exit_code": EXIT_OK, "error": "", "rows": 0, "labels": 0, "out_dir": "",
+              "paths": [], "copies": [], "outputs": [], "render_errors": [], "stages": timer.stages}
+
+    def fail(code, msg):
+        result["exit_code"], result["error"] = code, msg
+        return result
+
+    if not os.path.isfile(po_path):
+        return fail(EXIT_READ, f"PO file not found: {po_path}")
+
+    with timer.stage("read"):
+        try:
+            df, _ = read_po_path(po_path)
+        except Exception as e:
+            return fail(EXIT_READ, f"could not read {po_path}: {e}")
+    if df is None or df.empty:
+        return fail(EXIT_READ, f"no rows parsed from {po_path}")
+
+    with timer.stage("calc"):
+        table = prepare_table(df, case_size)
+    result["rows"] = len(table)
+    result["labels"] = n_labels = int(table["Final_Labels"].sum())
+    log(f"{len(table)} PO rows -> {n_labels} labels")
+    if n_labels == 0:
+        return fail(EXIT_NO_LABELS, "no labels to produce (check Outstanding and Case_Size)")
+
+    stem = os.path.splitext(os.path.basename(po_path))[0]
+    out_dir = os.path.join(out_root, f"{stem}_{datetime.now():%Y%m%d_%H%M%S}")
+    os.makedirs(out_dir, exist_ok=True)
+    result["out_dir"] = out_dir
+
+    with timer.stage("render"):
+        paths, copies, errors, outputs = render_labels(table, out_dir, label_cm, dpi, jobs, fmt=fmt, stem=stem,
+                                                       profile=profile, sheet=sheet, template=template)
+    result["paths"], result["copies"], result["render_errors"] = paths, copies, errors
+    for e in errors:
+        log(f"render failed: {e}")
+    if not paths:
+        return fail(EXIT_RENDER, "no label rendered")
+    result["outputs"] = outputs
+
+    if printer is not None:
+        printer = printer or (profile or {}).get("printer") or ""
+        with timer.stage("print"):
+            try:
+                # PDF/ZPL carry their copies inside; PNGs go out as one lp -n job each
+                png_copies = dict(zip(paths, copies)) if fmt == "png" else {}
+                for out in outputs:
+                    print_file(out, printer=printer or None, copies=png_copies.get(out, 1), raw=fmt == "zpl")
+            except Exception as e:
+                msg = getattr(e, "stderr", "") or str(e)
+                return fail(EXIT_PRINT, f"printing failed: {msg}")
+
+    if errors:
+        return fail(EXIT_RENDER, f"{len(errors)} of {n_labels} labels failed to render")
+    return result
+
+
+def run(args) -> int:
+    from imposition import parse_grid, sheet_layout
+    from label_templates import get_template
+    from printer_profiles import get_profile
+
+    if args.template:
+        try:
+            get_template(args.template)
+        except (KeyError, ValueError) as e:
+            print(f"error: {e.args[0]}", file=sys.stderr)
+            return EXIT_USAGE
+    sheet = None
+    if args.format == "sheets":
+        try:
+            rows, cols = parse_grid(args.grid)
+            sheet = sheet_layout(args.sheet, rows=rows, cols=cols, margins_mm=args.sheet_margin,
+                                 gutter_mm=args.gutter, crop_marks=not args.no_crop_marks)
+        except ValueError as e:
+            print(f"error: bad sheet layout: {e}", file=sys.stderr)
+            return EXIT_USAGE
+    profile = None
+    if args.profile:
+        try:
+            profile = get_profile(args.profile)
+        except KeyError as e:
+            print(f"error: {e.args[0]}", file=sys.stderr)
+            return EXIT_USAGE
+        if ("pdf" if args.format == "sheets" else args.format) not in profile["formats"]:
+            print(f"error: profile {profile['name']} does not take {args.format} "
+                  f"(supports {', '.join(profile['formats'])})", file=sys.stderr)
+            return EXIT_USAGE
+    timer = StageTimer(quiet=args.quiet)
+    res = process_po(
+        args.po, out_root=args.out, case_size=args.case_size, fmt=args.format, jobs=args.jobs,
+        printer=args.printer, label_cm=args.label_cm, dpi=args.dpi, timer=timer, profile=profile,
+        sheet=sheet, template=args.template,
+    )
+    if res["error"]:
+        print(f"error: {res['error']}", file=sys.stderr)
+    if res["paths"]:
+        print(f"\nWrote {sum(res['copies'])} labels ({len(res['paths'])} images) to {res['out_dir']}", file=sys.stderr)
+        if sheet:
+            from imposition import sheets_needed
+
+            print(f"Sheets: {sheets_needed(sum(res['copies']), sheet)}", file=sys.stderr)
+        if args.format != "png" and res["outputs"]:
+            print(f"Output: {res['outputs'][0]}", file=sys.stderr)
+    if timer.stages:
+        print("Stage timings:\n" + timer.summary(), file=sys.stderr)
+    return res["exit_code"]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="python -m label_cli", description="Run the PO -> labels pipeline without the UI.")
+    ap.add_argument("po", help="PO file (.csv, .xlsx or .pdf)")
+    ap.add_argument("--case-size", type=int, default=60, help="default Case_Size where the PO has none (default 60)")
+    ap.add_argument("--format", choices=["png", "pdf", "zpl", "sheets"], default="png",
+                    help="output format (default png); sheets = N-up PDF for sheet label stock")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="render processes (default: CPU count)")
+    ap.add_argument("--printer", nargs="?", const="", default=None,
+                    help="send output to this CUPS printer (no name = default printer)")
+    ap.add_argument("--out", default=DEFAULT_OUT_DIR, help=f"output root (default {DEFAULT_OUT_DIR})")
+    ap.add_argument("--label-cm", type=float, default=10.0)
+    ap.add_argument("--dpi", type=int, default=300)
+    ap.add_argument("--profile", help="printer profile to render for (overrides --label-cm/--dpi)")
+    ap.add_argument("--template", help="label template (label_templates; default: the built-in layout)")
+    ap.add_argument("--sheet", choices=["a4", "letter"], default="a4", help="sheet size for --format sheets")
+    ap.add_argument("--grid", default="4x6", help="labels per sheet as COLSxROWS (default 4x6)")
+    ap.add_argument("--sheet-margin", type=float, default=8.0, help="sheet margin in mm (default 8)")
+    ap.add_argument("--gutter", type=float, default=3.0, help="gap between labels in mm (default 3)")
+    ap.add_argument("--no-crop-marks", action="store_true", help="omit crop marks on sheets")
+    ap.add_argument("--quiet", "-q", action="store_true", help="no per-stage lines while running")
+    return ap
+
+
+def main(argv=None) -> int:
+    ap = build_parser()
+    try:
+        args = ap.parse_args(argv)
+    except SystemExit as e:
+        return EXIT_OK if e.code == 0 else EXIT_USAGE
+    if args.case_size < 1 or args.jobs < 1:
+        print("error: --case-size and --jobs must be >= 1", file=sys.stderr)
+        return EXIT_USAGE
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,44 +6,59 @@
 
 # label_generator.py
 """
-Label generator: flavour uses a single consistent bold font size across labels.
+Label generator: renders labels from templates (label_templates) and saves them.
 """
+import io
 import os
-import re
 import uuid
-import textwrap
+import logging
 from typing import Optional, Tuple
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageFont
 
-# Prefer treepoem (vector) then python-barcode (raster).
-_barcode_backend = None
-try:
-    import treepoem  # type: ignore
-    _barcode_backend = "treepoem"
-except Exception:
-    try:
-        from barcode import Code128  # type: ignore
-        from barcode.writer import ImageWriter  # type: ignore
-        _barcode_backend = "pybarcode"
-    except Exception:
-        _barcode_backend = None
+from instrumentation import timed, timer
+from product_fields import parse_product
 
 FINAL_LABEL_DIR = "labels/final_labels"
-os.makedirs(FINAL_LABEL_DIR, exist_ok=True)
+
+log = logging.getLogger(__name__)
+
+# Prefer BWIPP from persistent Ghostscript workers (bwipp_pool, once it has checked
+# itself against treepoem), then treepoem (one Ghostscript run per barcode), then
+# python-barcode. Probed on first barcode, not at import: importing treepoem looks
+# for Ghostscript, which is slow.
+_UNPROBED = object()
+_barcode_backend = _UNPROBED
+
+# python-barcode names for the symbologies it has (no 2D codes)
+PYBARCODE_SYMBOLOGIES = {"code128": "code128", "gs1-128": "gs1_128", "ean13": "ean13", "ean8": "ean8",
+                         "code39": "code39", "upca": "upca", "itf": "itf"}
+
+
+def _get_barcode_backend() -> Optional[str]:
+    global _barcode_backend
+    if _barcode_backend is _UNPROBED:
+        import bwipp_pool
+        if bwipp_pool.available():
+            _barcode_backend = "bwipp"
+        else:
+            try:
+                import treepoem  # type: ignore  # noqa: F401
+                _barcode_backend = "treepoem"
+            except Exception:
+                try:
+                    from barcode import Code128  # type: ignore  # noqa: F401
+                    from barcode.writer import ImageWriter  # type: ignore  # noqa: F401
+                    _barcode_backend = "pybarcode"
+                except Exception:
+                    _barcode_backend = None
+    return _barcode_backend
 
 
 def extract_from_product_field(product: str) -> Tuple[str, Optional[str], Optional[str]]:
-    p = str(product or "").strip()
-    m = re.search(r"\[(.*?)\]\s*$", p)
-    if not m:
-        return p, None, None
-    inside = m.group(1)
-    parts = [s.strip() for s in re.split(r"[/\|\-;]", inside) if s.strip()]
-    flavour = parts[0] if len(parts) >= 1 else None
-    strength = parts[1] if len(parts) >= 2 else None
-    cleaned = p[:m.start()].strip()
-    return cleaned, flavour, strength
+    # memoized; see product_fields for the parsing rules
+    cleaned, flavour, strength = parse_product(product)
+    return cleaned, flavour or None, strength or None
 
 
 def _load_ttf_candidate(size: int) -> ImageFont.FreeTypeFont:
@@ -79,45 +94,121 @@ def _load_bold_ttf(size: int) -> ImageFont.FreeTypeFont:
     return _load_ttf_candidate(size)
 
 
-def _font_text_width(font: ImageFont.FreeTypeFont, text: str) -> int:
-    try:
-        bbox = font.getbbox(text)
-        return bbox[2] - bbox[0]
-    except Exception:
-        if hasattr(font, "getlength"):
-            try:
-                return int(font.getlength(text))
-            except Exception:
-                pass
-        return max(6, int(getattr(font, "size", 10) * len(text) * 0.5))
+def _scale_to_dots(bars: Image.Image, target_w: int, target_h: int) -> Image.Image:
+    """
+    Whole-dot modules: integer horizontal factor, nearest neighbour (no grey edges).
+    A code with more modules than the zone has dots cannot get one dot per
+    module; it is squeezed to the zone width instead (it may not scan).
+    """
+    factor = target_w // bars.width
+    if factor < 1:
+        return bars.resize((target_w, target_h), Image.Resampling.LANCZOS).convert("RGB")
+    return bars.resize((bars.width * factor, target_h), Image.Resampling.NEAREST).convert("RGB")
+
+
+def _scale_modules(modules: Image.Image, target_w: int, target_h: int) -> Image.Image:
+    """Linear codes (1 row) get full-height bars; matrix codes a whole-dot square grid."""
+    if modules.height == 1:
+        return _scale_to_dots(modules, target_w, target_h)
+    factor = min(target_w // modules.width, target_h // modules.height)
+    if factor < 1:
+        # same rule as _scale_to_dots: fit the zone rather than overflow it
+        scale = min(target_w / modules.width, target_h / modules.height)
+        size = (max(1, int(modules.width * scale)), max(1, int(modules.height * scale)))
+        return modules.resize(size, Image.Resampling.LANCZOS).convert("RGB")
+    return modules.resize((modules.width * factor, modules.height * factor), Image.Resampling.NEAREST).convert("RGB")
 
 
-def _render_barcode_image(code_value: str, target_w: int, target_h: int) -> Optional[Image.Image]:
-    if _barcode_backend == "treepoem":
+def _pybarcode_class(symbology: str):
+    from barcode import get_barcode_class  # type: ignore
+
+    return get_barcode_class(PYBARCODE_SYMBOLOGIES[symbology])
+
+
+def _pybarcode_value(code_value: str, symbology: str) -> str:
+    # BWIPP takes GS1 data as "(01)0950..."; python-barcode wants the bare AIs
+    value = str(code_value or " ")
+    return value.replace("(", "").replace(")", "") if symbology == "gs1-128" else value
+
+
+def _pybarcode_modules(code_value: str, symbology: str) -> Image.Image:
+    pattern = _pybarcode_class(symbology)(_pybarcode_value(code_value, symbology)).build()[0]
+    row = bytes(0 if m == "1" else 255 for m in pattern)
+    return Image.frombytes("L", (len(row), 1), row)
+
+
+def _treepoem_image(code_value: str, target_w: int, target_h: int, native: bool,
+                    symbology: str) -> Image.Image:
+    import treepoem  # type: ignore
+
+    if not native:
+        img = treepoem.generate_barcode(barcode_type=symbology, data=str(code_value or " ")).convert("RGB")
+        scale = min(target_w / img.width, target_h / img.height)
+        return img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.Resampling.LANCZOS)
+    img = treepoem.generate_barcode(barcode_type=symbology, data=str(code_value or " "), scale=1).convert("L")
+    rows = {img.tobytes()[y * img.width:(y + 1) * img.width] for y in range(img.height)}
+    if len(rows) == 1:
+        # a linear code: every scanline is the same, keep one
+        return _scale_to_dots(img.crop((0, 0, img.width, 1)), target_w, target_h)
+    return _scale_modules(img, target_w, target_h)
+
+
+def _native_barcode_image(code_value: str, target_w: int, target_h: int,
+                          symbology: str = "code128") -> Optional[Image.Image]:
+    # one pixel per module, then scaled by a whole number of printer dots
+    backend = _get_barcode_backend()
+    if backend == "bwipp":
         try:
-            img = treepoem.generate_barcode(barcode_type="code128", data=str(code_value or " "))
-            img = img.convert("RGB")
-            bw, bh = img.size
-            scale = min(target_w / bw, target_h / bh)
-            new_w = max(1, int(bw * scale))
-            new_h = max(1, int(bh * scale))
-            return img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+            from bwipp_pool import get_pool
+            return _scale_modules(get_pool().modules(symbology, str(code_value or " ")), target_w, target_h)
+        except Exception as e:
+            # a timeout, a dead worker or data BWIPP rejects: try treepoem on its own, then
+            # python-barcode for the linear codes; the stage count shows how often this happens
+            log.warning("BWIPP failed for %s %r: %s", symbology, code_value, e)
+            with timer("barcode.fallback"):
+                try:
+                    return _treepoem_image(code_value, target_w, target_h, True, symbology)
+                except Exception:
+                    pass
+                if symbology not in PYBARCODE_SYMBOLOGIES:
+                    return None
+                try:
+                    return _scale_to_dots(_pybarcode_modules(code_value, symbology), target_w, target_h)
+                except Exception:
+                    return None
+    if backend == "treepoem":
+        try:
+            return _treepoem_image(code_value, target_w, target_h, True, symbology)
+        except Exception:
+            return None
+    if backend == "pybarcode":
+        try:
+            return _scale_to_dots(_pybarcode_modules(code_value, symbology), target_w, target_h)
         except Exception:
             return None
+    return None
+
 
-    if _barcode_backend == "pybarcode":
+def _render_barcode_image(code_value: str, target_w: int, target_h: int, native: bool = False,
+                          symbology: str = "code128") -> Optional[Image.Image]:
+    backend = _get_barcode_backend()
+    if native or backend == "bwipp":
+        # the pool always yields modules, so it is scaled by whole pixels either way
+        return _native_barcode_image(code_value, target_w, target_h, symbology)
+    if backend == "treepoem":
+        try:
+            return _treepoem_image(code_value, target_w, target_h, False, symbology)
+        except Exception:
+            return None
+
+    if backend == "pybarcode":
         try:
-            from barcode import Code128  # type: ignore
             from barcode.writer import ImageWriter  # type: ignore
-            temp_path = os.path.join(FINAL_LABEL_DIR, f"tmp_bar_{uuid.uuid4().hex[:6]}.png")
-            code = Code128(str(code_value or " "), writer=ImageWriter())
-            with open(temp_path, "wb") as fh:
-                code.write(fh, options={"module_width": 0.2, "module_height": 12.0, "font_size": 0})
-            img = Image.open(temp_path).convert("RGB")
-            try:
-                os.remove(temp_path)
-            except Exception:
-                pass
+            code = _pybarcode_class(symbology)(_pybarcode_value(code_value, symbology), writer=ImageWriter())
+            buf = io.BytesIO()
+            code.write(buf, options={"module_width": 0.2, "module_height": 12.0, "font_size": 0})
+            buf.seek(0)
+            img = Image.open(buf).convert("RGB")
             bw, bh = img.size
             scale = min(target_w / bw, target_h / bh)
             new_w = max(1, int(bw * scale))
@@ -128,166 +219,43 @@ def _render_barcode_image(code_value: str, target_w: int, target_h: int) -> Opti
     return None
 
 
-def create_label_image(
-    row,
-    idx: Optional[str] = None,
-    label_cm: float = 10.0,
-    dpi: int = 300,
-    out_dir: str = FINAL_LABEL_DIR,
-    return_image: bool = False
-):
+def barcode_bitmap(code_value: str, target_w: int, target_h: int, native: bool = False,
+                   symbology: str = "code128", dpi: int = 300) -> Optional[Image.Image]:
     """
-    Create a square label PNG sized label_cm x label_cm at the given dpi.
-    Flavour will use a single uniform bold size across all lines; it only shrinks
-    (uniformly) when necessary to fit into two lines.
+    _render_barcode_image as a 1-bit bitmap, from barcode_cache when this
+    value was drawn at this size before (copies, reruns, previews).
     """
-    inches = label_cm / 2.54
-    px_size = max(200, int(inches * dpi))
-    px_w = px_h = px_size
-
-    img = Image.new("RGB", (px_w, px_h), "white")
-    draw = ImageDraw.Draw(img)
-
-    raw_product = str(row.get("Product", "") or "").strip()
-    raw_sku = str(row.get("Sku", "") or "").strip()
-
-    cleaned, ext_flavour, ext_strength = extract_from_product_field(raw_product)
-    if cleaned:
-        raw_product = cleaned
-
-    # prefer explicit columns
-    flavour = None
-    strength = None
-    if "Flavour" in row and str(row.get("Flavour") or "").strip():
-        flavour = str(row.get("Flavour")).strip()
-    elif ext_flavour:
-        flavour = ext_flavour
-
-    if "Strength" in row and str(row.get("Strength") or "").strip():
-        strength = str(row.get("Strength")).strip()
-    elif ext_strength:
-        strength = ext_strength
-
-    flavour = (flavour or "").strip()
-    strength = (strength or "").strip()
-
-    # fonts
-    product_font = _load_ttf_candidate(max(12, int(px_h * 0.06)))
-
-    # --- IMPORTANT: fixed starting flavour size (consistent across labels) ---
-    # choose a sensible proportion (tweak 0.12 if you want slightly larger/smaller)
-    initial_flavour_size = max(22, int(px_h * 0.12))
-    flavour_font = _load_bold_ttf(initial_flavour_size)
-
-    strength_font = _load_ttf_candidate(max(14, int(px_h * 0.09)))
-    sku_font = _load_ttf_candidate(max(12, int(px_h * 0.06)))
-
-    # product block
-    padding_h = int(px_h * 0.04)
-    current_y = padding_h
-    max_text_w = int(px_w * 0.9)
-    avg_char_w = max(6, _font_text_width(product_font, "a"))
-    wrap_chars = max(10, int(max_text_w / avg_char_w))
-    prod_lines = textwrap.wrap(raw_product, width=wrap_chars) if raw_product else []
-    longest_line_w = 0
-    for line in prod_lines:
-        bbox = draw.textbbox((0, 0), line, font=product_font)
-        w = bbox[2] - bbox[0]; h = bbox[3] - bbox[1]
-        draw.text(((px_w - w) / 2, current_y), line, fill="black", font=product_font)
-        longest_line_w = max(longest_line_w, w)
-        current_y += h + int(px_h * 0.008)
-
-    if prod_lines:
-        underline_y = current_y + 1
-        u_thickness = max(1, int(px_h * 0.005))
-        draw.line(((px_w - longest_line_w) / 2, underline_y, (px_w + longest_line_w) / 2, underline_y),
-                  fill="black", width=u_thickness)
-        current_y = underline_y + int(px_h * 0.03)
-    else:
-        current_y += int(px_h * 0.02)
-
-    # ---------- Flavour: uniform font size across lines ----------
-    flavour_text = flavour
-    if flavour_text:
-        max_flavour_w = int(px_w * 0.9)
-
-        def _lines_for_font(font):
-            avg_w = max(6, _font_text_width(font, "A"))
-            approx_wrap_chars = max(4, int(max_flavour_w / avg_w))
-            return textwrap.wrap(flavour_text, width=approx_wrap_chars)
-
-        flavour_candidate = flavour_font
-        lines = _lines_for_font(flavour_candidate)
-
-        # If it doesn't fit within 2 lines, reduce size uniformly until it fits or we hit min size.
-        if len(lines) > 2 or any(_font_text_width(flavour_candidate, l) > max_flavour_w for l in lines):
-            attempts = 0
-            min_size = 10
-            while (len(lines) > 2 or any(_font_text_width(flavour_candidate, l) > max_flavour_w for l in lines)) and attempts < 14:
-                new_size = max(min_size, int(getattr(flavour_candidate, "size", initial_flavour_size) * 0.88))
-                if new_size == getattr(flavour_candidate, "size", initial_flavour_size):
-                    break
-                flavour_candidate = _load_bold_ttf(new_size)
-                lines = _lines_for_font(flavour_candidate)
-                attempts += 1
-
-            # last resort collapse to 2 lines (balanced) but keep uniform flavour_candidate size
-            if len(lines) > 2:
-                words = flavour_text.split()
-                mid = max(1, len(words) // 2)
-                lines = [" ".join(words[:mid]), " ".join(words[mid:])]
-
-        # draw using the final uniform flavour_candidate
-        for line in lines:
-            bbox = draw.textbbox((0, 0), line, font=flavour_candidate)
-            w = bbox[2] - bbox[0]; h = bbox[3] - bbox[1]
-            draw.text(((px_w - w) / 2, current_y), line, fill="black", font=flavour_candidate)
-            current_y += h + int(px_h * 0.008)
-
-        current_y += int(px_h * 0.01)
-
-    # strength
-    if strength:
-        bbox = draw.textbbox((0, 0), strength, font=strength_font)
-        w = bbox[2] - bbox[0]; h = bbox[3] - bbox[1]
-        draw.text(((px_w - w) / 2, current_y), strength, fill="black", font=strength_font)
-        current_y += h + int(px_h * 0.02)
-
-    # barcode zone
-    barcode_zone_h = int(px_h * 0.22)
-    barcode_max_w = int(px_w * 0.8)
-    barcode_max_h = int(barcode_zone_h * 0.7)
-    barcode_y = px_h - barcode_zone_h - int(px_h * 0.02)
-
-    barcode_img = _render_barcode_image(raw_sku or " ", barcode_max_w, barcode_max_h)
-
-    if barcode_img is None:
-        bx = (px_w - barcode_max_w) // 2
-        by = barcode_y
-        draw.rectangle([bx, by, bx + barcode_max_w, by + barcode_max_h], outline="black",
-                       width=max(1, int(px_h * 0.006)))
-        bars = 42
-        bar_w = max(2, barcode_max_w // (bars * 2))
-        gap = max(1, (barcode_max_w - bars * bar_w) // (bars + 1))
-        x = bx + gap
-        for j in range(bars):
-            draw.rectangle([x, by + int(barcode_max_h * 0.05),
-                            x + bar_w, by + int(barcode_max_h * 0.95)], fill="black")
-            x += bar_w + gap
+    from barcode_cache import get_cache
+
+    key = (str(code_value), symbology, int(target_w), int(target_h), int(dpi), bool(native), _get_barcode_backend())
+    return get_cache().get(key, lambda: _render_barcode_image(code_value, target_w, target_h, native, symbology))
+
+
+@timed("label.render")
+def render_label_image(row, label_cm: float = 10.0, dpi: int = 300,
+                       size_px: Optional[Tuple[int, int]] = None, template: Optional[str] = None) -> Image.Image:
+    """
+    Render a square label sized label_cm x label_cm at the given dpi and return it.
+    size_px=(w, h) renders at exactly that device raster instead (a printer
+    profile's dots, see printer_profiles.label_px) with whole-dot barcode modules,
+    so nothing downstream has to resample it.
+    The layout comes from a label template (label_templates; "default" when
+    None), compiled once per size, so only the fields are drawn per label.
+    """
+    from label_templates import compile_template
+
+    if size_px:
+        px_w, px_h = int(size_px[0]), int(size_px[1])
     else:
-        bw, bh = barcode_img.size
-        bx = (px_w - bw) // 2
-        by = barcode_y + (barcode_max_h - bh) // 2
-        img.paste(barcode_img, (bx, by))
-
-    # sku text
-    sku_text = raw_sku or f"SKU-{uuid.uuid4().hex[:6].upper()}"
-    bbox = draw.textbbox((0, 0), sku_text, font=sku_font)
-    sw = bbox[2] - bbox[0]; sh = bbox[3] - bbox[1]
-    sku_y = px_h - sh - int(px_h * 0.02)
-    draw.text(((px_w - sw) / 2, sku_y), sku_text, fill="black", font=sku_font)
-
-    # save
+        inches = label_cm / 2.54
+        px_size = max(200, int(inches * dpi))
+        px_w = px_h = px_size
+    return compile_template(template, px_w, px_h, native=bool(size_px), dpi=dpi).render(row)
+
+
+@timed("label.save")
+def save_label_image(img: Image.Image, out_dir: str = FINAL_LABEL_DIR, idx: Optional[str] = None, dpi: int = 300) -> str:
+    """Write a rendered label to out_dir/label_<idx>.png and return the path."""
     os.makedirs(out_dir, exist_ok=True)
     filename = f"label_{(idx or uuid.uuid4().hex[:6])}.png"
     out_path = os.path.join(out_dir, filename)
@@ -295,7 +263,36 @@ def create_label_image(
         img.save(out_path, dpi=(dpi, dpi))
     except Exception:
         img.save(out_path)
+    return out_path
+
 
+@timed("label.create")
+def create_label_image(
+    row,
+    idx: Optional[str] = None,
+    label_cm: float = 10.0,
+    dpi: int = 300,
+    out_dir: Optional[str] = FINAL_LABEL_DIR,
+    return_image: bool = False,
+    profile: Optional[dict] = None,
+    template: Optional[str] = None,
+):
+    """
+    Create a label PNG (render_label_image + save_label_image) and return its path.
+    out_dir=None renders only and returns the image without writing a file.
+    profile (a printer_profiles profile) overrides label_cm/dpi with the device raster;
+    template names the label layout (label_templates).
+    For many labels, render_pipeline streams them to sinks with bounded memory.
+    """
+    if profile:
+        from printer_profiles import label_px
+        dpi = profile["dpi"]
+        img = render_label_image(row, dpi=dpi, size_px=label_px(profile), template=template)
+    else:
+        img = render_label_image(row, label_cm=label_cm, dpi=dpi, template=template)
+    if out_dir is None:
+        return img
+    out_path = save_label_image(img, out_dir, idx=idx, dpi=dpi)
     if return_image:
         return img
     return out_path
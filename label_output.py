@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# label_output.py
+"""
+Output formats for rendered labels and the print helper.
+
+  - PNG : what create_label_image / save_label_image write
+  - PDF : one page per label at the label's physical size (reportlab, lossless)
+  - ZPL : label raster as a ^GFA graphic field, Z64-compressed, for Zebra printers
+
+print_file() sends a file to a CUPS queue with `lp`.
+"""
+import io
+import base64
+import binascii
+import subprocess
+import zlib
+from typing import Iterable, Optional
+
+from PIL import Image
+
+from instrumentation import timed
+
+OUTPUT_FORMATS = ("png", "pdf", "zpl")
+
+
+# ---------------------------
+# PDF
+# ---------------------------
+@timed("encode.pdf")
+def images_to_pdf(images: Iterable, pdf_path: str, dpi: int = 300) -> str:
+    """
+    Write images (PIL images or PNG paths) to a PDF, one page per image, each
+    page sized to the image at `dpi`. PNG data is embedded losslessly.
+    """
+    c = None
+    for item in images:
+        img = Image.open(item) if isinstance(item, str) else item
+        c = add_pdf_page(c, pdf_path, img, dpi)
+    if c is None:
+        raise ValueError("no images to write")
+    c.save()
+    return pdf_path
+
+
+def add_pdf_page(c, pdf_path, img: Image.Image, dpi: int = 300, copies: int = 1):
+    """
+    Append img as `copies` pages; creates the canvas on the first call.
+    reportlab stores an image once per content hash, so the copies reference
+    one embedded image. Returns the canvas.
+    """
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.utils import ImageReader
+
+    w_pt = img.width * 72.0 / dpi
+    h_pt = img.height * 72.0 / dpi
+    if c is None:
+        c = canvas.Canvas(pdf_path, pagesize=(w_pt, h_pt))
+    reader = ImageReader(img)
+    for _ in range(max(1, int(copies))):
+        c.setPageSize((w_pt, h_pt))
+        c.drawImage(reader, 0, 0, width=w_pt, height=h_pt)
+        c.showPage()
+    return c
+
+
+# ---------------------------
+# ZPL
+# ---------------------------
+def _to_1bit_inverted(img: Image.Image, threshold: int = 128) -> Image.Image:
+    # plain threshold, no dithering: barcodes and text must stay crisp.
+    # PIL "1" packs 1 = white but ZPL wants 1 = black, so dark pixels map to 255.
+    return img.convert("L").point(lambda v: 0 if v >= threshold else 255, mode="1")
+
+
+def zpl_graphic(img: Image.Image, threshold: int = 128) -> str:
+    """^GFA graphic field for img, rows packed MSB first, 1 = black."""
+    mono = _to_1bit_inverted(img, threshold)
+    bytes_per_row = (mono.width + 7) // 8
+    raw = mono.tobytes()
+    total = len(raw)
+    b64 = base64.b64encode(zlib.compress(raw, 9)).decode("ascii")
+    crc = binascii.crc_hqx(b64.encode("ascii"), 0)
+    return f"^GFA,{total},{total},{bytes_per_row},:Z64:{b64}:{crc:04X}"
+
+
+def image_to_zpl(img: Image.Image, copies: int = 1, threshold: int = 128, darkness: Optional[int] = None) -> str:
+    """
+    One complete ZPL label (^XA..^XZ) printing img `copies` times.
+    darkness (0-30, from the printer profile) sets ~SD; None keeps the printer's setting.
+    """
+    dark = f"~SD{int(darkness):02d}" if darkness is not None else ""
+    return (
+        f"^XA{dark}^PW{img.width}^LL{img.height}^LH0,0"
+        f"^FO0,0{zpl_graphic(img, threshold)}^FS"
+        f"^PQ{max(1, int(copies))}^XZ\n"
+    )
+
+
+def zpl_with_copies(zpl: str, copies: int = 1) -> str:
+    """Set the ^PQ quantity of a single-label ZPL string from image_to_zpl."""
+    if copies <= 1:
+        return zpl
+    return zpl.replace("^PQ1^XZ", f"^PQ{int(copies)}^XZ")
+
+
+@timed("encode.zpl")
+def images_to_zpl(images: Iterable, zpl_path: str, darkness: Optional[int] = None) -> str:
+    with open(zpl_path, "w") as fh:
+        for item in images:
+            img = Image.open(item) if isinstance(item, str) else item
+            fh.write(image_to_zpl(img, darkness=darkness))
+    return zpl_path
+
+
+# ---------------------------
+# Printing
+# ---------------------------
+@timed("print.lp")
+def print_file(path: str, printer: Optional[str] = None, copies: int = 1, raw: bool = False) -> subprocess.CompletedProcess:
+    """
+    Send path to a CUPS printer with lp. raw=True passes the data through
+    untouched (ZPL to a raw Zebra queue). Raises CalledProcessError on failure.
+    """
+    cmd = ["lp"]
+    if printer:
+        cmd += ["-d", printer]
+    if copies and copies > 1:
+        cmd += ["-n", str(int(copies))]
+    if raw:
+        cmd += ["-o", "raw"]
+    cmd.append(path)
+    return subprocess.run(cmd, check=True, capture_output=True, text=True)
+
+
+def image_bytes(img: Image.Image, fmt: str = "png", dpi: int = 300, darkness: Optional[int] = None) -> bytes:
+    """Encode a single label for an HTTP response or a ZIP entry."""
+    fmt = fmt.lower()
+    if fmt == "png":
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", dpi=(dpi, dpi))
+        return buf.getvalue()
+    if fmt == "zpl":
+        return image_to_zpl(img, darkness=darkness).encode("ascii")
+    if fmt == "pdf":
+        buf = io.BytesIO()
+        images_to_pdf([img], buf, dpi=dpi)
+        return buf.getvalue()
+    raise ValueError(f"unknown format {fmt!r}, expected one of {OUTPUT_FORMATS}")
@@ -0,0 +1,490 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# label_service.py
+"""
+Local HTTP service around the label engine, for the WMS, handheld scanners
+and anything else that is not a Streamlit page.
+
+    python -m label_service --port 8765 --workers 4
+
+Endpoints
+  GET  /label?sku=...&product=...&flavour=...&strength=...&format=png
+  POST /label?format=png|pdf|zpl     body: {"Sku": ..., "Product": ..., "Flavour": ..., "Strength": ...,
+                                            "label_cm": 10, "dpi": 300}
+                                     or "profile": "zebra-203-60mm" (printer_profiles) instead of
+                                     label_cm/dpi, to render at the printer's own dots;
+                                     "template": "<name>" picks the layout (label_templates)
+  POST /labels                       body: {"format": "pdf|zpl|zip", "labels": [spec, ...]}
+                                     each spec may carry "copies"; zip holds one PNG per spec
+  GET  /health                       JSON liveness and pool info
+  GET  /metrics                      Prometheus text format (service counters and the
+                                     instrumentation stages; render workers send their
+                                     stage timings back with each result. Cache gauges
+                                     cover the server process only)
+
+Rendering happens in a process pool that is forked and warmed (fonts, barcode
+backend) before the server starts accepting connections. Requests for the same
+label (same spec and format) are coalesced: while one render is in flight,
+identical requests wait on the same future, and recent results are kept in a
+small LRU so repeat scans are served without rendering.
+
+The server binds to 127.0.0.1 by default; pass --host 0.0.0.0 to expose it.
+"""
+import io
+import re
+import sys
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+import threading
+import multiprocessing
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import instrumentation
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+CACHE_ENTRIES = 512
+RENDER_TIMEOUT = 30.0
+MAX_BODY_BYTES = 2 * 1024 * 1024
+MAX_BATCH_LABELS = 2000
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "pdf": "application/pdf",
+    "zpl": "application/zpl",
+    "zip": "application/zip",
+}
+SPEC_FIELDS = ("Sku", "Product", "Flavour", "Strength")
+QUERY_ALIASES = {"sku": "Sku", "product": "Product", "flavour": "Flavour", "flavor": "Flavour", "strength": "Strength"}
+
+
+class BadRequest(Exception):
+    pass
+
+
+# ---------------------------
+# Worker side
+# ---------------------------
+def _worker_init():
+    # pay for imports, font loading and the barcode backend probe once per worker
+    import label_generator
+    if label_generator._get_barcode_backend() == "bwipp":
+        from bwipp_pool import get_pool
+        get_pool().warm()
+    label_generator.create_label_image({"Sku": "WARMUP", "Product": "Warm up [Mint]"}, out_dir=None)
+
+
+def _render(spec: dict, fmt: str) -> Tuple[bytes, list]:
+    """Encoded label plus the stage timings measured for it (merged into the parent's metrics)."""
+    from label_generator import create_label_image
+    from label_output import image_bytes
+
+    with instrumentation.recording() as stages:
+        img = create_label_image(spec, label_cm=spec["label_cm"], dpi=spec["dpi"], out_dir=None,
+                                 profile=spec.get("profile_data"), template=spec.get("template_name"))
+        data = image_bytes(img, fmt, dpi=spec["dpi"], darkness=(spec.get("profile_data") or {}).get("darkness"))
+    return data, stages
+
+
+def _ping(delay: float = 0.0) -> int:
+    import os
+    time.sleep(delay)  # hold the worker so the next ping lands on another one
+    return os.getpid()
+
+
+# ---------------------------
+# Specs
+# ---------------------------
+def normalize_spec(raw: dict) -> dict:
+    """Validated, canonical label spec (the coalescing key is a hash of this)."""
+    if not isinstance(raw, dict):
+        raise BadRequest("label spec must be a JSON object")
+    spec = {}
+    for key, value in raw.items():
+        field = QUERY_ALIASES.get(str(key).lower(), key)
+        if field in SPEC_FIELDS and value is not None:
+            spec[field] = str(value).strip()
+    if not spec.get("Sku") and not spec.get("Product"):
+        raise BadRequest("a label needs at least Sku or Product")
+    if raw.get("template"):
+        from label_templates import template_key
+        try:
+            # the key hashes the definition, so editing a template invalidates cached renders
+            spec["template"] = template_key(str(raw["template"]))
+        except KeyError as e:
+            raise BadRequest(str(e.args[0]))
+        spec["template_name"] = str(raw["template"])
+    if raw.get("profile"):
+        from printer_profiles import get_profile, label_cm, profile_key
+        try:
+            profile = get_profile(str(raw["profile"]))
+        except KeyError as e:
+            raise BadRequest(str(e.args[0]))
+        # profile_key is part of the spec, so cached renders never mix printers
+        spec.update(profile=profile_key(profile), label_cm=label_cm(profile), dpi=profile["dpi"])
+        spec["profile_data"] = profile
+        return spec
+    try:
+        spec["label_cm"] = float(raw.get("label_cm", 10.0))
+        spec["dpi"] = int(raw.get("dpi", 300))
+    except (TypeError, ValueError):
+        raise BadRequest("label_cm and dpi must be numbers")
+    if not (1.0 <= spec["label_cm"] <= 30.0) or not (72 <= spec["dpi"] <= 1200):
+        raise BadRequest("label_cm must be 1-30 and dpi 72-1200")
+    return spec
+
+
+def spec_key(spec: dict, fmt: str) -> str:
+    spec = {k: v for k, v in spec.items() if k not in ("profile_data", "template_name")}
+    blob = json.dumps([spec, fmt], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def _copies(raw: dict) -> int:
+    try:
+        copies = int(raw.get("copies", 1))
+    except (TypeError, ValueError):
+        raise BadRequest("copies must be an integer")
+    if copies < 1:
+        raise BadRequest("copies must be >= 1")
+    return copies
+
+
+# ---------------------------
+# Render engine: pool + coalescing + LRU
+# ---------------------------
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += value
+
+    def exposition(self, gauges: dict) -> str:
+        lines = []
+        with self._lock:
+            items = sorted(self.counters.items())
+        for (name, labels), value in items:
+            lbl = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"label_service_{name}{{{lbl}}} {value:g}" if lbl else f"label_service_{name} {value:g}")
+        for name, value in sorted(gauges.items()):
+            lines.append(f"label_service_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+class RenderEngine:
+    def __init__(self, workers: int = DEFAULT_WORKERS, cache_entries: int = CACHE_ENTRIES,
+                 timeout: float = RENDER_TIMEOUT, metrics: Optional[Metrics] = None):
+        self.workers = workers
+        self.cache_entries = cache_entries
+        self.timeout = timeout
+        self.metrics = metrics or Metrics()
+        self._lock = threading.Lock()
+        self._inflight = {}          # key -> Future
+        self._cache = OrderedDict()  # key -> bytes
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        """(Re)create the pool and fork every worker now, not on the first request."""
+        ctx = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=_worker_init)
+            pids = {f.result() for f in [self._pool.submit(_ping, 0.05) for _ in range(self.workers)]}
+        self.worker_pids = sorted(pids)
+
+    def submit(self, spec: dict, fmt: str) -> Future:
+        """Future for the encoded label; joins an identical in-flight render if there is one."""
+        key = spec_key(spec, fmt)
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                self.metrics.inc("cache_hits_total")
+                fut = Future()
+                fut.set_result(data)
+                return fut
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.metrics.inc("coalesced_total")
+                return fut
+            fut = self._inflight[key] = Future()
+        try:
+            try:
+                work = self._pool.submit(_render, spec, fmt)
+            except BrokenProcessPool:
+                # a worker died (OOM, segfault in a font/barcode lib): fork a fresh pool
+                self.metrics.inc("pool_restarts_total")
+                self.start()
+                work = self._pool.submit(_render, spec, fmt)
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            return fut
+        start = time.perf_counter()
+        work.add_done_callback(lambda w: self._finish(key, fmt, fut, w, start))
+        return fut
+
+    def _finish(self, key: str, fmt: str, fut: Future, work: Future, start: float):
+        try:
+            if work.cancelled():
+                # start() replaced the pool (cancel_futures) while this was queued
+                exc = RuntimeError("render cancelled: the render pool was restarted")
+            else:
+                exc = work.exception()
+            data = None
+            if exc is None:
+                data, stages = work.result()
+                instrumentation.merge(stages)
+            with self._lock:
+                if exc is None and self.cache_entries:
+                    self._cache[key] = data
+                    while len(self._cache) > self.cache_entries:
+                        self._cache.popitem(last=False)
+            if exc is not None:
+                self.metrics.inc("render_errors_total")
+                fut.set_exception(exc)
+                return
+            self.metrics.inc("renders_total", format=fmt)
+            self.metrics.inc("render_seconds_sum", time.perf_counter() - start)
+            fut.set_result(data)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def render(self, spec: dict, fmt: str) -> bytes:
+        try:
+            return self.submit(spec, fmt).result(timeout=self.timeout)
+        except FutureTimeout:
+            raise TimeoutError(f"render did not finish within {self.timeout:.0f}s")
+
+    def render_many(self, specs: list, fmt: str) -> list:
+        """Render a batch across the pool; identical specs render once."""
+        futures = [self.submit(s, fmt) for s in specs]
+        deadline = time.monotonic() + self.timeout * max(1, len(futures) / max(1, self.workers))
+        try:
+            return [f.result(timeout=max(0.0, deadline - time.monotonic())) for f in futures]
+        except FutureTimeout:
+            raise TimeoutError("batch render timed out")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cache_entries": len(self._cache), "inflight": len(self._inflight)}
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+# ---------------------------
+# Batch assembly
+# ---------------------------
+def build_batch(engine: RenderEngine, body: dict) -> Tuple[bytes, str]:
+    from PIL import Image
+    from label_output import add_pdf_page, zpl_with_copies
+
+    if not isinstance(body, dict):
+        raise BadRequest("request body must be a JSON object")
+    fmt = str(body.get("format", "pdf")).lower()
+    if fmt not in ("pdf", "zpl", "zip"):
+        raise BadRequest("batch format must be pdf, zpl or zip")
+    raw_specs = body.get("labels")
+    if not isinstance(raw_specs, list) or not raw_specs:
+        raise BadRequest('"labels" must be a non-empty list')
+    specs = [normalize_spec(r) for r in raw_specs]
+    copies = [_copies(r) for r in raw_specs]
+    if sum(copies) > MAX_BATCH_LABELS:
+        raise BadRequest(f"batch too large (max {MAX_BATCH_LABELS} labels including copies)")
+
+    if fmt == "zpl":
+        # copies become one extra ^PQ per label, not repeated graphics
+        rendered = engine.render_many(specs, "zpl")
+        out = [zpl_with_copies(data.decode("ascii"), n).encode("ascii") for data, n in zip(rendered, copies)]
+        return b"".join(out), fmt
+
+    rendered = engine.render_many(specs, "png")
+    if fmt == "zip":
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:  # PNG is already compressed
+            for i, (spec, data) in enumerate(zip(specs, rendered)):
+                # the Sku comes from the client: keep it out of the archive's path structure
+                name = re.sub(r"[^A-Za-z0-9._-]", "_", spec.get("Sku") or "").strip(".") or f"label_{i}"
+                zf.writestr(f"{i:04d}_{name}.png", data)
+        return buf.getvalue(), fmt
+
+    # each page is sized at its own label's dpi: a batch may mix printer profiles
+    decoded = {}
+    buf = io.BytesIO()
+    c = None
+    for spec, data, n in zip(specs, rendered, copies):
+        if id(data) not in decoded:
+            decoded[id(data)] = Image.open(io.BytesIO(data))
+        c = add_pdf_page(c, buf, decoded[id(data)], dpi=spec["dpi"], copies=n)
+    c.save()
+    return buf.getvalue(), fmt
+
+
+# ---------------------------
+# HTTP
+# ---------------------------
+class LabelRequestHandler(BaseHTTPRequestHandler):
+    server_version = "LabelService/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def engine(self) -> RenderEngine:
+        return self.server.engine
+
+    def log_message(self, fmt, *args):
+        if not self.server.quiet:
+            super().log_message(fmt, *args)
+
+    # ---- helpers ----
+    def _send(self, status: int, body: bytes, content_type: str, extra_headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (extra_headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+        self.engine.metrics.inc("requests_total", path=self._route, status=status)
+
+    def _send_json(self, status: int, payload: dict):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise BadRequest(f"body larger than {MAX_BODY_BYTES} bytes")
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError as e:
+            raise BadRequest(f"invalid JSON: {e}")
+
+    def _dispatch(self, handler):
+        try:
+            handler()
+        except BadRequest as e:
+            self._send_json(400, {"error": str(e)})
+        except TimeoutError as e:
+            self._send_json(504, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    # ---- routes ----
+    def do_GET(self):
+        url = urlparse(self.path)
+        self._route = url.path
+        if url.path == "/health":
+            self._send_json(200, {
+                "status": "ok",
+                "workers": self.engine.workers,
+                "worker_pids": self.engine.worker_pids,
+                "uptime_s": round(time.time() - self.engine.metrics.started, 1),
+                **self.engine.stats(),
+            })
+        elif url.path == "/metrics":
+            gauges = {"uptime_seconds": time.time() - self.engine.metrics.started,
+                      "workers": self.engine.workers, **self.engine.stats()}
+            text = self.engine.metrics.exposition(gauges) + instrumentation.prometheus_text()
+            self._send(200, text.encode("utf-8"), "text/plain; version=0.0.4")
+        elif url.path == "/label":
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            self._dispatch(lambda: self._single(query, query.get("format", "png")))
+        else:
+            self._route = "other"
+            self._send_json(404, {"error": f"no route {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        self._route = url.path
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == "/label":
+            self._dispatch(lambda: self._single(self._read_json(), query.get("format")))
+        elif url.path == "/labels":
+            self._dispatch(self._batch)
+        else:
+            self._route = "other"
+            self._send_json(404, {"error": f"no route {url.path}"})
+
+    def _single(self, raw: dict, fmt: Optional[str]):
+        if not isinstance(raw, dict):
+            raise BadRequest("label spec must be a JSON object")
+        fmt = str(fmt or raw.get("format") or "png").lower()
+        if fmt not in ("png", "pdf", "zpl"):
+            raise BadRequest("format must be png, pdf or zpl")
+        spec = normalize_spec(raw)
+        data = self.engine.render(spec, fmt)
+        self._send(200, data, CONTENT_TYPES[fmt], {"X-Label-Key": spec_key(spec, fmt)})
+
+    def _batch(self):
+        data, fmt = build_batch(self.engine, self._read_json())
+        self._send(200, data, CONTENT_TYPES[fmt],
+                   {"Content-Disposition": f'attachment; filename="labels.{fmt}"'})
+
+
+class LabelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, engine: RenderEngine, quiet: bool = False):
+        self.engine = engine
+        self.quiet = quiet
+        super().__init__(address, LabelRequestHandler)
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = DEFAULT_WORKERS,
+          cache_entries: int = CACHE_ENTRIES, quiet: bool = False) -> LabelServer:
+    """Fork the worker pool, then bind. Call .serve_forever() on the result."""
+    engine = RenderEngine(workers=workers, cache_entries=cache_entries)
+    return LabelServer((host, port), engine, quiet=quiet)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m label_service", description="HTTP label rendering service.")
+    ap.add_argument("--host", default=DEFAULT_HOST)
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="render processes")
+    ap.add_argument("--cache", type=int, default=CACHE_ENTRIES, help="rendered labels kept in memory (0 = off)")
+    ap.add_argument("--quiet", action="store_true", help="no access log")
+    args = ap.parse_args(argv)
+
+    server = serve(args.host, args.port, args.workers, args.cache, args.quiet)
+    print(f"label service on http://{args.host}:{server.server_port} "
+          f"({args.workers} workers, pids {server.engine.worker_pids})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.engine.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
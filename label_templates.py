@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# label_templates.py
+"""
+Declarative label layouts.
+
+A template is a dict (JSON, or YAML when PyYAML is installed) with a list of
+blocks drawn top to bottom. Sizes and positions are fractions of the label
+height (sizes, gaps) or width (widths, x positions):
+
+  {"type": "text", "field": "flavour", "font": "bold", "size": 0.12, "min_px": 22,
+   "width": 0.9, "line_gap": 0.008, "gap_after": 0.01, "wrap": true,
+   "fit": {"max_lines": 2, "min_px": 10}}
+      Flows below the previous block, centred. "wrap" breaks lines at the
+      block width; "fit" picks the largest size down to min_px that wraps
+      into max_lines (text_fit). "field" is product, flavour,
+      strength, sku or any other column. Empty values are skipped, or take
+      "empty_gap". "underline": {"thickness", "gap_after"} underlines the
+      block. "anchor": "bottom" with "bottom": 0.02 pins one line to the
+      bottom edge instead of the flow. "placeholder" is printed when the
+      field is empty ("{uid}" is a random 6-character id).
+  {"type": "barcode", "field": "sku", "zone": 0.22, "width": 0.8, "height": 0.7, "bottom": 0.02,
+   "symbology": "code128"}
+      A barcode centred in a zone at the bottom of the label. Any BWIPP
+      symbology (datamatrix, gs1-128, qrcode, ...) when Ghostscript is
+      available (bwipp_pool or treepoem); python-barcode covers the linear ones.
+  {"type": "text", "text": "KEEP OUT OF REACH OF CHILDREN", "at": [0.5, 0.7], "size": 0.03, "width": 0.9}
+  {"type": "line", "from": [0.05, 0.72], "to": [0.95, 0.72], "thickness": 0.004}
+  {"type": "rect", "box": [0.01, 0.01, 0.99, 0.99], "thickness": 0.006}
+      Static blocks (fixed text, lines and frames).
+
+compile_template() turns a template into absolute geometry for one raster
+size: fonts loaded, sizes and widths in pixels, and the static
+blocks pre-drawn on a base canvas. It is cached per (template, width,
+height, dpi, native), so rendering a label only copies the base and fills the
+fields. Field text is painted from glyph_cache, so a run repeated across
+labels is rasterized once.
+
+"default" is the original label. More templates go in templates/*.json
+(or *.yaml) next to this file, or the directory named by
+BARCODE_LABEL_TEMPLATES; the file name is the template name.
+"""
+import os
+import json
+import uuid
+import hashlib
+from functools import lru_cache
+from typing import List, Optional
+
+from PIL import Image, ImageDraw
+
+import glyph_cache
+import text_fit
+from instrumentation import timer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+TEMPLATES_ENV = "BARCODE_LABEL_TEMPLATES"
+
+DEFAULT_TEMPLATE = "default"
+
+BUILTIN_TEMPLATES = {
+    DEFAULT_TEMPLATE: {
+        "description": "Product, flavour and strength over a Code128 barcode",
+        "padding_top": 0.04,
+        "blocks": [
+            {"type": "text", "field": "product", "font": "regular", "size": 0.06, "min_px": 12,
+             "width": 0.9, "wrap": True, "line_gap": 0.008,
+             "underline": {"thickness": 0.005, "gap_after": 0.03}, "empty_gap": 0.02},
+            {"type": "text", "field": "flavour", "font": "bold", "size": 0.12, "min_px": 22,
+             "width": 0.9, "wrap": True, "line_gap": 0.008, "gap_after": 0.01,
+             "fit": {"max_lines": 2, "min_px": 10}},
+            {"type": "text", "field": "strength", "font": "regular", "size": 0.09, "min_px": 14,
+             "gap_after": 0.02},
+            {"type": "barcode", "field": "sku", "zone": 0.22, "width": 0.8, "height": 0.7, "bottom": 0.02},
+            {"type": "text", "field": "sku", "font": "regular", "size": 0.06, "min_px": 12,
+             "anchor": "bottom", "bottom": 0.02, "placeholder": "SKU-{uid}"},
+        ],
+    },
+}
+
+BLOCK_TYPES = ("text", "barcode", "line", "rect")
+
+_loaded = None
+_keys = {}
+
+
+# ---------------------------
+# Loading
+# ---------------------------
+def _read_file(path: str) -> dict:
+    with open(path) as fh:
+        if path.endswith((".yaml", ".yml")):
+            import yaml  # optional; only needed for YAML templates
+            return yaml.safe_load(fh)
+        return json.load(fh)
+
+
+def _load() -> dict:
+    global _loaded
+    if _loaded is None:
+        templates = {name: dict(t, name=name) for name, t in BUILTIN_TEMPLATES.items()}
+        folder = os.environ.get(TEMPLATES_ENV) or TEMPLATES_DIR
+        if os.path.isdir(folder):
+            for fn in sorted(os.listdir(folder)):
+                stem, ext = os.path.splitext(fn)
+                if ext in (".json", ".yaml", ".yml"):
+                    templates[stem] = dict(_read_file(os.path.join(folder, fn)), name=stem)
+        _loaded = {name: validate(t) for name, t in templates.items()}
+    return _loaded
+
+
+def reload():
+    global _loaded
+    _loaded = None
+    _keys.clear()
+    _compile.cache_clear()
+    return _load()
+
+
+def validate(t: dict) -> dict:
+    blocks = t.get("blocks")
+    if not isinstance(blocks, list) or not blocks:
+        raise ValueError(f"template {t.get('name')!r}: 'blocks' must be a non-empty list")
+    for i, b in enumerate(blocks):
+        if b.get("type") not in BLOCK_TYPES:
+            raise ValueError(f"template {t.get('name')!r}: block {i} has unknown type {b.get('type')!r}")
+        if b["type"] == "text" and not (b.get("field") or b.get("text")):
+            raise ValueError(f"template {t.get('name')!r}: text block {i} needs 'field' or 'text'")
+        if b["type"] == "text" and b.get("text") and not b.get("field") and "at" not in b:
+            raise ValueError(f"template {t.get('name')!r}: static text block {i} needs 'at'")
+    t.setdefault("description", t.get("name", ""))
+    return t
+
+
+def template_names() -> List[str]:
+    return list(_load())
+
+
+def get_template(name: Optional[str] = None) -> dict:
+    """Template by name (the default for None/""). Raises KeyError for unknown names."""
+    templates = _load()
+    name = name or DEFAULT_TEMPLATE
+    if name not in templates:
+        raise KeyError(f"unknown label template {name!r}; known: {', '.join(templates)}")
+    return templates[name]
+
+
+def template_key(name: Optional[str] = None) -> str:
+    """name plus a hash of the definition, for caches that must notice template edits."""
+    t = get_template(name)
+    if t["name"] not in _keys:
+        blob = json.dumps(t, sort_keys=True, default=str).encode("utf-8")
+        _keys[t["name"]] = f"{t['name']}:{hashlib.sha1(blob).hexdigest()[:10]}"
+    return _keys[t["name"]]
+
+
+# ---------------------------
+# Compiling
+# ---------------------------
+class CompiledTemplate:
+    """Absolute geometry of one template at one raster size; render() fills a label."""
+
+    def __init__(self, template: dict, px_w: int, px_h: int, native: bool = False, dpi: int = 300):
+        self.name = template["name"]
+        self.px_w, self.px_h, self.native, self.dpi = px_w, px_h, native, dpi
+        self.padding_top = int(px_h * template.get("padding_top", 0.04))
+        self.blocks = []
+        self.base = Image.new("RGB", (px_w, px_h), "white")
+        draw = ImageDraw.Draw(self.base)
+        for b in template["blocks"]:
+            if b["type"] == "text" and b.get("field"):
+                self.blocks.append(self._compile_text(b))
+            elif b["type"] == "barcode":
+                self.blocks.append(self._compile_barcode(b))
+            else:
+                self._draw_static(draw, b)
+
+    def _h(self, frac) -> int:
+        return int(self.px_h * float(frac))
+
+    def _compile_text(self, b: dict) -> dict:
+        px = max(int(b.get("min_px", 8)), self._h(b.get("size", 0.06)))
+        kind = b.get("font", "regular")
+        fit = b.get("fit")
+        underline = b.get("underline")
+        return {
+            "type": "text",
+            "field": b["field"],
+            "kind": kind,
+            "px": px,
+            "font": text_fit.font(kind, px),
+            "max_w": int(self.px_w * b.get("width", 0.9)),
+            "wrap": bool(b.get("wrap")),
+            "min_px": min(px, int(fit.get("min_px", 10))) if fit else None,
+            "max_lines": int(fit.get("max_lines", 2)) if fit else None,
+            "line_gap": self._h(b.get("line_gap", 0)),
+            "gap_after": self._h(b.get("gap_after", 0)),
+            "empty_gap": self._h(b.get("empty_gap", 0)),
+            "underline": underline and (max(1, self._h(underline.get("thickness", 0.005))),
+                                        self._h(underline.get("gap_after", 0.03))),
+            "bottom": self._h(b.get("bottom", 0.02)) if b.get("anchor") == "bottom" else None,
+            "placeholder": b.get("placeholder"),
+        }
+
+    def _compile_barcode(self, b: dict) -> dict:
+        zone_h = self._h(b.get("zone", 0.22))
+        return {
+            "type": "barcode",
+            "field": b.get("field", "sku"),
+            "symbology": b.get("symbology", "code128"),
+            "max_w": int(self.px_w * b.get("width", 0.8)),
+            "max_h": int(zone_h * b.get("height", 0.7)),
+            "y": self.px_h - zone_h - self._h(b.get("bottom", 0.02)),
+        }
+
+    def _draw_static(self, draw: ImageDraw.ImageDraw, b: dict):
+        width = max(1, self._h(b.get("thickness", 0.004)))
+        if b["type"] == "line":
+            (x0, y0), (x1, y1) = b["from"], b["to"]
+            draw.line((self.px_w * x0, self.px_h * y0, self.px_w * x1, self.px_h * y1), fill="black", width=width)
+        elif b["type"] == "rect":
+            x0, y0, x1, y1 = b["box"]
+            draw.rectangle([self.px_w * x0, self.px_h * y0, self.px_w * x1, self.px_h * y1], outline="black", width=width)
+        else:
+            kind, px = b.get("font", "regular"), max(int(b.get("min_px", 8)), self._h(b.get("size", 0.04)))
+            font = text_fit.font(kind, px)
+            ax, y = self.px_w * b["at"][0], self.px_h * b["at"][1]
+            for line in text_fit.wrap(b["text"], kind, px, int(self.px_w * b.get("width", 0.9))):
+                bbox = draw.textbbox((0, 0), line, font=font)
+                draw.text((ax - (bbox[2] - bbox[0]) / 2, y), line, fill="black", font=font)
+                y += bbox[3] - bbox[1] + self._h(b.get("line_gap", 0.008))
+
+    # -- per label --
+    def _lines(self, c: dict, text: str):
+        if c["max_lines"] is not None:
+            px, lines = text_fit.fit(text, c["kind"], c["px"], c["min_px"], c["max_w"], c["max_lines"])
+            return text_fit.font(c["kind"], px), lines
+        if c["wrap"]:
+            return c["font"], text_fit.wrap(text, c["kind"], c["px"], c["max_w"])
+        return c["font"], [text]
+
+    def _draw_text(self, draw: ImageDraw.ImageDraw, c: dict, text: str, y: int) -> int:
+        if not text and c["placeholder"]:
+            text = c["placeholder"].format(uid=uuid.uuid4().hex[:6].upper())
+        if c["bottom"] is not None:
+            font = c["font"]
+            bbox = draw.textbbox((0, 0), text, font=font)
+            w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+            glyph_cache.draw_text(draw, ((self.px_w - w) / 2, self.px_h - h - c["bottom"]), text, font)
+            return y
+        if not text:
+            return y + c["empty_gap"]
+        font, lines = self._lines(c, text)
+        longest = 0
+        for line in lines:
+            bbox = draw.textbbox((0, 0), line, font=font)
+            w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+            glyph_cache.draw_text(draw, ((self.px_w - w) / 2, y), line, font)
+            longest = max(longest, w)
+            y += h + c["line_gap"]
+        if c["underline"]:
+            thickness, gap = c["underline"]
+            y += 1
+            draw.line(((self.px_w - longest) / 2, y, (self.px_w + longest) / 2, y), fill="black", width=thickness)
+            y += gap
+        return y + c["gap_after"]
+
+    def _draw_barcode(self, img: Image.Image, draw: ImageDraw.ImageDraw, c: dict, value: str):
+        from label_generator import barcode_bitmap
+
+        bars_img = barcode_bitmap(value or " ", c["max_w"], c["max_h"], native=self.native,
+                                  symbology=c["symbology"], dpi=self.dpi)
+        if bars_img is not None:
+            bw, bh = bars_img.size
+            if bw > c["max_w"] or bh > c["max_h"]:
+                # never paste past the zone (or off the label); squeeze it to fit
+                scale = min(c["max_w"] / bw, c["max_h"] / bh)
+                bw, bh = max(1, int(bw * scale)), max(1, int(bh * scale))
+                bars_img = bars_img.convert("L").resize((bw, bh), Image.Resampling.LANCZOS)
+            img.paste(bars_img, ((self.px_w - bw) // 2, c["y"] + (c["max_h"] - bh) // 2))
+            return
+        # no barcode backend: a placeholder bar pattern in a frame
+        bx, by = (self.px_w - c["max_w"]) // 2, c["y"]
+        draw.rectangle([bx, by, bx + c["max_w"], by + c["max_h"]], outline="black", width=max(1, int(self.px_h * 0.006)))
+        bars = 42
+        bar_w = max(2, c["max_w"] // (bars * 2))
+        gap = max(1, (c["max_w"] - bars * bar_w) // (bars + 1))
+        x = bx + gap
+        for _ in range(bars):
+            draw.rectangle([x, by + int(c["max_h"] * 0.05), x + bar_w, by + int(c["max_h"] * 0.95)], fill="black")
+            x += bar_w + gap
+
+    def render(self, row) -> Image.Image:
+        values = field_values(row)
+        img = self.base.copy()
+        draw = ImageDraw.Draw(img)
+        y = self.padding_top
+        for c in self.blocks:
+            value = values.get(c["field"])
+            if value is None:
+                value = str(row.get(c["field"], "") or "").strip()
+            if c["type"] == "barcode":
+                with timer("label.barcode"):
+                    self._draw_barcode(img, draw, c, value)
+            else:
+                with timer("label.text"):
+                    y = self._draw_text(draw, c, value, y)
+        return img
+
+
+@lru_cache(maxsize=32)
+def _compile(name: str, key: str, px_w: int, px_h: int, native: bool, dpi: int) -> CompiledTemplate:
+    with timer("template.compile"):
+        return CompiledTemplate(get_template(name), px_w, px_h, native, dpi)
+
+
+def compile_template(name: Optional[str], px_w: int, px_h: int, native: bool = False,
+                     dpi: int = 300) -> CompiledTemplate:
+    """Compiled template for one raster size; cached, and recompiled after the template changes."""
+    name = name or DEFAULT_TEMPLATE
+    return _compile(name, template_key(name), int(px_w), int(px_h), bool(native), int(dpi))
+
+
+
+def field_values(row) -> dict:
+    """The named label fields: explicit Flavour/Strength win over the Product brackets."""
+    from product_fields import label_fields
+
+    raw_product = str(row.get("Product", "") or "").strip()
+    cleaned, flavour, strength = label_fields(row)
+    return {
+        "product": cleaned or raw_product,
+        "flavour": (flavour or "").strip(),
+        "strength": (strength or "").strip(),
+        "sku": str(row.get("Sku", "") or "").strip(),
+    }
+
@@ -10,10 +10,14 @@
     "# stock_dashboard.py\n",
     "import streamlit as st\n",
     "import pandas as pd\n",
-    "import plotly.express as px\n",
     "import os\n",
     "import datetime as dt\n",
-    "from thefuzz import fuzz\n",
+    "\n",
+    "from startup_profile import lazy_module\n",
+    "\n",
+    "# heavy imports load on first use (first chart / first fuzzy search)\n",
+    "px = lazy_module(\"plotly.express\")\n",
+    "fuzz = lazy_module(\"thefuzz.fuzz\")\n",
     "\n",
     "# --- Page Config ---\n",
     "st.set_page_config(page_title=\"Warehouse Stock Dashboard\", layout=\"wide\")\n",
@@ -10,10 +10,13 @@
     "# daily_report.py\n",
     "import streamlit as st\n",
     "import pandas as pd\n",
-    "import plotly.express as px\n",
     "from datetime import datetime\n",
     "import os\n",
     "\n",
+    "from startup_profile import lazy_module\n",
+    "\n",
+    "px = lazy_module(\"plotly.express\")  # loaded on first chart\n",
+    "\n",
     "# --- Page Config ---\n",
     "st.set_page_config(page_title=\"Daily Delivery Report\", layout=\"wide\")\n",
     "\n",
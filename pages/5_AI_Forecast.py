@@ -79,95 +79,120 @@
     "# ai_sales_forecast.py\n",
     "import streamlit as st\n",
     "import pandas as pd\n",
-    "import plotly.express as px\n",
     "import os\n",
-    "from prophet import Prophet\n",
+    "import time\n",
+    "\n",
+    "from fast_forecast import forecast_all, product_frame, trend_table\n",
+    "from forecast_batch import FORECAST_DIR, FORECAST_PERIODS, daily_sales_hash, load_batch_results, run_batch\n",
+    "from sales_ingest import SalesIngestor\n",
+    "from startup_profile import lazy_module\n",
+    "\n",
+    "px = lazy_module(\"plotly.express\")  # loaded on first chart\n",
     "\n",
     "st.set_page_config(page_title=\"🤖 AI Sales Forecast\", layout=\"wide\")\n",
     "st.title(\"📈 AI Forecast – Vape Sales Movement Trends\")\n",
     "st.caption(\"Forecasts next 7 days of sales and identifies fast, stable, or slow-moving products.\")\n",
     "\n",
     "# ---------- Load Sales Data ----------\n",
-    "# Use your actual data directory\n",
-    "DATA_DIR = \"/Users/anandhu/Downloads/Barcode Printer/data/sales_reports\"\n",
+    "# Folder comes from $SALES_DATA_DIR (default: data/sales_reports in this repo).\n",
+    "# The ingestor is kept per server process and only parses files it has not seen,\n",
+    "# so a rerun just stats the folder.\n",
+    "@st.cache_resource\n",
+    "def _sales_ingestor() -> SalesIngestor:\n",
+    "    return SalesIngestor()\n",
     "\n",
-    "if not os.path.exists(DATA_DIR):\n",
-    "    st.error(f\"❌ The folder '{DATA_DIR}' does not exist.\")\n",
-    "    st.stop()\n",
     "\n",
-    "csv_files = [os.path.join(DATA_DIR, f) for f in os.listdir(DATA_DIR) if f.endswith(\".csv\")]\n",
+    "ingestor = _sales_ingestor()\n",
     "\n",
-    "if not csv_files:\n",
-    "    st.error(\"⚠️ No sales data found. Please make sure there are CSV files in the folder.\")\n",
+    "if not os.path.isdir(ingestor.data_dir):\n",
+    "    st.error(f\"❌ The folder '{ingestor.data_dir}' does not exist. Set SALES_DATA_DIR to your sales reports folder.\")\n",
     "    st.stop()\n",
     "\n",
-    "# Combine all CSVs into one dataframe\n",
-    "df_list = []\n",
-    "for f in csv_files:\n",
-    "    try:\n",
-    "        # Extract date from filename like 'sales_2025-10-25.csv'\n",
-    "        date_str = os.path.basename(f)\n",
-    "        date_match = None\n",
-    "        for pattern in [r\"sales_(\\d{4}-\\d{2}-\\d{2})\", r\"(\\d{4}-\\d{2}-\\d{2})\"]:\n",
-    "            import re\n",
-    "            m = re.search(pattern, date_str)\n",
-    "            if m:\n",
-    "                date_match = m.group(1)\n",
-    "                break\n",
-    "\n",
-    "        if not date_match:\n",
-    "            st.warning(f\"⚠️ Skipping file without date pattern: {f}\")\n",
-    "            continue\n",
-    "\n",
-    "        df = pd.read_csv(f)\n",
-    "        df[\"Date\"] = pd.to_datetime(date_match)\n",
-    "        df_list.append(df)\n",
-    "\n",
-    "    except Exception as e:\n",
-    "        st.warning(f\"⚠️ Error reading {f}: {e}\")\n",
-    "\n",
-    "if not df_list:\n",
-    "    st.error(\"⚠️ No valid sales files loaded.\")\n",
-    "    st.stop()\n",
+    "daily_sales = ingestor.refresh()\n",
+    "for w in ingestor.warnings:\n",
+    "    st.warning(f\"⚠️ {w}\")\n",
     "\n",
-    "data = pd.concat(df_list, ignore_index=True)\n",
-    "\n",
-    "# ---------- Clean Data ----------\n",
-    "if \"Product\" not in data.columns or \"Sales_Units\" not in data.columns:\n",
-    "    st.error(\"❌ Missing required columns: 'Product' and 'Sales_Units'.\")\n",
+    "if daily_sales.empty:\n",
+    "    st.error(\"⚠️ No sales data found. Please make sure there are sales_YYYY-MM-DD.csv files in the folder.\")\n",
     "    st.stop()\n",
     "\n",
-    "data[\"Sales_Units\"] = pd.to_numeric(data[\"Sales_Units\"], errors=\"coerce\").fillna(0)\n",
-    "data = data.dropna(subset=[\"Product\"])\n",
-    "daily_sales = data.groupby([\"Date\", \"Product\"], as_index=False)[\"Sales_Units\"].sum()\n",
-    "\n",
     "# ---------- Show Recent Data ----------\n",
     "st.markdown(\"### 🧾 Recent Sales Data (Last 10 Days)\")\n",
     "st.dataframe(daily_sales.sort_values(\"Date\").tail(10))\n",
     "\n",
+    "# ---------- Forecast Engine ----------\n",
+    "engine = st.radio(\n",
+    "    \"Forecast engine\",\n",
+    "    [\"⚡ Fast (NumPy, all products)\", \"🔮 Prophet (batch)\"],\n",
+    "    horizontal=True,\n",
+    "    help=\"Fast mode fits seasonal naive / exponential smoothing / Holt-Winters for every product \"\n",
+    "         \"in one vectorized pass and picks the best model per product.\",\n",
+    ")\n",
+    "fast_mode = engine.startswith(\"⚡\")\n",
+    "\n",
+    "\n",
+    "@st.cache_data(show_spinner=False)\n",
+    "def _fast_forecast(daily_sales: pd.DataFrame) -> dict:\n",
+    "    return forecast_all(daily_sales, horizon=FORECAST_PERIODS)\n",
+    "\n",
+    "\n",
+    "if fast_mode:\n",
+    "    t0 = time.perf_counter()\n",
+    "    fast = _fast_forecast(daily_sales)\n",
+    "    trends = trend_table(fast)\n",
+    "    st.caption(f\"Fast engine: {len(trends)} products forecast in {time.perf_counter() - t0:.3f}s\")\n",
+    "else:\n",
+    "    # Forecasts are fitted for all products by forecast_batch.py (process pool) and\n",
+    "    # only looked up here, so changing the selected product never re-fits a model.\n",
+    "    batch = load_batch_results(FORECAST_DIR)\n",
+    "\n",
+    "    if batch is None:\n",
+    "        st.info(\"No batch forecast found yet. Run it here or from the command line: `python forecast_batch.py`.\")\n",
+    "    elif batch[\"meta\"].get(\"data_hash\") != daily_sales_hash(daily_sales):\n",
+    "        st.warning(f\"⚠️ Sales data changed since the last batch run ({batch['meta'].get('generated_at')}). Re-run to refresh.\")\n",
+    "\n",
+    "    if st.button(\"🔄 Run batch forecast for all products\"):\n",
+    "        progress_bar = st.progress(0.0)\n",
+    "\n",
+    "        def _on_progress(done, total, product):\n",
+    "            progress_bar.progress(done / max(1, total), text=f\"{done}/{total} – {product}\")\n",
+    "\n",
+    "        with st.spinner(\"Forecasting all products...\"):\n",
+    "            run_batch(daily_sales, out_dir=FORECAST_DIR, progress=_on_progress)\n",
+    "        st.rerun()\n",
+    "\n",
+    "    if batch is None:\n",
+    "        st.stop()\n",
+    "\n",
+    "    meta = batch[\"meta\"]\n",
+    "    trends = batch[\"trends\"]\n",
+    "    st.caption(\n",
+    "        f\"Batch generated {meta.get('generated_at')} – {meta.get('ok', 0)} ok, \"\n",
+    "        f\"{meta.get('failed', 0)} failed, {meta.get('skipped', 0)} skipped in {meta.get('wall_seconds', 0)}s\"\n",
+    "    )\n",
+    "    if \"model_store\" in meta:\n",
+    "        ms = meta[\"model_store\"]\n",
+    "        st.caption(\n",
+    "            f\"Model store: {ms['hits']} reused, {ms['misses']} refit ({ms['warm_starts']} warm-started) – \"\n",
+    "            f\"hit rate {ms['hit_rate']:.0%}, {ms['entries']} models stored\"\n",
+    "        )\n",
+    "\n",
     "# ---------- Product Selection ----------\n",
     "products = sorted(daily_sales[\"Product\"].unique())\n",
     "selected_product = st.selectbox(\"Select a product to forecast\", products)\n",
     "\n",
-    "prod_data = daily_sales[daily_sales[\"Product\"] == selected_product][[\"Date\", \"Sales_Units\"]]\n",
-    "prod_data = prod_data.rename(columns={\"Date\": \"ds\", \"Sales_Units\": \"y\"})\n",
-    "\n",
-    "if len(prod_data) < 5:\n",
-    "    st.warning(\"⚠️ Not enough data points to forecast reliably.\")\n",
-    "    st.stop()\n",
-    "\n",
-    "# ---------- Prophet Forecast ----------\n",
-    "m = Prophet(weekly_seasonality=True, daily_seasonality=False, seasonality_mode=\"additive\")\n",
-    "m.fit(prod_data)\n",
-    "future = m.make_future_dataframe(periods=7)\n",
-    "forecast = m.predict(future)\n",
-    "\n",
-    "# ---------- Rolling Average Adjustment ----------\n",
-    "forecast_plot = forecast[[\"ds\", \"yhat\"]].merge(prod_data, on=\"ds\", how=\"left\")\n",
-    "forecast_plot[\"Adj_Forecast\"] = (\n",
-    "    0.7 * forecast_plot[\"yhat\"]\n",
-    "    + 0.3 * forecast_plot[\"y\"].rolling(window=3, min_periods=1).mean().fillna(method=\"bfill\")\n",
-    ")\n",
+    "if fast_mode:\n",
+    "    forecast_plot = product_frame(fast, selected_product)\n",
+    "    if forecast_plot is None:\n",
+    "        st.warning(\"⚠️ No forecast available for this product.\")\n",
+    "        st.stop()\n",
+    "else:\n",
+    "    forecast_plot = batch[\"forecasts\"][batch[\"forecasts\"][\"Product\"] == selected_product]\n",
+    "    if forecast_plot.empty:\n",
+    "        row = batch[\"report\"][batch[\"report\"][\"Product\"] == selected_product]\n",
+    "        reason = row[\"Error\"].iloc[0].splitlines()[0] if not row.empty and row[\"Error\"].iloc[0] else \"not in last batch run\"\n",
+    "        st.warning(f\"⚠️ No forecast available for this product: {reason}\")\n",
+    "        st.stop()\n",
     "\n",
     "# ---------- Visualization ----------\n",
     "fig = px.line(\n",
@@ -181,32 +206,25 @@
     "st.plotly_chart(fig, use_container_width=True)\n",
     "\n",
     "# ---------- Trend Classification ----------\n",
-    "last_actual = forecast_plot[\"y\"].dropna().iloc[-1]\n",
-    "next_forecast = forecast_plot[\"Adj_Forecast\"].iloc[-1]\n",
-    "\n",
-    "trend = (\n",
-    "    \"⚡ Fast Moving\" if next_forecast > last_actual * 1.1\n",
-    "    else \"🐢 Slow Moving\" if next_forecast < last_actual * 0.9\n",
-    "    else \"➖ Stable\"\n",
-    ")\n",
+    "trend_row = trends[trends[\"Product\"] == selected_product]\n",
+    "trend = trend_row[\"Trend\"].iloc[0] if not trend_row.empty else \"➖ Stable\"\n",
     "st.metric(label=\"Forecasted Product Trend\", value=trend)\n",
+    "if fast_mode and not trend_row.empty:\n",
+    "    st.caption(f\"Model selected for this product: {trend_row['Model'].iloc[0]}\")\n",
     "\n",
     "# ---------- Multi-Product Trend Summary ----------\n",
     "st.markdown(\"### 📈 Fastest & Slowest Moving Products\")\n",
+    "st.caption(\"Ranked by forecasted change over the next 7 days.\")\n",
+    "st.dataframe(trends)\n",
     "\n",
-    "summary = (\n",
-    "    daily_sales.groupby(\"Product\", as_index=False)[\"Sales_Units\"].mean()\n",
-    "    .sort_values(\"Sales_Units\", ascending=False)\n",
-    ")\n",
-    "summary[\"Movement\"] = [\n",
-    "    \"⚡ Fast\" if i < len(summary) * 0.3 else \"🐢 Slow\" if i > len(summary) * 0.7 else \"➖ Stable\"\n",
-    "    for i in range(len(summary))\n",
-    "]\n",
-    "\n",
-    "st.dataframe(summary)\n",
+    "if not fast_mode:\n",
+    "    with st.expander(\"Batch run report (per-product timing and failures)\"):\n",
+    "        st.dataframe(batch[\"report\"][[\"Product\", \"Points\", \"Status\", \"Model\", \"Seconds\"]])\n",
+    "        for _, r in batch[\"report\"][batch[\"report\"][\"Status\"] == \"failed\"].iterrows():\n",
+    "            st.error(f\"{r['Product']}: {r['Error']}\")\n",
     "\n",
     "st.markdown(\"---\")\n",
-    "st.caption(\"AI Forecast v1.0 | Prophet + Rolling Average | Based on daily sales data\")"
+    "st.caption(\"AI Forecast v1.2 | Prophet batch or NumPy fast engine + Rolling Average | Based on daily sales data\")"
    ]
   },
   {
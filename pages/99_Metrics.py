@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# 99_Metrics.py
+"""
+Stage timings collected by instrumentation.py in this server process, and
+recent cProfile/tracemalloc captures from profile_capture.py.
+Not linked from the launcher; open it from the sidebar or /Metrics.
+"""
+import pandas as pd
+import streamlit as st
+
+import instrumentation
+import profile_capture
+
+st.set_page_config(page_title="Metrics", layout="wide")
+st.title("Pipeline metrics")
+
+rows = instrumentation.snapshot()
+if not instrumentation.enabled():
+    st.info(f"Instrumentation is off. Unset {instrumentation.METRICS_ENV} (or set it to 1) and restart the app.")
+elif not rows:
+    st.info("No timings yet. Upload a PO or generate labels, then come back.")
+else:
+    df = pd.DataFrame(rows).sort_values("total_ms", ascending=False)
+    st.caption("Times in milliseconds since the server started (or since the last reset). p50/p95 are bucket estimates.")
+    st.dataframe(df, use_container_width=True, hide_index=True)
+    st.bar_chart(df.set_index("stage")["total_ms"])
+
+    text = instrumentation.prometheus_text()
+    with st.expander("Prometheus text exposition"):
+        st.code(text, language="text")
+        st.download_button("Download metrics.prom", text, file_name="metrics.prom", mime="text/plain")
+
+    if st.button("Reset timings"):
+        instrumentation.reset()
+        st.rerun()
+
+caches = instrumentation.cache_stats()
+if caches:
+    st.subheader("Caches")
+    st.caption("Counters since the server started. Render workers in other processes keep their own caches.")
+    st.dataframe(pd.DataFrame(caches), use_container_width=True, hide_index=True)
+
+# ---------------------------
+# Profiles
+# ---------------------------
+st.subheader("Profile captures")
+captures = profile_capture.list_captures(limit=10)
+if not captures:
+    st.caption(f"No captures yet. Open the label page with ?{profile_capture.QUERY_PARAM}=rerun or "
+               f"?{profile_capture.QUERY_PARAM}=job, or set {profile_capture.PROFILE_ENV}.")
+for cap in captures:
+    title = (f"{cap['started']} · {cap['kind']} · {cap['po_name'] or 'no PO'} · {cap['rows'] or 0} rows · "
+             f"{cap['wall_s']:.2f}s · peak {cap['peak_traced_kib'] / 1024:.1f} MiB")
+    with st.expander(title):
+        if cap.get("note"):
+            st.caption(cap["note"])
+        st.markdown("**Top functions (cumulative)**")
+        st.dataframe(pd.DataFrame(cap["top_functions"]), use_container_width=True, hide_index=True)
+        st.markdown("**Top allocation sites (growth during the capture)**")
+        st.dataframe(pd.DataFrame(cap["top_allocations"]), use_container_width=True, hide_index=True)
+        st.caption(f"{cap['path']}  (profile.prof for snakeviz/pstats, top.txt for the full listing)")
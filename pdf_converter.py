@@ -9,6 +9,7 @@ import pandas as pd
 import os
 import streamlit as st
 import re
+from instrumentation import timed
 
 def clean_header(headers):
     headers = [str(h).strip() if h else "" for h in headers]
@@ -37,6 +38,7 @@ def ensure_unique_columns(columns):
             unique.append(c)
     return unique
 
+@timed("pdf.extract_tables")
 def read_pdf_with_plumber(pdf_path):
     """
     Read tables from a PDF using pdfplumber.
@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# po_watcher.py
+"""
+Hot-folder watcher: new or changed purchase orders dropped into the watched
+folders are turned into labels without anyone opening the UI.
+
+    python -m po_watcher                      # tmp_uploads/
+    python -m po_watcher --format pdf --printer Zebra_GK420d
+    python -m po_watcher some/dir --poll      # force the polling backend
+
+How it works
+  - Change detection uses inotify (inotify_simple, if installed) and falls
+    back to polling os.scandir() every --interval seconds.
+  - A file is only picked up once its size and mtime have not changed for
+    --settle seconds, so half-copied uploads and slow SMB writes are skipped
+    until they are complete.
+  - Ready files are moved to <dir>/processing/ and run through
+    label_cli.process_po() on a bounded thread pool (--workers POs at a time,
+    each rendering with --render-jobs processes). Once the pool is full, new
+    files wait in the folder.
+  - Afterwards the PO, and any _extracted.csv written next to it, moves to
+    <dir>/done/ or <dir>/failed/ with a timestamp prefix. One JSON line per PO
+    is appended to the manifest (default data/po_watch/manifest.jsonl).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import label_cli
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# data/po_uploads holds the sample POs kept in the repo; watch it only when named explicitly
+DEFAULT_WATCH_DIRS = [os.path.join(BASE_DIR, "tmp_uploads")]
+DEFAULT_MANIFEST = os.path.join(BASE_DIR, "data", "po_watch", "manifest.jsonl")
+DEFAULT_OUT_DIR = os.path.join(BASE_DIR, "labels", "watch")
+
+PO_EXTENSIONS = (".csv", ".xlsx", ".xls", ".pdf")
+# files the pipeline itself writes next to a PO
+DERIVED_SUFFIXES = ("_extracted.csv", "_converted.csv")
+PROCESSING, DONE, FAILED = "processing", "done", "failed"
+
+SETTLE_SECONDS = 2.0
+POLL_INTERVAL = 1.0
+
+
+def log(msg: str):
+    print(f"{datetime.now():%H:%M:%S} {msg}", file=sys.stderr, flush=True)
+
+
+def is_po_file(name: str) -> bool:
+    low = name.lower()
+    return (
+        low.endswith(PO_EXTENSIONS)
+        and not low.endswith(DERIVED_SUFFIXES)
+        and not name.startswith((".", "~$"))  # hidden files, Office lock files
+    )
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _move(src: str, dest_dir: str, stamp: str) -> Optional[str]:
+    if not os.path.exists(src):
+        return None
+    os.makedirs(dest_dir, exist_ok=True)
+    dest = os.path.join(dest_dir, f"{stamp}_{os.path.basename(src)}")
+    shutil.move(src, dest)
+    return dest
+
+
+# ---------------------------
+# Change sources
+# ---------------------------
+class PollingSource:
+    """Rescans the folders; wait() just sleeps."""
+    name = "polling"
+
+    def __init__(self, dirs: List[str], interval: float = POLL_INTERVAL):
+        self.dirs = dirs
+        self.interval = interval
+
+    def wait(self, timeout: float) -> bool:
+        time.sleep(min(timeout, self.interval))
+        return True  # always rescan
+
+    def close(self):
+        pass
+
+
+class InotifySource:
+    """Blocks until something is written or moved into a folder (Linux only)."""
+    name = "inotify"
+
+    def __init__(self, dirs: List[str]):
+        from inotify_simple import INotify, flags
+
+        self._inotify = INotify()
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.MODIFY
+        for d in dirs:
+            self._inotify.add_watch(d, mask)
+
+    def wait(self, timeout: float) -> bool:
+        return bool(self._inotify.read(timeout=int(timeout * 1000)))
+
+    def close(self):
+        self._inotify.close()
+
+
+def make_source(dirs: List[str], force_poll: bool = False, interval: float = POLL_INTERVAL):
+    if not force_poll:
+        try:
+            return InotifySource(dirs)
+        except Exception as e:  # not installed, not Linux, or out of watches
+            log(f"inotify unavailable ({type(e).__name__}: {e}); polling every {interval}s")
+    return PollingSource(dirs, interval)
+
+
+# ---------------------------
+# Watcher
+# ---------------------------
+class POWatcher:
+    def __init__(
+        self,
+        dirs: List[str],
+        manifest_path: str = DEFAULT_MANIFEST,
+        out_root: str = DEFAULT_OUT_DIR,
+        workers: int = 2,
+        settle: float = SETTLE_SECONDS,
+        pipeline_kwargs: Optional[dict] = None,
+        skip_existing: bool = False,
+        force_poll: bool = False,
+        interval: float = POLL_INTERVAL,
+    ):
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        for d in self.dirs:
+            os.makedirs(d, exist_ok=True)
+            self._recover(d)
+        self.manifest_path = manifest_path
+        self.out_root = out_root
+        self.settle = settle
+        self.pipeline_kwargs = dict(pipeline_kwargs or {})
+        self.source = make_source(self.dirs, force_poll, interval)
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="po")
+        self._slots = threading.BoundedSemaphore(workers)
+        self._manifest_lock = threading.Lock()
+        self._pending: Dict[str, Tuple[Tuple[int, int], float]] = {}  # path -> (stat key, first seen unchanged)
+        self._ignored: Dict[str, Tuple[int, int]] = {}
+        self._stop = threading.Event()
+        self.processed = 0
+
+        if skip_existing:
+            for path in self._scan():
+                self._ignored[path] = _stat_key(path)
+
+    def _recover(self, d: str):
+        """Put back POs left in processing/ by a crashed run so they are retried."""
+        pdir = os.path.join(d, PROCESSING)
+        if not os.path.isdir(pdir):
+            return
+        for name in os.listdir(pdir):
+            if is_po_file(name):
+                shutil.move(os.path.join(pdir, name), os.path.join(d, name))
+                log(f"requeued {name} from {pdir}")
+
+    def _scan(self) -> List[str]:
+        found = []
+        for d in self.dirs:
+            try:
+                with os.scandir(d) as it:
+                    found.extend(e.path for e in it if e.is_file() and is_po_file(e.name))
+            except FileNotFoundError:
+                continue
+        return found
+
+    def _ready_files(self, now: float) -> List[str]:
+        """Files whose size/mtime have been stable for self.settle seconds."""
+        ready, seen = [], set()
+        for path in self._scan():
+            seen.add(path)
+            key = _stat_key(path)
+            if key is None:
+                continue
+            if self._ignored.get(path) == key:
+                continue
+            self._ignored.pop(path, None)  # changed since startup: process it
+            prev = self._pending.get(path)
+            if prev is None or prev[0] != key:
+                self._pending[path] = (key, now)
+            elif now - prev[1] >= self.settle:
+                ready.append(path)
+        for path in list(self._pending):
+            if path not in seen:
+                del self._pending[path]
+        return ready
+
+    def _dispatch(self, path: str) -> bool:
+        if not self._slots.acquire(blocking=False):
+            return False  # pool full: leave it in the folder for the next pass
+        d = os.path.dirname(path)
+        work_dir = os.path.join(d, PROCESSING)
+        os.makedirs(work_dir, exist_ok=True)
+        work_path = os.path.join(work_dir, os.path.basename(path))
+        try:
+            os.replace(path, work_path)  # claim it (same filesystem, atomic)
+        except OSError as e:
+            self._slots.release()
+            # leave it alone until the file changes, instead of retrying every pass
+            self._ignored[path] = _stat_key(path)
+            log(f"could not claim {path}: {e}")
+            return False
+        self._pending.pop(path, None)
+        self._pool.submit(self._process, work_path, d)
+        return True
+
+    def _process(self, work_path: str, watch_dir: str):
+        name = os.path.basename(work_path)
+        started = time.time()
+        entry = {"file": name, "dir": watch_dir, "started": datetime.fromtimestamp(started).isoformat(timespec="seconds")}
+        try:
+            entry["size"] = os.path.getsize(work_path)
+            entry["sha1"] = file_sha1(work_path)
+            log(f"processing {name}")
+            res = label_cli.process_po(
+                work_path, out_root=self.out_root,
+                log=lambda msg: log(f"  {name}: {msg}"), **self.pipeline_kwargs,
+            )
+            entry.update({
+                "exit_code": res["exit_code"], "error": res["error"], "rows": res["rows"],
+                "labels": res["labels"], "rendered": sum(res["copies"]), "out_dir": res["out_dir"],
+                "outputs": res["outputs"] if len(res["outputs"]) == 1 else [],
+                "stages_ms": {n: round(s * 1000, 1) for n, s in res["stages"]},
+            })
+        except Exception as e:
+            entry.update({"exit_code": -1, "error": f"{type(e).__name__}: {e}"})
+        finally:
+            ok = entry.get("exit_code") == label_cli.EXIT_OK
+            entry["status"] = DONE if ok else FAILED
+            entry["seconds"] = round(time.time() - started, 3)
+            stamp = datetime.fromtimestamp(started).strftime("%Y%m%d_%H%M%S")
+            dest_dir = os.path.join(watch_dir, entry["status"])
+            try:
+                entry["moved_to"] = _move(work_path, dest_dir, stamp)
+                stem = os.path.splitext(work_path)[0]
+                for suffix in DERIVED_SUFFIXES:
+                    _move(stem + suffix, dest_dir, stamp)
+            except OSError as e:
+                entry["error"] = entry.get("error") or f"move failed: {e}"
+            self._write_manifest(entry)
+            self.processed += 1
+            self._slots.release()
+            msg = f"{entry.get('labels', 0)} labels" if ok else entry.get("error", "")
+            log(f"{entry['status']}: {name} in {entry['seconds']}s ({msg})")
+
+    def _write_manifest(self, entry: dict):
+        with self._manifest_lock:
+            os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+            with open(self.manifest_path, "a") as fh:
+                fh.write(json.dumps(entry, default=str) + "\n")
+
+    def run_once(self) -> int:
+        """One detection pass; returns the number of POs dispatched."""
+        return sum(self._dispatch(p) for p in self._ready_files(time.monotonic()))
+
+    def run(self, stop_after: Optional[int] = None):
+        log(f"watching {', '.join(self.dirs)} ({self.source.name}, settle {self.settle}s)")
+        try:
+            while not self._stop.is_set():
+                self.run_once()
+                if stop_after is not None and self.processed >= stop_after:
+                    break
+                # while files are settling, wake up in time to re-check them
+                self.source.wait(self.settle / 2 if self._pending else 5.0)
+        except KeyboardInterrupt:
+            log("stopping")
+        finally:
+            self.close()
+
+    def drain(self) -> int:
+        """Process every PO currently in the folders (no settle wait), then close."""
+        pending = self._scan()
+        dispatched = 0
+        while pending:
+            dispatched += sum(self._dispatch(p) for p in pending)
+            # what is left either waits for a slot or could not be claimed (skip those)
+            pending = [p for p in pending if os.path.exists(p) and self._ignored.get(p) != _stat_key(p)]
+            if pending:
+                time.sleep(0.2)  # pool full: wait for a slot
+        self.close()
+        return dispatched
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self.source.close()
+
+
+def read_manifest(path: str = DEFAULT_MANIFEST, limit: Optional[int] = None) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as fh:
+        rows = [json.loads(line) for line in fh if line.strip()]
+    return rows[-limit:] if limit else rows
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m po_watcher", description="Turn POs dropped into folders into labels.")
+    ap.add_argument("dirs", nargs="*", help="folders to watch (default: tmp_uploads/)")
+    ap.add_argument("--workers", type=int, default=2, help="POs processed at once (default 2)")
+    ap.add_argument("--render-jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                    help="render processes per PO")
+    ap.add_argument("--settle", type=float, default=SETTLE_SECONDS, help="seconds a file must be unchanged")
+    ap.add_argument("--interval", type=float, default=POLL_INTERVAL, help="polling interval in seconds")
+    ap.add_argument("--poll", action="store_true", help="use polling even if inotify is available")
+    ap.add_argument("--skip-existing", action="store_true", help="ignore files already present at startup")
+    ap.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    ap.add_argument("--out", default=DEFAULT_OUT_DIR, help="label output root")
+    ap.add_argument("--case-size", type=int, default=60)
+    ap.add_argument("--format", choices=["png", "pdf", "zpl"], default="pdf")
+    ap.add_argument("--printer", nargs="?", const="", default=None,
+                    help="print each PO's output (no name = default printer)")
+    ap.add_argument("--once", action="store_true", help="process what is there now, then exit")
+    args = ap.parse_args(argv)
+    if args.workers < 1 or args.render_jobs < 1:
+        ap.error("--workers and --render-jobs must be >= 1")
+
+    watcher = POWatcher(
+        args.dirs or DEFAULT_WATCH_DIRS,
+        manifest_path=args.manifest,
+        out_root=args.out,
+        workers=args.workers,
+        settle=0.0 if args.once else args.settle,
+        pipeline_kwargs={"case_size": args.case_size, "fmt": args.format,
+                         "jobs": args.render_jobs, "printer": args.printer},
+        skip_existing=args.skip_existing,
+        force_poll=args.poll or args.once,
+        interval=args.interval,
+    )
+    if args.once:
+        log(f"processed {watcher.drain()} file(s)")
+        return 0
+    watcher.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
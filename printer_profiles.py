@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# printer_profiles.py
+"""
+Named printer profiles, so labels are rendered at the printer's own
+resolution instead of 300 dpi rasters that the driver rescales.
+
+A profile is a plain dict:
+  name        "zebra-203-60mm"
+  description shown in the pickers
+  dpi         nominal resolution (203, 300, 600); written into PNG metadata
+  dpmm        dots per mm (8 / 12 / 24 for 203 / 300 / 600 dpi heads)
+  media_mm    (width, length) of the label stock in mm
+  width_dots  print width in dots (^PW); defaults to media width x dpmm
+  darkness    0-30 (ZPL ~SD), None leaves the printer's setting alone
+  formats     output formats the device takes ("zpl", "pdf", "png")
+  printer     CUPS queue name, None for the default queue
+
+label_px(profile) is the exact device raster. Anything that caches rendered
+labels should include profile_key(profile) in its key so renders for two
+printers never mix.
+
+Extra or overriding profiles can be put in printer_profiles.json next to this
+file (or the file named by BARCODE_PRINTER_PROFILES): {"name": {...}, ...}.
+"""
+import os
+import json
+from typing import List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILES_FILE = os.path.join(BASE_DIR, "printer_profiles.json")
+PROFILES_ENV = "BARCODE_PRINTER_PROFILES"
+
+DEFAULT_PROFILE = "office-300-100mm"
+
+# Zebra heads are specified in dots/mm; "203 dpi" is 8 dots/mm.
+DPMM = {203: 8, 300: 12, 600: 24}
+
+
+def _thermal(mm: int, dpi: int = 203) -> dict:
+    return {
+        "description": f"Thermal {dpi} dpi, {mm} x {mm} mm",
+        "dpi": dpi,
+        "dpmm": DPMM[dpi],
+        "media_mm": (mm, mm),
+        "darkness": 15,
+        "formats": ("zpl", "png", "pdf"),
+        "printer": None,
+    }
+
+
+BUILTIN_PROFILES = {
+    # what create_label_image has always produced (10 cm at 300 dpi), for office printers
+    DEFAULT_PROFILE: {
+        "description": "Office printer, 100 x 100 mm at 300 dpi",
+        "dpi": 300,
+        "dpmm": 300 / 25.4,
+        "media_mm": (100, 100),
+        "darkness": None,
+        "formats": ("png", "pdf"),
+        "printer": None,
+    },
+    **{f"zebra-203-{mm}mm": _thermal(mm) for mm in (40, 50, 60, 70, 80)},
+    "zebra-300-60mm": _thermal(60, 300),
+}
+
+_loaded = None
+
+
+def _load() -> dict:
+    global _loaded
+    if _loaded is None:
+        profiles = {name: dict(p, name=name) for name, p in BUILTIN_PROFILES.items()}
+        path = os.environ.get(PROFILES_ENV) or PROFILES_FILE
+        if os.path.exists(path):
+            with open(path) as fh:
+                for name, p in json.load(fh).items():
+                    base = profiles.get(name, {})
+                    profiles[name] = normalize({**base, **p, "name": name})
+        _loaded = {name: normalize(p) for name, p in profiles.items()}
+    return _loaded
+
+
+def reload():
+    global _loaded
+    _loaded = None
+    return _load()
+
+
+def normalize(p: dict) -> dict:
+    """Fill derived fields (dpmm from dpi, width_dots from media width) and validate."""
+    p = dict(p)
+    dpi = int(p.get("dpi", 300))
+    if not 72 <= dpi <= 1200:
+        raise ValueError(f"profile {p.get('name')!r}: dpi must be 72-1200")
+    p["dpi"] = dpi
+    p["dpmm"] = float(p.get("dpmm") or DPMM.get(dpi, dpi / 25.4))
+    w_mm, h_mm = p.get("media_mm") or (100, 100)
+    p["media_mm"] = (float(w_mm), float(h_mm))
+    p["width_dots"] = int(p.get("width_dots") or round(p["media_mm"][0] * p["dpmm"]))
+    darkness = p.get("darkness")
+    p["darkness"] = None if darkness is None else max(0, min(30, int(darkness)))
+    p["formats"] = tuple(p.get("formats") or ("png",))
+    p.setdefault("printer", None)
+    p.setdefault("description", p.get("name", ""))
+    return p
+
+
+def list_profiles() -> List[dict]:
+    return list(_load().values())
+
+
+def profile_names() -> List[str]:
+    return list(_load())
+
+
+def get_profile(name: Optional[str] = None) -> dict:
+    """Profile by name (the default profile for None/""). Raises KeyError for unknown names."""
+    profiles = _load()
+    name = name or DEFAULT_PROFILE
+    if name not in profiles:
+        raise KeyError(f"unknown printer profile {name!r}; known: {', '.join(profiles)}")
+    return profiles[name]
+
+
+def label_px(profile: dict) -> Tuple[int, int]:
+    """Device raster (width, height) in dots."""
+    length_dots = int(round(profile["media_mm"][1] * profile["dpmm"]))
+    return profile["width_dots"], length_dots
+
+
+def label_cm(profile: dict) -> float:
+    return profile["media_mm"][0] / 10.0
+
+
+def profile_key(profile: Optional[dict]) -> str:
+    """Short stable key for caches: name plus everything that changes the output."""
+    if not profile:
+        return ""
+    w, h = label_px(profile)
+    return f"{profile['name']}:{profile['dpi']}:{w}x{h}:d{profile['darkness']}"
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# product_fields.py
+"""
+One parser for "Product [Flavour / 20mg]" strings.
+
+label_generator, label_app and label_app_table_print used to parse the
+Product column row by row (three slightly different regexes), and every
+label parsed it again while rendering. parse_products() runs str.extract
+over the distinct product strings of a column only, and remembers results
+in a process-wide memo, so a product is parsed once per server process
+however many rows, pages, reruns and labels mention it.
+
+Rules: the last [...] group at the end of the string holds the fields; it
+may span lines. Its parts are split on / | - ; and empty parts are dropped.
+The first part is the flavour and the second the strength.
+"""
+import re
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+BRACKET_RE = re.compile(r"^(?P<product>.*?)\s*\[(?P<inside>[^\[\]]*)\]\s*$", re.S)
+SPLIT_RE = r"[/\|\-;]"
+MEMO_MAX = 50_000
+
+_memo = {}  # stripped product string -> (product, flavour, strength), "" when absent
+
+
+def _split_inside(inside: str) -> Tuple[str, str]:
+    parts = [" ".join(p.split()) for p in re.split(SPLIT_RE, inside)]
+    parts = [p for p in parts if p]
+    return (parts[0] if parts else "", parts[1] if len(parts) > 1 else "")
+
+
+def _text(value) -> str:
+    if value is None or (isinstance(value, float) and value != value) or value is pd.NA:
+        return ""
+    return str(value).strip()
+
+
+def _remember(keys, parsed):
+    if len(_memo) + len(keys) > MEMO_MAX:
+        _memo.clear()
+    _memo.update(zip(keys, parsed))
+
+
+def parse_product(value) -> Tuple[str, str, str]:
+    """(product, flavour, strength) for one Product value; memoized."""
+    text = _text(value)
+    hit = _memo.get(text)
+    if hit is None:
+        m = BRACKET_RE.match(text)
+        hit = (m.group("product").strip(), *_split_inside(m.group("inside"))) if m else (text, "", "")
+        _remember([text], [hit])
+    return hit
+
+
+@timed("parse.products")
+def parse_products(products: pd.Series) -> pd.DataFrame:
+    """
+    Vectorized parse of a Product column. Returns a frame with columns
+    product, flavour, strength on the same index ("" where absent).
+    """
+    # all Python-level work happens per distinct value; rows are gathered by code
+    codes, uniques = pd.factorize(products, use_na_sentinel=True)
+    keys = [_text(u) for u in uniques]
+    todo = list(dict.fromkeys(k for k in keys if k not in _memo))
+    if todo:
+        extracted = pd.Series(todo, dtype=object).str.extract(BRACKET_RE)
+        matched = extracted["inside"].notna()
+        parsed = []
+        for raw, ok, prod, inside in zip(todo, matched, extracted["product"], extracted["inside"]):
+            parsed.append((prod.strip(), *_split_inside(inside)) if ok else (raw, "", ""))
+        _remember(todo, parsed)
+    # code -1 (missing) picks the trailing blank entry
+    table = np.array([_memo.get(k) or parse_product(k) for k in keys] + [("", "", "")], dtype=object)
+    out = table[codes] if len(codes) else np.empty((0, 3), dtype=object)
+    return pd.DataFrame(out, index=products.index, columns=["product", "flavour", "strength"])
+
+
+def apply_product_fields(df: pd.DataFrame, prefer: str = "explicit", blank_as_na: bool = False) -> pd.DataFrame:
+    """
+    Copy of df with Product cleaned and Flavour/Strength filled from the
+    brackets. prefer="explicit" only fills empty Flavour/Strength cells;
+    prefer="product" lets the bracketed values win. blank_as_na turns empty
+    Flavour/Strength back into pd.NA.
+    """
+    d = df.copy()
+    for c in ("Product", "Flavour", "Strength"):
+        if c not in d.columns:
+            d[c] = pd.NA
+    parsed = parse_products(d["Product"])
+    d["Product"] = parsed["product"].where(parsed["product"] != "", d["Product"])
+    for col, ext in (("Flavour", parsed["flavour"]), ("Strength", parsed["strength"])):
+        if prefer == "product":
+            merged = ext.where(ext != "", d[col])
+        else:
+            current = d[col].map(_text)
+            merged = current.where(current != "", ext)
+        d[col] = merged.replace("", pd.NA) if blank_as_na else merged
+    return d
+
+
+def label_fields(row) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    (product, flavour, strength) for rendering one row: explicit Flavour /
+    Strength columns win, the Product brackets fill the gaps.
+    """
+    product, flavour, strength = parse_product(row.get("Product", ""))
+    return (product,
+            _text(row.get("Flavour")) or flavour or None,
+            _text(row.get("Strength")) or strength or None)
+
+
+def memo_size() -> int:
+    return len(_memo)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# profile_capture.py
+"""
+On-demand cProfile + tracemalloc capture for one Streamlit rerun or one label
+generation job, for "the label page is slow" reports.
+
+Arming a capture
+  - query param: open the page with ?profile=rerun (the next rerun is captured)
+    or ?profile=job (the next "Generate Label Images" job is captured). The
+    param is removed once used, so exactly one capture is taken.
+  - env var:     BARCODE_PROFILE=rerun|job|all captures every rerun and/or job
+    while it is set (for reproducing a slowdown on a test box).
+
+Each capture is written to profiles/<stamp>_<kind>_<po>_<rows>rows/:
+  profile.prof   cProfile data (open with snakeviz or pstats)
+  top.txt        pstats listing by cumulative time
+  meta.json      PO name, row count, wall time, peak traced memory,
+                 top functions and top allocation sites (what the Metrics page shows)
+
+tracemalloc is process-wide, so allocations from other sessions running at
+the same time show up in the capture too. cProfile only sees the thread that
+started the capture; work that thread hands to a thread pool joins the
+capture through current().call() (run_pipeline does this for label renders),
+so times summed across render threads can exceed the wall time.
+"""
+import os
+import io
+import re
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime
+from functools import wraps
+from typing import Callable, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+PROFILE_ENV = "BARCODE_PROFILE"
+QUERY_PARAM = "profile"
+SESSION_KEY = "_profile_capture"
+RERUN, JOB = "rerun", "job"
+
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 15
+TRACE_FRAMES = 10
+
+_trace_lock = threading.Lock()
+_trace_users = 0
+_local = threading.local()
+
+
+def _env_kinds() -> set:
+    raw = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if raw in ("1", "true", "yes", "all"):
+        return {RERUN, JOB}
+    return {k.strip() for k in raw.split(",") if k.strip() in (RERUN, JOB)}
+
+
+def requested(kind: str, query_params=None) -> bool:
+    """Is a capture of this kind armed by the env var or the ?profile= query param?"""
+    if kind in _env_kinds():
+        return True
+    if query_params is None:
+        return False
+    value = str(query_params.get(QUERY_PARAM, "") or "").strip().lower()
+    return value == kind or (kind == RERUN and value in ("1", "true"))
+
+
+def consume(kind: str, query_params):
+    """Disarm a query-param capture once it has been taken."""
+    if query_params is not None and requested(kind, query_params) and kind not in _env_kinds():
+        try:
+            del query_params[QUERY_PARAM]
+        except Exception:
+            pass
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", os.path.splitext(os.path.basename(text or "no-po"))[0]).strip("-")[:40] or "po"
+
+
+def _start_tracing():
+    global _trace_users
+    with _trace_lock:
+        if _trace_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        _trace_users += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing():
+    global _trace_users
+    with _trace_lock:
+        _trace_users = max(0, _trace_users - 1)
+        if _trace_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class Capture:
+    """cProfile (current thread, plus call()ers) + tracemalloc between start() and stop()."""
+
+    def __init__(self, kind: str, po_name: str = "", rows: Optional[int] = None):
+        self.kind = kind
+        self.po_name = po_name
+        self.rows = rows
+        self.note = ""
+        self._profile = cProfile.Profile()
+        self._thread_profiles = {}  # thread ident -> cProfile.Profile for work run through call()
+        self._lock = threading.Lock()
+        self._started = None
+        self._wall = None
+        self._baseline = None
+
+    def start(self) -> "Capture":
+        _start_tracing()
+        self._baseline = tracemalloc.take_snapshot()
+        self._started = datetime.now()
+        self._wall = time.perf_counter()
+        self._profile.enable()
+        _local.capture = self
+        return self
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """fn(*args, **kwargs) profiled on the calling (worker) thread, merged in at stop()."""
+        ident = threading.get_ident()
+        with self._lock:
+            prof = self._thread_profiles.get(ident)
+            if prof is None:
+                prof = self._thread_profiles[ident] = cProfile.Profile()
+        prof.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            prof.disable()
+
+    def stop(self, po_name: Optional[str] = None, rows: Optional[int] = None, root: Optional[str] = None) -> str:
+        """Stop, write the capture directory and return its path."""
+        self._profile.disable()
+        if getattr(_local, "capture", None) is self:
+            _local.capture = None
+        wall = time.perf_counter() - self._wall
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        _stop_tracing()
+        if po_name is not None:
+            self.po_name = po_name
+        if rows is not None:
+            self.rows = rows
+
+        name = f"{self._started:%Y%m%d_%H%M%S}_{self.kind}_{_slug(self.po_name)}_{self.rows or 0}rows"
+        out_dir = os.path.join(root or PROFILE_DIR, name)
+        os.makedirs(out_dir, exist_ok=True)
+        with self._lock:
+            profiles = [self._profile, *self._thread_profiles.values()]
+        listing = io.StringIO()
+        stats = pstats.Stats(*profiles, stream=listing)
+        stats.dump_stats(os.path.join(out_dir, "profile.prof"))
+        stats.sort_stats("cumulative").print_stats(60)
+        with open(os.path.join(out_dir, "top.txt"), "w") as fh:
+            fh.write(listing.getvalue())
+
+        meta = {
+            "id": name,
+            "kind": self.kind,
+            "po_name": os.path.basename(self.po_name or ""),
+            "rows": self.rows,
+            "started": self._started.isoformat(timespec="seconds"),
+            "wall_s": round(wall, 3),
+            "peak_traced_kib": round(peak / 1024, 1),
+            "note": self.note,
+            "top_functions": top_functions(stats),
+            "top_allocations": top_allocations(snapshot, self._baseline),
+        }
+        with open(os.path.join(out_dir, "meta.json"), "w") as fh:
+            json.dump(meta, fh, indent=2)
+        return out_dir
+
+
+def top_functions(stats: pstats.Stats, n: int = TOP_FUNCTIONS) -> List[dict]:
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        if filename == __file__:
+            continue
+        where = f"{os.path.basename(filename)}:{line}" if line else filename
+        rows.append({"function": f"{func} ({where})", "calls": nc,
+                     "tottime_ms": round(tt * 1000, 2), "cumtime_ms": round(ct * 1000, 2)})
+    rows.sort(key=lambda r: r["cumtime_ms"], reverse=True)
+    return rows[:n]
+
+
+def top_allocations(snapshot, baseline=None, n: int = TOP_ALLOCATIONS) -> List[dict]:
+    """Allocation sites still holding memory at the end, grown since the start."""
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, __file__),
+    ]
+    snapshot = snapshot.filter_traces(filters)
+    if baseline is not None:
+        stats = [s for s in snapshot.compare_to(baseline.filter_traces(filters), "lineno") if s.size_diff > 0]
+        stats.sort(key=lambda s: s.size_diff, reverse=True)
+        return [{"site": str(s.traceback[0]), "size_kib": round(s.size_diff / 1024, 1), "count": s.count_diff}
+                for s in stats[:n]]
+    return [{"site": str(s.traceback[0]), "size_kib": round(s.size / 1024, 1), "count": s.count}
+            for s in snapshot.statistics("lineno")[:n]]
+
+
+# ---------------------------
+# Streamlit rerun capture
+# ---------------------------
+def begin_rerun(session_state, query_params) -> Optional[Capture]:
+    """
+    Call at the top of the page script. Finishes a capture left open by a run
+    that ended early (st.stop / rerun), then starts one if ?profile=rerun or
+    BARCODE_PROFILE asks for it.
+    """
+    stale = session_state.get(SESSION_KEY)
+    if stale is not None:
+        session_state[SESSION_KEY] = None
+        stale.note = stale.note or "run ended before the end of the script (st.stop or rerun)"
+        try:
+            stale.stop()
+        except Exception:
+            pass
+    if not requested(RERUN, query_params):
+        return None
+    consume(RERUN, query_params)
+    cap = Capture(RERUN).start()
+    session_state[SESSION_KEY] = cap
+    return cap
+
+
+def end_rerun(session_state, po_name: str = "", rows: Optional[int] = None) -> Optional[str]:
+    """Call at the bottom of the page script; returns the capture dir if one was open."""
+    cap = session_state.get(SESSION_KEY)
+    if cap is None:
+        return None
+    session_state[SESSION_KEY] = None
+    return cap.stop(po_name=po_name, rows=rows)
+
+
+def update_rerun(session_state, po_name: str = "", rows: Optional[int] = None):
+    """Attach the PO name/row count as soon as they are known (in case the run ends early)."""
+    cap = session_state.get(SESSION_KEY)
+    if cap is not None:
+        cap.po_name, cap.rows = po_name, rows
+
+
+def current() -> Optional[Capture]:
+    """The capture started on this thread, if one is running."""
+    return getattr(_local, "capture", None)
+
+
+# ---------------------------
+# Job capture
+# ---------------------------
+def profiled(fn: Callable, kind: str = JOB, po_name: str = "", rows: Optional[int] = None) -> Callable:
+    """Wrap a job function so the job thread runs under a Capture."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        cap = Capture(kind, po_name=po_name, rows=rows).start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            cap.stop()
+    return wrapper
+
+
+# ---------------------------
+# Listing
+# ---------------------------
+def list_captures(limit: int = 10, root: Optional[str] = None) -> List[dict]:
+    """Newest captures first (meta.json contents plus "path")."""
+    root = root or PROFILE_DIR
+    if not os.path.isdir(root):
+        return []
+    out = []
+    for name in sorted(os.listdir(root), reverse=True):
+        meta_path = os.path.join(root, name, "meta.json")
+        if not os.path.exists(meta_path):
+            continue
+        try:
+            with open(meta_path) as fh:
+                meta = json.load(fh)
+        except Exception:
+            continue
+        meta["path"] = os.path.join(root, name)
+        out.append(meta)
+        if len(out) >= limit:
+            break
+    return out
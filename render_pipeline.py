@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# render_pipeline.py
+"""
+Streaming label pipeline: rows -> label specs -> rendered images -> sinks.
+
+label_specs() expands a final-labels table into one spec per label lazily.
+run_pipeline() renders specs on a small worker pool, where each sink's
+encoder (PNG bytes, ZPL text) also runs, and hands the results to the sinks
+(PNG directory, PDF, ZIP, ZPL file, printer) in table order; the image is
+dropped as soon as the sinks have it.
+
+At most `max_in_flight` labels exist at once (rendering, queued or being
+written). When the sinks fall behind, the producer blocks on a free slot
+instead of rendering ahead, so peak memory is a fixed number of labels
+whatever the size of the job, while rendering of the next labels overlaps
+with writing the current one.
+
+    sinks = [PngDirSink(out_dir), PdfSink(os.path.join(out_dir, "po.pdf"))]
+    res = run_pipeline(label_specs(final_df), sinks, total=count_labels(final_df))
+"""
+import os
+import queue
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import profile_capture
+from instrumentation import timer
+
+MAX_IN_FLIGHT = 8
+RENDER_WORKERS = 2
+PRINT_BATCH = 50
+
+_DONE = object()
+
+
+# ---------------------------
+# Specs
+# ---------------------------
+def label_count(row) -> int:
+    try:
+        return max(0, int(row.get("Final_Labels", 0) or 0))
+    except Exception:
+        return 0
+
+
+def count_labels(df) -> int:
+    return int(sum(label_count(r) for _, r in df.iterrows()))
+
+
+def label_specs(df, label_cm: float = 10.0, dpi: int = 300, profile: Optional[dict] = None,
+                expand: bool = False, template: Optional[str] = None) -> Iterator[dict]:
+    """
+    One spec per row with Final_Labels > 0: {"key": "<row>_0", "row_index",
+    "label_no", "copies", "row", "label_cm", "dpi", "size_px", "template"}. The label is
+    rendered once and sinks emit the copies (see Sink.supports_copies);
+    expand=True yields one spec per label instead ("<row>_<n>", copies 1).
+    "row" is a plain dict so specs can go to a process pool. A printer profile
+    replaces label_cm/dpi with its device raster; template names the layout
+    (label_templates).
+    """
+    size_px = None
+    if profile:
+        from printer_profiles import label_cm as profile_cm, label_px
+        label_cm, dpi, size_px = profile_cm(profile), profile["dpi"], label_px(profile)
+    for idx, row in df.iterrows():
+        n = label_count(row)
+        if not n:
+            continue
+        data = row.to_dict()
+        spec = {"key": f"{idx}_0", "row_index": idx, "label_no": 0, "copies": n, "row": data,
+                "label_cm": label_cm, "dpi": dpi, "size_px": size_px, "template": template}
+        if expand:
+            yield from expand_copies(spec)
+        else:
+            yield spec
+
+
+def expand_copies(spec: dict) -> Iterator[dict]:
+    """One copies=1 spec per copy, keyed like the per-label files always were."""
+    if spec.get("copies", 1) <= 1:
+        yield spec
+        return
+    for i in range(spec["copies"]):
+        yield dict(spec, key=f"{spec['row_index']}_{i}", label_no=i, copies=1)
+
+
+def render_spec(spec: dict):
+    """Worker: render one spec to a PIL image."""
+    from label_generator import render_label_image
+
+    return render_label_image(spec["row"], label_cm=spec["label_cm"], dpi=spec["dpi"], size_px=spec.get("size_px"),
+                              template=spec.get("template"))
+
+
+def _render_task(render: Callable, spec: dict, encoders: tuple) -> list:
+    """Worker: render one spec and run each sink's encoder on it (None passes the image on)."""
+    img = render(spec)
+    return [img if enc is None else enc(img) for enc in encoders]
+
+
+def png_bytes(img, dpi: int = 300) -> bytes:
+    from label_output import image_bytes
+
+    return image_bytes(img, "png", dpi=dpi)
+
+
+def zpl_text(img, darkness: Optional[int] = None) -> str:
+    from label_output import image_to_zpl
+
+    return image_to_zpl(img, darkness=darkness)
+
+
+# ---------------------------
+# Sinks
+# ---------------------------
+class Sink:
+    """
+    Receives rendered labels in order. encoder() may return a picklable
+    callable that turns the image into this sink's payload; it runs on the
+    render workers in parallel, and write() then only gets the payload.
+    A sink with supports_copies emits spec["copies"] itself from one write();
+    for the others the pipeline calls write() once per copy.
+    close() finishes the output and returns it.
+    """
+
+    name = "sink"
+    supports_copies = False
+
+    def encoder(self) -> Optional[Callable]:
+        return None
+
+    def write(self, spec: dict, data):
+        raise NotImplementedError
+
+    def close(self):
+        return None
+
+
+class PngDirSink(Sink):
+    """
+    label_<key>.png files in out_dir; `written` lists (spec, path). One file
+    per spec: the copy count travels with it (spec["copies"], catalog, lp -n).
+    """
+
+    name = "png"
+    supports_copies = True
+
+    def __init__(self, out_dir: str, dpi: int = 300):
+        self.out_dir = out_dir
+        self.dpi = dpi
+        self.written = []
+        os.makedirs(out_dir, exist_ok=True)
+
+    def encoder(self):
+        return partial(png_bytes, dpi=self.dpi)
+
+    def write(self, spec, data):
+        path = os.path.join(self.out_dir, f"label_{spec['key']}.png")
+        with timer("label.save"):
+            with open(path, "wb") as fh:
+                fh.write(data)
+        self.written.append((spec, path))
+
+    def close(self):
+        return [p for _, p in self.written]
+
+
+class PdfSink(Sink):
+    """One PDF page per label, added as labels arrive; copies reuse the page image."""
+
+    name = "pdf"
+    supports_copies = True
+
+    def __init__(self, pdf_path, dpi: int = 300):
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.pages = 0
+        self._canvas = None
+
+    def write(self, spec, img):
+        from label_output import add_pdf_page
+
+        copies = spec.get("copies", 1)
+        with timer("encode.pdf"):
+            self._canvas = add_pdf_page(self._canvas, self.pdf_path, img, self.dpi, copies=copies)
+        self.pages += copies
+
+    def close(self):
+        if self._canvas is None:
+            return None
+        self._canvas.save()
+        self._canvas = None
+        return self.pdf_path
+
+
+class ZipSink(Sink):
+    """label_<key>.png entries in a ZIP archive, plus copies.csv listing each entry's copies."""
+
+    name = "zip"
+    supports_copies = True
+
+    def __init__(self, zip_path, dpi: int = 300):
+        self.zip_path = zip_path
+        self.dpi = dpi
+        self._zf = zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED)  # PNG is already compressed
+        self._copies = []
+
+    def encoder(self):
+        return partial(png_bytes, dpi=self.dpi)
+
+    def write(self, spec, data):
+        name = f"label_{spec['key']}.png"
+        self._zf.writestr(name, data)
+        self._copies.append(f"{name},{spec.get('copies', 1)}")
+
+    def close(self):
+        self._zf.writestr("copies.csv", "\n".join(["file,copies", *self._copies]) + "\n")
+        self._zf.close()
+        return self.zip_path
+
+
+class ZplSink(Sink):
+    """One ^XA..^XZ label per image appended to a .zpl file; copies become ^PQ."""
+
+    name = "zpl"
+    supports_copies = True
+
+    def __init__(self, zpl_path: str, darkness: Optional[int] = None):
+        self.zpl_path = zpl_path
+        self.darkness = darkness
+        self._fh = open(zpl_path, "w")
+
+    def encoder(self):
+        return partial(zpl_text, darkness=self.darkness)
+
+    def write(self, spec, data):
+        from label_output import zpl_with_copies
+
+        self._fh.write(zpl_with_copies(data, spec.get("copies", 1)))
+
+    def close(self):
+        self._fh.close()
+        return self.zpl_path
+
+
+class PrinterSink(Sink):
+    """
+    Spool labels to a CUPS queue in batches of `batch_size` (ZPL sent raw, or
+    PDF), so the printer starts on the first batch while the rest still render.
+    Copies go out as ^PQ / reused PDF pages inside the batch, not extra jobs.
+    printer=None uses the default queue.
+    """
+
+    name = "printer"
+    supports_copies = True
+
+    def __init__(self, printer: Optional[str] = None, fmt: str = "zpl", dpi: int = 300,
+                 batch_size: int = PRINT_BATCH, darkness: Optional[int] = None):
+        if fmt not in ("zpl", "pdf"):
+            raise ValueError("PrinterSink prints zpl or pdf")
+        self.printer = printer
+        self.fmt = fmt
+        self.dpi = dpi
+        self.darkness = darkness
+        self.batch_size = max(1, int(batch_size))
+        self.jobs_sent = 0
+        self._batch = None
+        self._count = 0
+        self._path = None
+
+    @classmethod
+    def for_profile(cls, profile: dict, printer: Optional[str] = None, batch_size: int = PRINT_BATCH):
+        """ZPL when the device takes it, else PDF; queue and darkness from the profile."""
+        fmt = "zpl" if "zpl" in profile["formats"] else "pdf"
+        return cls(printer or profile.get("printer"), fmt=fmt, dpi=profile["dpi"], batch_size=batch_size,
+                   darkness=profile.get("darkness"))
+
+    def encoder(self):
+        return partial(zpl_text, darkness=self.darkness) if self.fmt == "zpl" else None
+
+    def _open(self):
+        fd, self._path = tempfile.mkstemp(prefix="labels_", suffix=f".{self.fmt}")
+        os.close(fd)
+        self._batch = ZplSink(self._path, self.darkness) if self.fmt == "zpl" else PdfSink(self._path, dpi=self.dpi)
+        self._count = 0
+
+    def _flush(self):
+        from label_output import print_file
+
+        if self._batch is None:
+            return
+        path = self._batch.close()
+        self._batch = None
+        try:
+            if path:
+                print_file(path, printer=self.printer, raw=self.fmt == "zpl")
+                self.jobs_sent += 1
+        finally:
+            os.remove(self._path)
+
+    def write(self, spec, data):
+        if self._batch is None:
+            self._open()
+        self._batch.write(spec, data)
+        self._count += 1
+        if self._count >= self.batch_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        return self.jobs_sent
+
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+def run_pipeline(
+    specs: Iterable[dict],
+    sinks: List[Sink],
+    render: Callable = render_spec,
+    workers: int = RENDER_WORKERS,
+    processes: bool = False,
+    max_in_flight: int = MAX_IN_FLIGHT,
+    total: Optional[int] = None,
+    progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> dict:
+    """
+    Render every spec once and write it to all sinks, in spec order; copies
+    are expanded only for sinks without copy support.
+
+    A spec that fails to render is reported in "failures" and skipped; a sink
+    error stops the pipeline and is raised after the sinks are closed.
+    processes=True renders in a process pool (for CPU-bound batch jobs; the
+    encoded payloads are pickled back, and `render` must be a module-level function). cancelled() is polled before each label.
+    progress(done, total) counts labels including copies.
+    Returns {"labels" (including copies), "renders", "failures",
+    "outputs": {sink.name: close() result}, "cancelled"}.
+    """
+    max_in_flight = max(1, int(max_in_flight))
+    workers = max(1, int(workers))
+    slots = threading.BoundedSemaphore(max_in_flight)
+    pending = queue.Queue(maxsize=max_in_flight)
+    stop = threading.Event()
+    state = {"cancelled": False, "error": None}
+    encoders = tuple(sink.encoder() for sink in sinks)
+    pool = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=workers)
+    # a profile capture on the calling thread also covers the render threads
+    capture = None if processes else profile_capture.current()
+    task = _render_task if capture is None else partial(capture.call, _render_task)
+
+    def produce():
+        try:
+            for spec in specs:
+                if cancelled is not None and cancelled():
+                    state["cancelled"] = True
+                    break
+                # backpressure: wait for a free slot instead of rendering ahead of the sinks
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    slots.release()
+                    return
+                pending.put((spec, pool.submit(task, render, spec, encoders)))
+        except BaseException as e:  # a failing spec iterator ends the job
+            state["error"] = e
+        finally:
+            pending.put(_DONE)
+
+    producer = threading.Thread(target=produce, name="label-render", daemon=True)
+    producer.start()
+
+    written, rendered, failed, failures = 0, 0, 0, []
+    error = None
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                break
+            spec, fut = item
+            try:
+                payloads = fut.result()
+            except Exception as e:
+                payloads = None
+                failed += spec.get("copies", 1)
+                failures.append(f"Label creation failed for row {spec.get('row_index')} "
+                                f"#{spec.get('label_no')}: {e}")
+            try:
+                if payloads is not None:
+                    for sink, data in zip(sinks, payloads):
+                        if sink.supports_copies:
+                            sink.write(spec, data)
+                        else:
+                            for one in expand_copies(spec):
+                                sink.write(one, data)
+                    rendered += 1
+                    written += spec.get("copies", 1)
+                del payloads
+            finally:
+                slots.release()
+            if progress is not None:
+                progress(written + failed, total)
+    except BaseException as e:
+        error = e
+        stop.set()
+        # unblock the producer and drop whatever it already queued
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                break
+            item[1].cancel()
+            slots.release()
+    finally:
+        producer.join()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    outputs = {}
+    for sink in sinks:
+        try:
+            outputs[sink.name] = sink.close()
+        except Exception as e:
+            error = error or e
+    error = error or state["error"]
+    if error is not None:
+        raise error
+    return {"labels": written, "renders": rendered, "failures": failures, "outputs": outputs,
+            "cancelled": state["cancelled"]}
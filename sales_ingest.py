@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# sales_ingest.py
+"""
+Incremental ingestion of the daily sales_YYYY-MM-DD.csv reports.
+
+The source folder comes from the SALES_DATA_DIR environment variable (or the
+data_dir argument) and defaults to the repo's data/sales_reports. A manifest
+records every ingested file by name, size and mtime; only new or changed files
+are parsed and their days appended to a consolidated daily_sales.csv store.
+A refresh with no new files only stats the folder and parses nothing.
+
+Each source folder gets its own store (data/sales_store for the default
+folder, data/sales_store/<name>-<hash> for any other), so a backtest or CLI
+run against another --data-dir never replaces the store the app reads.
+SALES_STORE_DIR or store_dir pins the store location explicitly.
+"""
+import os
+import re
+import json
+import hashlib
+from typing import Optional
+
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SALES_DIR = os.path.join(REPO_DIR, "data", "sales_reports")
+DEFAULT_STORE_DIR = os.path.join(REPO_DIR, "data", "sales_store")
+
+STORE_FILE = "daily_sales.csv"
+MANIFEST_FILE = "manifest.json"
+COLUMNS = ["Date", "Product", "Sales_Units"]
+
+_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+
+
+def sales_data_dir() -> str:
+    return os.environ.get("SALES_DATA_DIR") or DEFAULT_SALES_DIR
+
+
+def default_store_dir(data_dir: str) -> str:
+    """The store for one source folder; the default folder keeps the original location."""
+    src = os.path.abspath(data_dir)
+    if src == os.path.abspath(DEFAULT_SALES_DIR):
+        return DEFAULT_STORE_DIR
+    digest = hashlib.sha1(src.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(DEFAULT_STORE_DIR, f"{os.path.basename(src.rstrip(os.sep)) or 'sales'}-{digest}")
+
+
+class SalesIngestor:
+    def __init__(self, data_dir: Optional[str] = None, store_dir: Optional[str] = None):
+        self.data_dir = data_dir or sales_data_dir()
+        self.store_dir = store_dir or os.environ.get("SALES_STORE_DIR") or default_store_dir(self.data_dir)
+        self.store_path = os.path.join(self.store_dir, STORE_FILE)
+        self.manifest_path = os.path.join(self.store_dir, MANIFEST_FILE)
+        self.warnings = []
+        self.last_ingested = []
+        self._manifest = None
+        self._daily = None
+
+    # ---- manifest / store ----
+    def _load_manifest(self) -> dict:
+        if self._manifest is None:
+            manifest = {"data_dir": self.data_dir, "files": {}}
+            if os.path.exists(self.manifest_path) and os.path.exists(self.store_path):
+                with open(self.manifest_path) as fh:
+                    saved = json.load(fh)
+                # a different source folder means the store describes other data
+                if saved.get("data_dir") == self.data_dir:
+                    manifest = saved
+            self._manifest = manifest
+        return self._manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self._manifest, fh, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def _load_store(self) -> pd.DataFrame:
+        if self._daily is None:
+            if self._load_manifest()["files"] and os.path.exists(self.store_path):
+                self._daily = pd.read_csv(self.store_path, parse_dates=["Date"])
+            else:
+                self._daily = pd.DataFrame(columns=COLUMNS).astype({"Date": "datetime64[ns]"})
+        return self._daily
+
+    # ---- scanning ----
+    def scan(self):
+        """
+        Stat the source folder. Returns (new_or_changed, removed): file names whose
+        (size, mtime) differ from the manifest, and manifest entries no longer on disk.
+        """
+        files = self._load_manifest()["files"]
+        seen = {}
+        with os.scandir(self.data_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".csv"):
+                    stt = entry.stat()
+                    seen[entry.name] = (stt.st_size, stt.st_mtime_ns)
+        changed = sorted(
+            name for name, (size, mtime) in seen.items()
+            if name not in files or (files[name]["size"], files[name]["mtime_ns"]) != (size, mtime)
+        )
+        removed = sorted(name for name in files if name not in seen)
+        self._stat = seen
+        return changed, removed
+
+    def _parse(self, name: str) -> Optional[pd.DataFrame]:
+        m = _DATE_RE.search(name)
+        if not m:
+            self.warnings.append(f"Skipping file without date pattern: {name}")
+            return None
+        try:
+            df = pd.read_csv(os.path.join(self.data_dir, name))
+        except Exception as e:
+            self.warnings.append(f"Error reading {name}: {e}")
+            return None
+        if "Product" not in df.columns or "Sales_Units" not in df.columns:
+            self.warnings.append(f"Missing required columns 'Product' and 'Sales_Units' in {name}")
+            return None
+        df["Date"] = pd.to_datetime(m.group(1))
+        df["Sales_Units"] = pd.to_numeric(df["Sales_Units"], errors="coerce").fillna(0)
+        df = df.dropna(subset=["Product"])
+        return df.groupby(["Date", "Product"], as_index=False)["Sales_Units"].sum()
+
+    # ---- ingestion ----
+    def refresh(self) -> pd.DataFrame:
+        """
+        Ingest new/changed files and return the consolidated daily_sales frame
+        (Date, Product, Sales_Units). Unchanged folders cost one directory stat.
+        """
+        daily = self._load_store()
+        changed, removed = self.scan()
+        if not changed and not removed:
+            return daily
+
+        self.warnings = []
+        files = self._manifest["files"]
+        # a changed or removed file's day is dropped and (if still present) re-read
+        stale_names = [n for n in changed + removed if n in files]
+        stale_dates = {files[n]["date"] for n in stale_names if files[n].get("date")}
+        for n in removed:
+            files.pop(n, None)
+        # other files for a stale day are re-read too, since the day is rebuilt from scratch
+        changed = sorted(set(changed) | {n for n, f in files.items() if f.get("date") in stale_dates})
+
+        frames = []
+        for name in changed:
+            df = self._parse(name)
+            size, mtime = self._stat[name]
+            files[name] = {"size": size, "mtime_ns": mtime,
+                           "date": df["Date"].iloc[0].strftime("%Y-%m-%d") if df is not None and not df.empty else None}
+            if df is not None:
+                frames.append(df)
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        new = (pd.concat(frames, ignore_index=True).groupby(["Date", "Product"], as_index=False)["Sales_Units"].sum()
+               if frames else pd.DataFrame(columns=COLUMNS))
+        overlap = new["Date"].isin(daily["Date"]).any()
+        if stale_dates or overlap:
+            keep = ~daily["Date"].dt.strftime("%Y-%m-%d").isin(stale_dates)
+            daily = pd.concat([daily[keep], new[COLUMNS]], ignore_index=True)
+            # two files for one day are summed, as if read together
+            daily = daily.groupby(["Date", "Product"], as_index=False)["Sales_Units"].sum()
+            daily.to_csv(self.store_path + ".tmp", index=False)
+            os.replace(self.store_path + ".tmp", self.store_path)
+        elif not new.empty:
+            # only new days: append them to the store instead of rewriting it
+            write_header = daily.empty or not os.path.exists(self.store_path)
+            new[COLUMNS].to_csv(self.store_path, mode="w" if write_header else "a",
+                                header=write_header, index=False)
+            daily = new[COLUMNS] if daily.empty else pd.concat([daily, new[COLUMNS]], ignore_index=True)
+
+        self._daily = daily.sort_values(["Date", "Product"]).reset_index(drop=True)
+        self._save_manifest()
+        self.last_ingested = changed
+        return self._daily
+
+    def rebuild(self) -> pd.DataFrame:
+        """Forget the manifest and re-ingest every file."""
+        for p in (self.store_path, self.manifest_path):
+            if os.path.exists(p):
+                os.remove(p)
+        self._manifest = None
+        self._daily = None
+        return self.refresh()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# sku_index.py
+"""
+Sku -> canonical row index for one version of a PO table.
+
+The table pages used to find a row with df[df["Sku"].astype(str) == sku]
+for every row they generated or printed, which re-casts and scans the whole
+table each time (quadratic in PO size). SkuIndex is built once per table
+version with one vectorized pass and then answers lookups from a dict.
+
+The canonical row for a Sku is its first occurrence. Keys are the stripped
+string form of Sku, so 123, "123" and " 123 " are the same key; blank SKUs
+are not indexed.
+
+index_for(df, version, store) keeps the current index in a mapping
+(st.session_state) and rebuilds it only when `version` changes. Pass the
+table hash the editor already maintains, so an edit invalidates the index.
+"""
+from typing import Iterable, List, MutableMapping, Optional
+
+import pandas as pd
+
+from instrumentation import timed
+
+STORE_KEY = "_sku_index"
+
+
+def sku_key(value) -> str:
+    if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+        return ""
+    return str(value).strip()
+
+
+class SkuIndex:
+    @timed("sku_index.build")
+    def __init__(self, df: pd.DataFrame, version: Optional[str] = None):
+        self.version = version
+        keys = df["Sku"].map(sku_key) if "Sku" in df.columns else pd.Series([], dtype=object)
+        first = ~keys.duplicated(keep="first") & (keys != "")
+        self.duplicates = int((keys.duplicated(keep="first") & (keys != "")).sum())
+        records = df.loc[first].to_dict("records")
+        self._rows = dict(zip(keys[first], records))
+
+    def get(self, sku, default=None) -> Optional[dict]:
+        """Canonical row for sku (a dict, do not mutate), or default."""
+        return self._rows.get(sku_key(sku), default)
+
+    def __contains__(self, sku) -> bool:
+        return sku_key(sku) in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def rows(self, skus: Iterable) -> List[Optional[dict]]:
+        return [self._rows.get(sku_key(s)) for s in skus]
+
+    def missing(self, skus: Iterable) -> List[str]:
+        """SKUs (e.g. scanned or received) that are not on this table."""
+        return [k for k in dict.fromkeys(sku_key(s) for s in skus) if k and k not in self._rows]
+
+
+def index_for(df: pd.DataFrame, version: str, store: MutableMapping, key: str = STORE_KEY) -> SkuIndex:
+    """The SkuIndex for this table version, rebuilt only when the version changes."""
+    idx = store.get(key)
+    if idx is None or idx.version != version:
+        idx = SkuIndex(df, version)
+        store[key] = idx
+    return idx
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# startup_profile.py
+"""
+Startup helpers for the Streamlit app.
+
+lazy_module("plotly.express") returns a stand-in that imports the real module on
+first attribute access, so pages only pay for heavy imports (prophet, plotly,
+thefuzz, pdfplumber, ...) when they actually draw a chart or match a query.
+
+Import-time profiling is switched on with BARCODE_PROFILE_STARTUP=1 or by
+passing --profile-startup to the script:
+
+    streamlit run app.py -- --profile-startup
+
+It records the cumulative and self time of every module imported afterwards,
+plus any named stage() blocks, and the launcher shows the slowest ones.
+"""
+import os
+import sys
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder, Loader
+
+PROFILE_ENV = "BARCODE_PROFILE_STARTUP"
+PROFILE_FLAG = "--profile-startup"
+
+_import_times = {}  # module -> [cumulative_s, self_s]
+_stage_times = {}   # stage name -> seconds
+_stack = threading.local()
+_installed = False
+
+
+def profiling_enabled() -> bool:
+    return os.environ.get(PROFILE_ENV, "").strip().lower() in ("1", "true", "yes") or PROFILE_FLAG in sys.argv
+
+
+# ---------------------------
+# Lazy imports
+# ---------------------------
+class _LazyModule:
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        mod = self.__dict__["_module"]
+        if mod is None:
+            with stage(f"import {self._name}"):
+                mod = importlib.import_module(self._name)
+            self.__dict__["_module"] = mod
+        return mod
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name: str):
+    """Module stand-in that imports `name` on first attribute access."""
+    if name in sys.modules:
+        return sys.modules[name]
+    return _LazyModule(name)
+
+
+# ---------------------------
+# Import-time profiling
+# ---------------------------
+class _TimedLoader(Loader):
+    def __init__(self, loader, name):
+        self._loader = loader
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = getattr(_stack, "frames", None)
+        if stack is None:
+            stack = _stack.frames = []
+        stack.append(0.0)  # time spent in nested imports
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            _import_times[self._name] = [total, total - children]
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+
+class _TimingFinder(MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, fullname)
+                return spec
+        return None
+
+
+def install() -> bool:
+    """Start recording import times (idempotent). Returns True if profiling is on."""
+    global _installed
+    if not _installed and profiling_enabled():
+        sys.meta_path.insert(0, _TimingFinder())
+        _installed = True
+    return _installed
+
+
+@contextmanager
+def stage(name: str):
+    """Time a named startup stage (no-op bookkeeping when profiling is off)."""
+    if not _installed:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_times[name] = _stage_times.get(name, 0.0) + time.perf_counter() - start
+
+
+def record(name: str, seconds: float):
+    """Record a stage measured by the caller."""
+    if _installed:
+        _stage_times[name] = seconds
+
+
+def import_report(top: int = 25):
+    """[(module, cumulative_ms, self_ms)] sorted by cumulative time, slowest first."""
+    rows = [(m, round(c * 1000, 2), round(s * 1000, 2)) for m, (c, s) in _import_times.items()]
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+
+
+def stage_report():
+    return sorted(((k, round(v * 1000, 2)) for k, v in _stage_times.items()), key=lambda r: r[1], reverse=True)
+
+
+def print_report(top: int = 25, file=None):
+    file = file or sys.stderr
+    print("--- startup stages (ms) ---", file=file)
+    for name, ms in stage_report():
+        print(f"{ms:10.2f}  {name}", file=file)
+    print(f"--- slowest imports (cumulative / self ms, top {top}) ---", file=file)
+    for mod, cum, own in import_report(top):
+        print(f"{cum:10.2f} {own:10.2f}  {mod}", file=file)
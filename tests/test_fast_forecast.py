@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+import fast_forecast
+from fast_forecast import HORIZON, forecast_all, sales_matrix, select_models
+
+
+def _daily(products: dict, start="2024-01-01") -> pd.DataFrame:
+    rows = []
+    for product, (offset, values) in products.items():
+        dates = pd.date_range(start, periods=offset + len(values), freq="D")[offset:]
+        rows += [{"Date": d, "Product": product, "Sales_Units": v} for d, v in zip(dates, values)]
+    return pd.DataFrame(rows)
+
+
+def test_sales_matrix_nan_before_first_sale_and_zero_for_gaps():
+    df = _daily({"A": (0, [1, 2, 3, 4]), "B": (2, [5, 6])})
+    df = df[~((df["Product"] == "A") & (df["Date"] == pd.Timestamp("2024-01-02")))]
+    products, dates, Y = sales_matrix(df)
+    assert list(products) == ["A", "B"]
+    assert len(dates) == 4
+    np.testing.assert_array_equal(Y[0], [1, 0, 3, 4])
+    assert np.isnan(Y[1, :2]).all()
+    np.testing.assert_array_equal(Y[1, 2:], [5, 6])
+
+
+def test_select_models_picks_seasonal_naive_for_a_repeating_week():
+    week = [10, 2, 2, 2, 2, 2, 30]
+    Y = np.array([week * 6], dtype=float)
+    assert select_models(Y)[0] == "snaive"
+
+
+def test_select_models_falls_back_to_ses_without_enough_history():
+    Y = np.full((2, 30), np.nan)
+    Y[0, -3:] = [1, 2, 3]
+    Y[1, -1] = 4
+    assert list(select_models(Y)) == ["ses", "ses"]
+
+
+def test_forecast_all_shapes():
+    df = _daily({"A": (0, list(range(40))), "B": (10, [3] * 30), "C": (37, [1, 2, 3])})
+    res = forecast_all(df)
+    P, T = 3, 40
+    assert res["actual"].shape == (P, T)
+    assert res["fitted"].shape == (P, T)
+    assert res["forecast"].shape == (P, HORIZON)
+    assert res["yhat"].shape == (P, T + HORIZON)
+    assert res["adjusted"].shape == (P, T + HORIZON)
+    assert res["model"].shape == (P,)
+    assert set(res["model"]) <= set(fast_forecast.MODELS)
+    assert res["future_dates"][0] == res["dates"][-1] + pd.Timedelta(days=1)
+    assert len(res["future_dates"]) == HORIZON
+    assert not np.isnan(res["forecast"]).any()
+
+
+def test_forecast_all_fixed_model():
+    df = _daily({"A": (0, [5] * 21), "B": (0, [1, 2] * 10 + [1])})
+    res = forecast_all(df, horizon=3, model="snaive")
+    assert list(res["model"]) == ["snaive", "snaive"]
+    assert res["forecast"].shape == (2, 3)
+    np.testing.assert_allclose(res["forecast"][0], 5.0)
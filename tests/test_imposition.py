@@ -0,0 +1,82 @@
+import pytest
+
+import imposition
+from imposition import MM, cell_origin, parse_grid, per_sheet, sheet_layout, sheets_needed
+
+
+def test_a4_grid_cells():
+    layout = sheet_layout("a4", rows=6, cols=4, margins_mm=8.0, gutter_mm=3.0)
+    assert per_sheet(layout) == 24
+    cell_w, cell_h = layout["cell_mm"]
+    assert cell_w == pytest.approx((210 - 16 - 3 * 3) / 4)
+    assert cell_h == pytest.approx((297 - 16 - 5 * 3) / 6)
+
+
+def test_sheets_needed():
+    layout = sheet_layout("a4", rows=6, cols=4)
+    assert sheets_needed(0, layout) == 0
+    assert sheets_needed(24, layout) == 1
+    assert sheets_needed(25, layout) == 2
+    assert sheets_needed(400, layout) == 17
+
+
+def test_margins_and_gutters_per_side():
+    layout = sheet_layout("letter", rows=2, cols=3, margins_mm=(10, 5, 20, 15), gutter_mm=(4, 6))
+    assert layout["margins_mm"] == (10, 5, 20, 15)
+    assert layout["cell_mm"][0] == pytest.approx((215.9 - 5 - 15 - 2 * 4) / 3)
+    assert layout["cell_mm"][1] == pytest.approx((279.4 - 10 - 20 - 6) / 2)
+
+
+def test_cell_origin_left_to_right_then_down():
+    layout = sheet_layout("a4", rows=6, cols=4, margins_mm=8.0, gutter_mm=3.0)
+    cell_w, cell_h = layout["cell_mm"]
+    x0, y0 = cell_origin(layout, 0)
+    assert (x0, y0) == pytest.approx((8 * MM, (297 - 8 - cell_h) * MM))
+    x1, y1 = cell_origin(layout, 1)
+    assert (x1 - x0, y1 - y0) == pytest.approx(((cell_w + 3) * MM, 0))
+    x4, y4 = cell_origin(layout, 4)
+    assert (x4 - x0, y0 - y4) == pytest.approx((0, (cell_h + 3) * MM))
+    # the last cell ends on the bottom and right margins
+    x, y = cell_origin(layout, 23)
+    assert (x + cell_w * MM, y) == pytest.approx(((210 - 8) * MM, 8 * MM))
+
+
+def test_parse_grid_is_columns_by_rows():
+    assert parse_grid("4x6") == (6, 4)
+    assert parse_grid("3X8") == (8, 3)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"rows": 0},
+    {"margins_mm": 120.0},
+    {"margins_mm": (1, 2, 3)},
+    {"label_mm": (60, 60)},
+])
+def test_bad_layouts_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        sheet_layout("a4", **kwargs)
+
+
+def test_crop_marks_stay_out_of_every_cell():
+    layout = sheet_layout("a4", rows=6, cols=4)
+
+    class Canvas:
+        lines = []
+
+        def setLineWidth(self, w):
+            pass
+
+        def line(self, *xy):
+            self.lines.append(xy)
+
+    writer = imposition.SheetWriter.__new__(imposition.SheetWriter)
+    writer.layout, writer._canvas = layout, Canvas()
+    cell_w, cell_h = (v * MM for v in layout["cell_mm"])
+    cells = [cell_origin(layout, slot) for slot in range(per_sheet(layout))]
+    for slot, (x, y) in enumerate(cells):
+        writer._crop_marks(x, y, slot)
+    assert Canvas.lines
+    for x1, y1, x2, y2 in Canvas.lines:
+        for px, py in ((x1, y1), (x2, y2), ((x1 + x2) / 2, (y1 + y2) / 2)):
+            for cx, cy in cells:
+                assert not (cx + 1e-6 < px < cx + cell_w - 1e-6 and cy + 1e-6 < py < cy + cell_h - 1e-6)
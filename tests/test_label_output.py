@@ -0,0 +1,29 @@
+import pytest
+from PIL import Image, ImageDraw
+
+from label_output import image_to_zpl, zpl_with_copies
+
+
+@pytest.fixture
+def label():
+    img = Image.new("RGB", (64, 40), "white")
+    ImageDraw.Draw(img).rectangle([8, 8, 40, 30], fill="black")
+    return img
+
+
+def test_zpl_with_copies_matches_rendering_the_copies(label):
+    one = image_to_zpl(label, darkness=12)
+    for n in (2, 7, 300):
+        assert zpl_with_copies(one, n) == image_to_zpl(label, copies=n, darkness=12)
+
+
+def test_zpl_with_copies_sets_a_single_quantity(label):
+    out = zpl_with_copies(image_to_zpl(label), 4)
+    assert out.count("^PQ") == 1
+    assert out.endswith("^PQ4^XZ\n")
+
+
+@pytest.mark.parametrize("copies", [1, 0, -3])
+def test_zpl_with_copies_leaves_one_copy_alone(label, copies):
+    one = image_to_zpl(label)
+    assert zpl_with_copies(one, copies) == one
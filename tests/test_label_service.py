@@ -0,0 +1,75 @@
+import io
+import zipfile
+
+import pytest
+
+from label_service import BadRequest, _copies, build_batch, normalize_spec, spec_key
+
+
+@pytest.mark.parametrize("raw", [
+    [1, 2],
+    "Sku=A1",
+    None,
+    {},
+    {"Sku": "  ", "Product": None},
+    {"Flavour": "Mint"},
+    {"Sku": "A1", "dpi": "high"},
+    {"Sku": "A1", "label_cm": None},
+    {"Sku": "A1", "label_cm": 0.5},
+    {"Sku": "A1", "label_cm": 31},
+    {"Sku": "A1", "dpi": 50},
+    {"Sku": "A1", "dpi": 5000},
+    {"Sku": "A1", "profile": "no-such-printer"},
+    {"Sku": "A1", "template": "no-such-template"},
+])
+def test_normalize_spec_rejects(raw):
+    with pytest.raises(BadRequest):
+        normalize_spec(raw)
+
+
+def test_normalize_spec_canonical_fields():
+    spec = normalize_spec({"sku": " A1 ", "flavor": "Mint", "dpi": "203", "label_cm": 5, "extra": 1})
+    assert spec == {"Sku": "A1", "Flavour": "Mint", "label_cm": 5.0, "dpi": 203}
+    # aliases and key order do not change the coalescing key
+    same = normalize_spec({"dpi": 203, "Flavour": "Mint", "label_cm": "5", "Sku": "A1"})
+    assert spec_key(spec, "png") == spec_key(same, "png")
+    assert spec_key(spec, "png") != spec_key(spec, "zpl")
+
+
+def test_normalize_spec_profile_sets_size():
+    spec = normalize_spec({"Sku": "A1", "profile": "zebra-203-40mm"})
+    assert spec["dpi"] == 203
+    assert "profile_data" in spec
+    assert spec_key(spec, "png") == spec_key({k: v for k, v in spec.items() if k != "profile_data"}, "png")
+
+
+@pytest.mark.parametrize("raw", [{"copies": 0}, {"copies": "x"}, {"copies": None}])
+def test_copies_rejects(raw):
+    with pytest.raises(BadRequest):
+        _copies(raw)
+
+
+@pytest.mark.parametrize("body", [
+    [{"Sku": "A1"}],
+    {"format": "png", "labels": [{"Sku": "A1"}]},
+    {"format": "pdf", "labels": []},
+    {"format": "pdf", "labels": {"Sku": "A1"}},
+    {"format": "pdf", "labels": [{"Sku": "A1", "copies": 0}]},
+])
+def test_build_batch_rejects(body):
+    with pytest.raises(BadRequest):
+        build_batch(None, body)
+
+
+class _FakeEngine:
+    def render_many(self, specs, fmt):
+        return [b"png-bytes"] * len(specs)
+
+
+def test_build_batch_zip_names_stay_flat():
+    body = {"format": "zip", "labels": [{"Sku": "../../etc/passwd"}, {"Sku": "a/b c"}, {"Product": "P"}]}
+    data, fmt = build_batch(_FakeEngine(), body)
+    names = zipfile.ZipFile(io.BytesIO(data)).namelist()
+    assert fmt == "zip"
+    assert names == ["0000__.._etc_passwd.png", "0001_a_b_c.png", "0002_label_2.png"]
+    assert all("/" not in n and "\\" not in n for n in names)
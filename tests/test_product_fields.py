@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from product_fields import apply_product_fields, parse_product, parse_products
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Elf Bar 600 [Blue Razz / 20mg]", ("Elf Bar 600", "Blue Razz", "20mg")),
+    ("Elf Bar 600 [Blue Razz]", ("Elf Bar 600", "Blue Razz", "")),
+    ("Elf Bar 600 [Blue   Razz | 20mg]", ("Elf Bar 600", "Blue Razz", "20mg")),
+    ("Hayati Pro Max+ 6K [Blueberry Pomegranate ; 20mg ]", ("Hayati Pro Max+ 6K", "Blueberry Pomegranate", "20mg")),
+    ("Lost Mary [Mint\n/ 10mg]", ("Lost Mary", "Mint", "10mg")),
+    ("Pack [x] [Mango / 20mg]", ("Pack [x]", "Mango", "20mg")),
+    ("Plain product", ("Plain product", "", "")),
+    ("Broken [bracket", ("Broken [bracket", "", "")),
+    ("  ", ("", "", "")),
+    (None, ("", "", "")),
+    (float("nan"), ("", "", "")),
+])
+def test_parse_product(value, expected):
+    assert parse_product(value) == expected
+
+
+def test_parse_products_matches_parse_product_row_by_row():
+    s = pd.Series(["A [Mint / 20mg]", None, "B", "A [Mint / 20mg]", "C [Ice]"], index=[10, 11, 12, 13, 14])
+    out = parse_products(s)
+    assert list(out.index) == [10, 11, 12, 13, 14]
+    assert [tuple(r) for r in out.itertuples(index=False)] == [parse_product(v) for v in s]
+
+
+def test_apply_product_fields_prefers_explicit_columns_by_default():
+    df = pd.DataFrame({"Product": ["A [Mint / 20mg]", "B [Ice / 10mg]"], "Flavour": ["Lime", None]})
+    out = apply_product_fields(df)
+    assert list(out["Product"]) == ["A", "B"]
+    assert list(out["Flavour"]) == ["Lime", "Ice"]
+    assert list(out["Strength"]) == ["20mg", "10mg"]
+    assert list(apply_product_fields(df, prefer="product")["Flavour"]) == ["Mint", "Ice"]
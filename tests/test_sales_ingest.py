@@ -0,0 +1,89 @@
+import os
+
+import pandas as pd
+
+from sales_ingest import SalesIngestor
+
+
+def _write(folder, day: str, rows: dict, bump: int = 0):
+    path = folder / f"sales_{day}.csv"
+    pd.DataFrame({"Product": list(rows), "Sales_Units": list(rows.values())}).to_csv(path, index=False)
+    if bump:
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + bump))
+    return path
+
+
+def _totals(daily: pd.DataFrame) -> dict:
+    return {(d.strftime("%Y-%m-%d"), p): u for d, p, u in daily[["Date", "Product", "Sales_Units"]].itertuples(index=False)}
+
+
+def _ingestor(tmp_path):
+    return SalesIngestor(data_dir=str(tmp_path / "reports"), store_dir=str(tmp_path / "store"))
+
+
+def test_refresh_appends_new_days(tmp_path):
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    _write(reports, "2025-01-01", {"A": 1, "B": 2})
+    ing = _ingestor(tmp_path)
+    assert _totals(ing.refresh()) == {("2025-01-01", "A"): 1, ("2025-01-01", "B"): 2}
+
+    _write(reports, "2025-01-02", {"A": 5})
+    daily = ing.refresh()
+    assert ing.last_ingested == ["sales_2025-01-02.csv"]
+    assert _totals(daily) == {("2025-01-01", "A"): 1, ("2025-01-01", "B"): 2, ("2025-01-02", "A"): 5}
+
+    # a new ingestor reads the same data back from the store and manifest
+    again = _ingestor(tmp_path)
+    assert _totals(again.refresh()) == _totals(daily)
+    assert again.scan() == ([], [])
+
+
+def test_refresh_rereads_a_changed_file(tmp_path):
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    _write(reports, "2025-01-01", {"A": 1})
+    _write(reports, "2025-01-02", {"A": 2})
+    ing = _ingestor(tmp_path)
+    ing.refresh()
+
+    _write(reports, "2025-01-02", {"A": 20, "C": 3}, bump=10**9)
+    daily = ing.refresh()
+    assert ing.last_ingested == ["sales_2025-01-02.csv"]
+    assert _totals(daily) == {("2025-01-01", "A"): 1, ("2025-01-02", "A"): 20, ("2025-01-02", "C"): 3}
+
+
+def test_refresh_drops_the_day_of_a_removed_file(tmp_path):
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    _write(reports, "2025-01-01", {"A": 1})
+    gone = _write(reports, "2025-01-02", {"A": 2})
+    ing = _ingestor(tmp_path)
+    ing.refresh()
+
+    os.remove(gone)
+    daily = ing.refresh()
+    assert _totals(daily) == {("2025-01-01", "A"): 1}
+    assert "sales_2025-01-02.csv" not in ing._load_manifest()["files"]
+
+
+def test_unchanged_folder_parses_nothing(tmp_path):
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    _write(reports, "2025-01-01", {"A": 1})
+    ing = _ingestor(tmp_path)
+    ing.refresh()
+    ing.last_ingested = []
+    ing.refresh()
+    assert ing.last_ingested == []
+
+
+def test_each_source_folder_gets_its_own_default_store(tmp_path):
+    import sales_ingest
+
+    assert sales_ingest.default_store_dir(sales_ingest.DEFAULT_SALES_DIR) == sales_ingest.DEFAULT_STORE_DIR
+    a = sales_ingest.default_store_dir(str(tmp_path / "a" / "reports"))
+    b = sales_ingest.default_store_dir(str(tmp_path / "b" / "reports"))
+    assert a != b
+    assert os.path.dirname(a) == sales_ingest.DEFAULT_STORE_DIR
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# text_fit.py
+"""
+Measured line breaking and font-size fitting for label text.
+
+The old layout guessed a wrap width from the width of one "a" or "A" and
+then shrank the font by 0.88x up to 14 times, loading a font and re-wrapping
+at every step. Wide text was mis-wrapped, and narrow text wrapped too early.
+Here:
+
+  font(kind, px)        loaded once per (kind, size) and kept
+  advances(kind, px)    per-glyph advance widths, measured once per glyph
+                        and size; a string's width is the sum of its glyphs
+  wrap(text, ...)       greedy word wrap against the measured widths
+  fit(text, ...)        the largest integer size in [min_px, max_px] whose
+                        wrap has at most max_lines lines that all fit,
+                        found by binary search (a handful of wraps, and
+                        only the sizes it lands on are loaded)
+
+fit() results are memoized per (text, kind, sizes, width, lines), so the
+same flavour on many labels is fitted once.
+"""
+from functools import lru_cache
+from typing import List, Tuple
+
+from instrumentation import timed
+
+FIT_MEMO = 4096
+
+
+@lru_cache(maxsize=256)
+def font(kind: str, px: int):
+    """'regular' or 'bold' label font at px."""
+    from label_generator import _load_bold_ttf, _load_ttf_candidate
+
+    return _load_bold_ttf(px) if kind == "bold" else _load_ttf_candidate(px)
+
+
+class GlyphAdvances:
+    """Advance widths of one font at one size, measured per glyph on first use."""
+
+    def __init__(self, kind: str, px: int):
+        self.font = font(kind, px)
+        self._adv = {}
+
+    def _measure(self, ch: str) -> float:
+        try:
+            w = self.font.getlength(ch)
+        except Exception:
+            w = getattr(self.font, "size", 10) * 0.5  # bitmap fallback font
+        self._adv[ch] = w
+        return w
+
+    def width(self, text: str) -> float:
+        adv = self._adv
+        return sum(adv[c] if c in adv else self._measure(c) for c in text)
+
+
+@lru_cache(maxsize=256)
+def advances(kind: str, px: int) -> GlyphAdvances:
+    return GlyphAdvances(kind, px)
+
+
+def wrap(text: str, kind: str, px: int, max_w: float) -> List[str]:
+    """Greedy word wrap by measured width. A word wider than max_w gets a line of its own."""
+    adv = advances(kind, px)
+    space = adv.width(" ")
+    lines, widths = [], []
+    for word in text.split():
+        w = adv.width(word)
+        if lines and widths[-1] + space + w <= max_w:
+            lines[-1] = f"{lines[-1]} {word}"
+            widths[-1] += space + w
+        else:
+            lines.append(word)
+            widths.append(w)
+    return lines
+
+
+def fits(lines: List[str], kind: str, px: int, max_w: float, max_lines: int) -> bool:
+    adv = advances(kind, px)
+    return len(lines) <= max_lines and all(adv.width(l) <= max_w for l in lines)
+
+
+def _balanced(text: str, parts: int) -> List[str]:
+    # last resort: split the words into `parts` even groups
+    words = text.split()
+    n = -(-len(words) // parts)
+    return [" ".join(words[i:i + n]) for i in range(0, len(words), n)]
+
+
+@lru_cache(maxsize=FIT_MEMO)
+@timed("text.fit")
+def fit(text: str, kind: str, max_px: int, min_px: int, max_w: float, max_lines: int = 2) -> Tuple[int, Tuple[str, ...]]:
+    """
+    (size, lines) for the largest size from min_px to max_px at which text
+    wraps into at most max_lines lines no wider than max_w. When even
+    min_px does not fit, min_px is used and the words are split evenly into
+    max_lines lines.
+    """
+    lines = wrap(text, kind, max_px, max_w)
+    if fits(lines, kind, max_px, max_w, max_lines):
+        return max_px, tuple(lines)
+    best = None
+    lo, hi = min_px, max_px - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        lines = wrap(text, kind, mid, max_w)
+        if fits(lines, kind, mid, max_w, max_lines):
+            best, lo = (mid, lines), mid + 1
+        else:
+            hi = mid - 1
+    if best is None:
+        lines = wrap(text, kind, min_px, max_w)
+        best = (min_px, lines if len(lines) <= max_lines else _balanced(text, max_lines))
+    return best[0], tuple(best[1])
+
+
+def cache_info() -> dict:
+    return {"fonts": font.cache_info().currsize, "fits": fit.cache_info()._asdict()}